@@ -2,24 +2,41 @@
 Router for working with audio files
 """
 
-from typing import Optional
+from typing import Mapping, Optional
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import FileResponse, Response, StreamingResponse
 from pathlib import Path
-from datetime import datetime
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
 import os
+import stat
+import threading
+import time
+import uuid
+from urllib.parse import quote
 
-from config import MP3_FILES_PATH, AUDIO_BASE_URL
+import anyio
+
+from config import (
+    MP3_FILES_PATH, AUDIO_BASE_URL, AUDIO_ACCEL_REDIRECT, AUDIO_MAX_RANGES, AUDIO_MISSING_CACHE_SECONDS
+)
 from auth import RequireAPIKey, verify_api_key_query
-from database import create_connection
+from catalog import get_catalog
+from http_cache import etag_matches
 from models import AudioFileNotFoundError
 
 router = APIRouter(prefix="/audio", tags=["Audio"])
 
+# Bytes read from an mp3 file at a time
+CHUNK_SIZE = 64 * 1024
+# Ranges closer than this are sent as one part (a part header costs about as much)
+RANGE_MERGE_GAP = 80
+
 
 def get_voice_link_template(translation_alias: str, voice_alias: str) -> str:
     """
-    Gets link_template for voice from database
+    Gets link_template for voice from the catalog (no database round-trip)
     
     Args:
         translation_alias: Translation alias (e.g.: syn, rst, bsb)
@@ -29,26 +46,8 @@ def get_voice_link_template(translation_alias: str, voice_alias: str) -> str:
         Audio file link template or empty string if not found
     """
     try:
-        connection = create_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        query = '''
-            SELECT v.link_template
-            FROM voices v
-            JOIN translations t ON v.translation = t.code
-            WHERE v.alias = %s 
-              AND t.alias = %s
-              AND v.active = 1
-              AND t.active = 1
-        '''
-        
-        cursor.execute(query, (voice_alias, translation_alias))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        return result['link_template'] if result and result['link_template'] else ''
+        voice = get_catalog().get_voice_by_alias(translation_alias, voice_alias)
+        return voice['link_template'] if voice and voice['link_template'] else ''
         
     except Exception:
         return ''
@@ -56,7 +55,7 @@ def get_voice_link_template(translation_alias: str, voice_alias: str) -> str:
 
 def format_audio_url(link_template: str, book: str, chapter: str) -> str:
     """
-    Formats audio file URL based on template
+    Formats audio file URL based on template, book codes come from the catalog
     
     Args:
         link_template: Link template
@@ -70,21 +69,7 @@ def format_audio_url(link_template: str, book: str, chapter: str) -> str:
         return ''
         
     try:
-        connection = create_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get book information
-        book_query = '''
-            SELECT number, code1, code2, code3
-            FROM bible_books
-            WHERE number = %s
-        '''
-        
-        cursor.execute(book_query, (int(book),))
-        book_info = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
+        book_info = get_catalog().books.get(int(book))
         
         if not book_info:
             return ''
@@ -109,54 +94,279 @@ def format_audio_url(link_template: str, book: str, chapter: str) -> str:
         return ''
 
 
-def parse_range_header(range_header: str, file_size: int):
-    """Parses Range header and returns start, end positions"""
-    if not range_header.startswith('bytes='):
-        return None, None
-    
-    try:
-        range_spec = range_header[6:]  # remove 'bytes='
-        if ',' in range_spec:
-            # Take only first range for simplicity
-            range_spec = range_spec.split(',')[0]
-        
-        if '-' not in range_spec:
-            return None, None
-            
-        start_str, end_str = range_spec.split('-', 1)
-        
-        start = int(start_str) if start_str else 0
-        end = int(end_str) if end_str else file_size - 1
-        
-        # Ensure values are correct
-        start = max(0, start)
-        end = min(file_size - 1, end)
-        
-        if start <= end:
-            return start, end
-        else:
-            return None, None
-            
-    except (ValueError, IndexError):
-        return None, None
+class MissingFileCache:
+    """
+    Recent 404 answers for missing mp3 files, (path, translation, voice, book,
+    chapter) -> error detail, kept for `ttl` seconds: players retrying a missing
+    chapter are answered without a stat or a template lookup. A file uploaded
+    meanwhile is served after at most `ttl` seconds (or after /cache/clear)
+    """
+
+    def __init__(self, ttl: int = AUDIO_MISSING_CACHE_SECONDS, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, detail), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def put(self, key: tuple, detail: dict):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, detail)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+
+missing_files = MissingFileCache()
+
 
+def stat_audio_file(file_path: Path, translation: str = '', voice: str = '', book: str = '', chapter: str = '') -> os.stat_result:
+    """stat of the mp3 file; 404 with the URL of the file at the voice's source when it is missing"""
+    key = (str(file_path), translation, voice, book, chapter)
+    detail = missing_files.get(key)
+    if detail is None:
+        try:
+            file_stat = file_path.stat()
+        except OSError:
+            file_stat = None
+        if file_stat is not None and stat.S_ISREG(file_stat.st_mode):
+            return file_stat
 
-def create_range_response(file_path: Path, range_header: Optional[str], translation: str = '', voice: str = '', book: str = '', chapter: str = ''):
-    """Creates Response with Range requests support"""
-    if not file_path.exists() or not file_path.is_file():
         # Get correct URL for file
         link_template = get_voice_link_template(translation, voice)
         correct_url = format_audio_url(link_template, book, chapter)
         
-        error_response = AudioFileNotFoundError(
+        detail = AudioFileNotFoundError(
             detail=f"Audio file not found on server: {file_path.absolute()}",
             alternative_url=correct_url if correct_url else None
+        ).model_dump()
+        missing_files.put(key, detail)
+
+    raise HTTPException(status_code=404, detail=detail)
+
+
+def coalesce_ranges(ranges: list, gap: int = RANGE_MERGE_GAP) -> list:
+    """Sorts (start, end) ranges and merges overlapping ones and those less than `gap` bytes apart"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1 + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_ranges(range_header: str, file_size: int) -> Optional[list]:
+    """
+    Parses all ranges of a Range header ("bytes=0-999,5000-,-500") into sorted,
+    coalesced (start, end) pairs. Ranges starting past the end of the file are
+    dropped; None when the header is malformed or no range is satisfiable (416)
+    """
+    if not range_header.startswith('bytes='):
+        return None
+
+    ranges = []
+    for range_spec in range_header[6:].split(','):
+        range_spec = range_spec.strip()
+        if not range_spec:
+            continue
+        start_str, dash, end_str = range_spec.partition('-')
+        if not dash or not (start_str or end_str) or not all(part.isdigit() for part in (start_str, end_str) if part):
+            return None
+
+        if not start_str:
+            # Suffix range: the last N bytes
+            suffix = int(end_str)
+            if suffix == 0:
+                continue
+            start, end = max(0, file_size - suffix), file_size - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+            if end < start:
+                return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+
+    return coalesce_ranges(ranges) if ranges else None
+
+
+def audio_etag(file_stat: os.stat_result) -> str:
+    """
+    Strong ETag from mtime and size in the format of nginx ("<mtime hex>-<size hex>"):
+    the same in every worker, after restarts and for files served by nginx
+    """
+    return f'"{int(file_stat.st_mtime):x}-{file_stat.st_size:x}"'
+
+
+def parse_http_date(value: Optional[str]) -> Optional[int]:
+    """HTTP-date -> unix time in seconds, None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+
+def is_not_modified(request_headers: Mapping, etag: str, mtime: int) -> bool:
+    """If-None-Match (weak comparison) or, without it, If-Modified-Since (RFC 9110, 13.2.2)"""
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    modified_since = parse_http_date(request_headers.get('if-modified-since'))
+    return modified_since is not None and mtime <= modified_since
+
+
+def if_range_matches(if_range: str, etag: str, mtime: int) -> bool:
+    """
+    If-Range holds either an ETag (strong comparison) or a date, which must be
+    exactly the Last-Modified of the file; otherwise the whole file is sent
+    """
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date(if_range) == mtime
+
+
+def read_file_range(f, start: int, length: int, chunk_size: int = CHUNK_SIZE):
+    """Yields `length` bytes of an open file from `start` in chunks of at most chunk_size"""
+    f.seek(start)
+    remaining = length
+    while remaining > 0:
+        chunk = f.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+class FileRangeResponse(FileResponse):
+    """
+    FileResponse for a single byte range of the file (start, end inclusive).
+    A range covering the whole file is sent exactly like FileResponse (with
+    http.response.pathsend where the server supports it); a part of the file is
+    read from an async file chunk by chunk, as FileResponse does without pathsend
+    """
+
+    def __init__(self, path, start: int, end: int, **kwargs):
+        super().__init__(path, **kwargs)
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send):
+        if self.start == 0 and self.end == self.stat_result.st_size - 1:
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if self.background is not None:
+            await self.background()
+
+
+def multipart_parts(ranges: list, file_size: int, boundary: str, media_type: str = "audio/mpeg") -> tuple:
+    """
+    Part headers of a multipart/byteranges body: ([(header, start, end)], closing
+    delimiter). The body length is known in advance from them
+    """
+    parts = [
+        (
+            f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n".encode(),
+            start,
+            end,
         )
-        
-        raise HTTPException(status_code=404, detail=error_response.model_dump())
+        for start, end in ranges
+    ]
+    return parts, f"\r\n--{boundary}--\r\n".encode()
+
+
+def multipart_length(parts: list, closing: bytes) -> int:
+    return sum(len(header) + end - start + 1 for header, start, end in parts) + len(closing)
+
+
+def iter_multipart(file_path: Path, parts: list, closing: bytes):
+    """Streams a multipart/byteranges body from the file, one open file for all parts"""
+    with open(file_path, 'rb') as f:
+        for header, start, end in parts:
+            yield header
+            yield from read_file_range(f, start, end - start + 1)
+    yield closing
+
+
+def create_accel_redirect_response(file_path: Path, translation: str = '', voice: str = '', book: str = '', chapter: str = ''):
+    """
+    Lets nginx send the file (X-Accel-Redirect to the internal location
+    AUDIO_ACCEL_REDIRECT, see deploy/nginx/audio.locations). Only the existence of
+    the file is checked here; Range, conditional requests and HEAD are handled
+    by nginx, with ETags in the same format as audio_etag
+    """
+    stat_audio_file(file_path, translation, voice, book, chapter)
+
+    relative_path = file_path.relative_to(MP3_FILES_PATH).as_posix()
+    return Response(
+        media_type="audio/mpeg",
+        headers={
+            # nginx keeps Content-Type and Cache-Control of the redirecting response
+            "Cache-Control": "max-age=432000",  # 5 days
+            "X-Accel-Redirect": AUDIO_ACCEL_REDIRECT.rstrip('/') + '/' + quote(relative_path),
+        }
+    )
+
+
+def create_range_response(file_path: Path, range_header: Optional[str], translation: str = '', voice: str = '', book: str = '', chapter: str = '', head: bool = False, request_headers: Optional[Mapping] = None):
+    """
+    Creates Response with Range requests support
+
+    The file is never read into memory as a whole: the full body and a single
+    range are sent by FileResponse (FileRangeResponse) chunk by chunk, so memory
+    per request does not depend on the file size. HEAD (head=True)
+    only stats the file and returns the headers of the GET response.
+
+    Conditional requests (request_headers): a matching If-None-Match or
+    If-Modified-Since gives 304, a Range with a stale If-Range gives the whole
+    file (200).
+
+    Several ranges are coalesced (overlapping and nearby ones merged) and sent
+    as a streamed multipart/byteranges body; a header with more than
+    AUDIO_MAX_RANGES ranges is ignored and the whole file is sent.
+    """
+    file_stat = stat_audio_file(file_path, translation, voice, book, chapter)
     
-    file_size = file_path.stat().st_size
-    file_stat = file_path.stat()
+    file_size = file_stat.st_size
+    mtime = int(file_stat.st_mtime)
+    etag = audio_etag(file_stat)
+    request_headers = request_headers or {}
     
     # Base headers
     base_headers = {
@@ -164,27 +374,40 @@ def create_range_response(file_path: Path, range_header: Optional[str], translat
         "Access-Control-Allow-Origin": "*",
         "Cache-Control": "max-age=432000",  # 5 days
         "Connection": "keep-alive",
-        "Last-Modified": datetime.fromtimestamp(file_stat.st_mtime).strftime('%a, %d %b %Y %H:%M:%S GMT'),
-        "ETag": f'"{hex(hash(f"{file_stat.st_mtime}-{file_size}"))}"'
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "ETag": etag
     }
+
+    if is_not_modified(request_headers, etag, mtime):
+        return Response(status_code=304, headers=base_headers)
+
+    # Range of an older version of the file: the whole current file is sent
+    if_range = request_headers.get('if-range')
+    if range_header and if_range and not if_range_matches(if_range, etag, mtime):
+        range_header = None
+
+    if range_header and range_header.count(',') >= AUDIO_MAX_RANGES:
+        range_header = None
     
     # If no Range header, return entire file
     if not range_header:
-        with open(file_path, 'rb') as f:
-            content = f.read()
-        
         base_headers["Content-Length"] = str(file_size)
-        
-        return Response(
-            content=content,
+
+        if head:
+            return Response(media_type="audio/mpeg", headers=base_headers)
+
+        # Sent in chunks by FileResponse, the stat result is reused
+        return FileResponse(
+            file_path,
+            stat_result=file_stat,
             media_type="audio/mpeg",
             headers=base_headers
         )
     
     # Parse Range header
-    start, end = parse_range_header(range_header, file_size)
+    ranges = parse_ranges(range_header, file_size)
     
-    if start is None or end is None:
+    if ranges is None:
         # Invalid Range, return 416
         return Response(
             status_code=416,
@@ -193,24 +416,44 @@ def create_range_response(file_path: Path, range_header: Optional[str], translat
                 "Accept-Ranges": "bytes"
             }
         )
-    
-    # Read needed part of file
+
+    if len(ranges) > 1:
+        boundary = uuid.uuid4().hex
+        parts, closing = multipart_parts(ranges, file_size, boundary)
+        multipart_headers = base_headers.copy()
+        multipart_headers["Content-Length"] = str(multipart_length(parts, closing))
+        media_type = f"multipart/byteranges; boundary={boundary}"
+
+        if head:
+            return Response(status_code=206, media_type=media_type, headers=multipart_headers)
+
+        return StreamingResponse(
+            iter_multipart(file_path, parts, closing),
+            status_code=206,
+            media_type=media_type,
+            headers=multipart_headers
+        )
+
+    start, end = ranges[0]
     content_length = end - start + 1
     
-    with open(file_path, 'rb') as f:
-        f.seek(start)
-        content = f.read(content_length)
-    
     # Add headers for partial content
     range_headers = base_headers.copy()
     range_headers.update({
         "Content-Range": f"bytes {start}-{end}/{file_size}",
         "Content-Length": str(content_length)
     })
-    
-    return Response(
-        content=content,
+
+    if head:
+        return Response(status_code=206, media_type="audio/mpeg", headers=range_headers)
+
+    # Same path as the whole file: sent by the FileResponse machinery, not a thread per chunk
+    return FileRangeResponse(
+        file_path,
+        start,
+        end,
         status_code=206,
+        stat_result=file_stat,
         media_type="audio/mpeg",
         headers=range_headers
     )
@@ -271,7 +514,8 @@ def get_audio_file(
         api_key: API key (query parameter or X-API-Key header)
         
     Returns:
-        Audio file or its part with correct headers
+        Audio file or its part with correct headers; with AUDIO_ACCEL_REDIRECT
+        an X-Accel-Redirect to nginx, which sends the file
     """
     # Handle OPTIONS request for CORS
     if request.method == "OPTIONS":
@@ -279,7 +523,7 @@ def get_audio_file(
             headers={
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
-                "Access-Control-Allow-Headers": "Range, Content-Type, If-Range, X-API-Key",
+                "Access-Control-Allow-Headers": "Range, Content-Type, If-Range, If-None-Match, If-Modified-Since, X-API-Key",
                 "Accept-Ranges": "bytes"
             }
         )
@@ -296,8 +540,16 @@ def get_audio_file(
     # Validate and build file path
     file_path = validate_audio_path(translation, voice, book, chapter)
     
+    # nginx sends the file
+    if AUDIO_ACCEL_REDIRECT:
+        return create_accel_redirect_response(file_path, translation, voice, book, chapter)
+
     # Get Range header
     range_header = request.headers.get('range')
     
     # Return response with Range requests support
-    return create_range_response(file_path, range_header, translation, voice, book, chapter) 
\ No newline at end of file
+    return create_range_response(
+        file_path, range_header, translation, voice, book, chapter,
+        head=request.method == "HEAD", request_headers=request.headers
+    )
+ 
\ No newline at end of file
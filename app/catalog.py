@@ -0,0 +1,244 @@
+# catalog.py
+"""
+In-process catalog of reference data: bible_books, translations, voices,
+translation_books, languages, bible_stat chapter counts and the chapters present
+in each translation (translation_chapters).
+
+These tables change rarely (when a translation or voice is added or edited), but
+every excerpt part looks them up several times. The catalog keeps a read-only,
+versioned snapshot in memory so that lookups are plain dict accesses:
+
+    catalog = get_catalog()
+    catalog.translations[16]['name']
+
+The snapshot is loaded on startup, reloaded after update_translation/update_voice,
+after /cache/clear and /check_translation (run after translation text is loaded)
+and whenever it is older than CATALOG_TTL seconds.
+"""
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from database import create_connection
+from config import CATALOG_TTL
+
+
+# Columns of bible_books that an excerpt may use as a book alias (same as the
+# former `bb.code1 = %(alias)s OR ...` condition in get_books_info)
+BOOK_ALIAS_COLUMNS = ('code1', 'code2', 'code3', 'code4', 'code5', 'short_name_en', 'short_name_ru')
+
+
+class Catalog:
+    """Snapshot of the reference tables with lookup indexes, never modified after loading"""
+
+    def __init__(self, version: int, books: list, translations: list, voices: list,
+                 translation_books: list, chapters: list, languages: list, bible_chapters_count: dict = None,
+                 fingerprint: str = ''):
+        self.version = version
+        # Digest of the loaded rows: unlike version, equal in all worker processes that loaded the same data
+        self.fingerprint = fingerprint
+        self.loaded_at = time.monotonic()
+        self.expired = False
+
+        # bible_books: number -> row, code1 -> number
+        self.books = {book['number']: book for book in books}
+        self.book_numbers = {book['code1']: book['number'] for book in books}
+
+        # translations/voices: code -> row
+        self.translations = {translation['code']: translation for translation in translations}
+        self.voices = {voice['code']: voice for voice in voices}
+        # (translation alias, voice alias) -> voice code of the active voices of active
+        # translations (the audio URL aliases); lowercase, MySQL compares them case-insensitively
+        self.voice_aliases = {}
+        for voice in voices:
+            translation = self.translations.get(voice['translation'], {})
+            if voice.get('active') and translation.get('active'):
+                key = (str(translation['alias']).lower(), str(voice['alias']).lower())
+                self.voice_aliases.setdefault(key, voice['code'])
+
+        self.languages = languages
+
+        # (translation, book_number) -> chapter numbers that have verses in this translation
+        chapters_by_book = {}
+        for row in chapters:
+            chapters_by_book.setdefault((row['translation'], row['book_number']), set()).add(row['chapter_number'])
+        self.chapters = {key: frozenset(numbers) for key, numbers in chapters_by_book.items()}
+        # book_number -> number of chapters according to bible_stat (reference data for checks)
+        self.bible_chapters_count = bible_chapters_count or {}
+
+        # translation_books: translation -> {book_number: book info}, the same
+        # dicts that get_books_info returned from MySQL
+        self.translation_books = {}
+        # translation -> {lowercase alias: book_number}, MySQL compares aliases case-insensitively
+        self.book_aliases = {}
+        for row in sorted(translation_books, key=lambda row: (row['translation'], row['book_number'])):
+            book = self.books.get(row['book_number'], {})
+            book_chapters = self.get_chapters(row['translation'], row['book_number'])
+            book_info = {
+                'code': row['code'],
+                'number': row['book_number'],
+                'name': row['name'],
+                'alias': book.get('code1'),
+                **{f'code{i}': book.get(f'code{i}') for i in range(2, 10)},
+                'chapters_count': max(book_chapters, default=0),
+            }
+            self.translation_books.setdefault(row['translation'], {})[row['book_number']] = book_info
+
+            aliases = self.book_aliases.setdefault(row['translation'], {})
+            for column in BOOK_ALIAS_COLUMNS:
+                if book.get(column):
+                    # the first book wins, as the first row of the former query did
+                    aliases.setdefault(str(book[column]).lower(), row['book_number'])
+
+    def is_stale(self, ttl: int = CATALOG_TTL) -> bool:
+        return self.expired or (ttl > 0 and time.monotonic() - self.loaded_at >= ttl)
+
+    def get_chapters(self, translation: int, book_number: int) -> frozenset:
+        return self.chapters.get((translation, book_number), frozenset())
+
+    def get_book_numbers(self, translation: int) -> list:
+        """Books that have verses in the translation, in order"""
+        return sorted(book_number for translation_code, book_number in self.chapters if translation_code == translation)
+
+    def get_voice_by_alias(self, translation_alias: str, voice_alias: str) -> Optional[dict]:
+        voice_code = self.voice_aliases.get((translation_alias.lower(), voice_alias.lower()))
+        return self.voices[voice_code] if voice_code is not None else None
+
+    def get_book_info(self, translation: int, alias: str) -> Optional[dict]:
+        book_number = self.book_aliases.get(translation, {}).get(alias.lower())
+        if book_number is None:
+            return None
+        return self.translation_books[translation][book_number]
+
+
+def load_catalog(cursor, version: int) -> Catalog:
+    """Read all reference tables with the given cursor (dictionary=True)"""
+    cursor.execute('''
+        SELECT number, code1, code2, code3, code4, code5, code6, code7, code8, code9, short_name_en, short_name_ru
+        FROM bible_books
+        ORDER BY number
+    ''')
+    books = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT code, alias, name, description, language, active
+        FROM translations
+    ''')
+    translations = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT code, alias, name, description, translation, is_music, link_template, active
+        FROM voices
+    ''')
+    voices = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT code, translation, book_number, name
+        FROM translation_books
+    ''')
+    translation_books = cursor.fetchall()
+
+    # Maintained by triggers on translation_verses, so the verses themselves are not scanned
+    cursor.execute('''
+        SELECT translation, book_number, chapter_number
+        FROM translation_chapters
+    ''')
+    chapters = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT book_number, max(chapter_number) AS chapters_count
+        FROM bible_stat
+        GROUP BY book_number
+    ''')
+    bible_chapters_count = {row['book_number']: row['chapters_count'] for row in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT alias, name_en, name_national
+        FROM languages
+    ''')
+    languages = cursor.fetchall()
+
+    bible_stat = [{'book_number': number, 'chapters_count': count} for number, count in bible_chapters_count.items()]
+    fingerprint = catalog_fingerprint(books, translations, voices, translation_books, chapters, languages, bible_stat)
+    return Catalog(version, books, translations, voices, translation_books, chapters, languages, bible_chapters_count,
+                   fingerprint)
+
+
+def catalog_fingerprint(*tables: list) -> str:
+    """Digest of table rows that does not depend on the order the rows were returned in"""
+    digest = hashlib.blake2b(digest_size=12)
+    for rows in tables:
+        for row in sorted(repr(sorted(row.items())) for row in rows):
+            digest.update(row.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+
+def _load_current(cursor=None) -> Catalog:
+    global _catalog
+    version = _catalog.version + 1 if _catalog is not None else 1
+    if cursor is not None:
+        catalog = load_catalog(cursor, version)
+    else:
+        connection = create_connection(readonly=True)
+        if connection is None:
+            raise RuntimeError("Failed to load catalog: no database connection")
+        own_cursor = connection.cursor(dictionary=True)
+        try:
+            catalog = load_catalog(own_cursor, version)
+        finally:
+            own_cursor.close()
+            connection.close()
+    _catalog = catalog
+    return catalog
+
+
+def refresh_catalog(cursor=None) -> Catalog:
+    """
+    Load a new snapshot and make it current.
+
+    Pass the cursor of a connection that has just committed a change to read it
+    back on the same connection; otherwise a read connection is checked out.
+    """
+    with _catalog_lock:
+        return _load_current(cursor)
+
+
+def invalidate_catalog():
+    """Reload the snapshot on next use (keeps serving it if the reload fails)"""
+    catalog = _catalog
+    if catalog is not None:
+        catalog.expired = True
+
+
+def get_catalog_fingerprint() -> str:
+    """Fingerprint of the current snapshot without loading or reloading it, '' before the first load"""
+    catalog = _catalog
+    return catalog.fingerprint if catalog is not None else ''
+
+
+def get_catalog() -> Catalog:
+    """Current snapshot; loads it on first use and reloads it after CATALOG_TTL"""
+    catalog = _catalog
+    if catalog is not None and not catalog.is_stale():
+        return catalog
+
+    with _catalog_lock:
+        # Another thread may have reloaded it while we were waiting
+        catalog = _catalog
+        if catalog is None:
+            return _load_current()
+        if catalog.is_stale():
+            try:
+                return _load_current()
+            except Exception as e:
+                # Keep serving the previous snapshot while the database is unavailable
+                print(f"The error '{e}' occurred while refreshing catalog")
+                catalog.loaded_at = time.monotonic()
+                catalog.expired = False
+        return catalog
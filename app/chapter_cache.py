@@ -0,0 +1,106 @@
+# chapter_cache.py
+"""
+Cache of assembled chapter documents.
+
+A chapter part (verses with effective alignment, titles, notes, audio link,
+prev/next links) is the same for every listener of a given
+(translation, book, chapter, voice), so it is kept as pre-serialized JSON of
+PartsWithAlignmentModel and served without touching MySQL.
+
+The cache is an LRU bounded by the total size of the stored documents
+(CHAPTER_CACHE_MAX_BYTES). Admin writes invalidate what they change:
+manual fixes and anomaly statuses drop one (voice, book, chapter), translation
+and voice updates drop everything of that translation or voice.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from config import CHAPTER_CACHE_MAX_BYTES
+
+
+class ChapterCache:
+    """Byte-budgeted LRU of chapter documents keyed by (translation, book, chapter, voice)"""
+
+    def __init__(self, max_bytes: int = CHAPTER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> bytes, most recently used last
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidation: a document built from data read before
+        # an invalidation must not be stored after it
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    def generation(self) -> int:
+        """Take before reading the data of a document that will be passed to put()"""
+        return self._generation
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: bytes, generation: int) -> bool:
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            if generation != self._generation:
+                return False
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+        return True
+
+    def _invalidate(self, predicate) -> int:
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if predicate(*key)]
+            for key in keys:
+                self._bytes -= len(self._entries.pop(key))
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def invalidate_chapter(self, voice: int, book_number: int, chapter_number: int) -> int:
+        return self._invalidate(
+            lambda t, b, c, v: v == voice and b == book_number and c == chapter_number
+        )
+
+    def invalidate_translation(self, translation: int) -> int:
+        return self._invalidate(lambda t, b, c, v: t == translation)
+
+    def invalidate_voice(self, voice: int) -> int:
+        return self._invalidate(lambda t, b, c, v: v == voice)
+
+    def clear(self) -> int:
+        return self._invalidate(lambda t, b, c, v: True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated,
+            }
+
+
+chapter_cache = ChapterCache()
@@ -0,0 +1,235 @@
+# compression.py
+"""
+Negotiated gzip/brotli compression of JSON responses.
+
+Chapter documents (text, html, notes, titles) and the translations list compress
+5-10x, so JSON bodies of at least COMPRESSION_MIN_SIZE bytes are sent with the
+best encoding the client accepts (br, then gzip). Brotli is optional: without the
+Brotli package only gzip is offered.
+
+Public data responses (those with an ETag, see http_cache.py) are served to many
+clients with the same body, so their compressed variants are kept in a
+byte-bounded LRU keyed by (body digest, encoding) and every body is compressed
+once. The digest is taken over the uncompressed body, so a variant can never be
+served for different content and the cache needs no invalidation.
+
+Streaming JSON responses (more_body) are compressed chunk by chunk and flushed
+after every chunk, so clients receive records as soon as they are produced.
+"""
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import (
+    COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY, COMPRESSION_CACHE_MAX_BYTES
+)
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson')
+# Bodies larger than this are compressed in a worker thread, not in the event loop
+THREAD_MIN_SIZE = 64 * 1024
+
+
+def supported_encodings() -> tuple:
+    """Encodings in order of preference"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding allowed by an Accept-Encoding header, None for identity"""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+    # gzip container, like gzip.compress() but without a timestamp, so variants are reproducible
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class StreamCompressor:
+    """Incremental compressor of a streaming response, flushed after every chunk"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes, last: bool) -> bytes:
+        if self.encoding == 'br':
+            data = self._compressor.process(chunk)
+            return data + (self._compressor.finish() if last else self._compressor.flush())
+        data = self._compressor.compress(chunk)
+        return data + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressedCache:
+    """Byte-budgeted LRU of compressed bodies keyed by (body digest, encoding)"""
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> bytes, most recently used last
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+compressed_cache = CompressedCache()
+
+
+def get_compressed(body: bytes, encoding: str, cache: Optional[CompressedCache] = None) -> bytes:
+    """Compressed body, taken from / stored in the cache when one is given"""
+    if cache is None:
+        return compress(body, encoding)
+    key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(body, encoding)
+        cache.put(key, compressed)
+    return compressed
+
+
+class CompressionMiddleware:
+    """ASGI middleware: compresses JSON responses with the encoding negotiated by Accept-Encoding"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, cache: CompressedCache = compressed_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        stream = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, stream, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if (message["status"] != 200 or content_type not in COMPRESSIBLE_TYPES
+                        or "content-encoding" in headers):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Headers are sent together with the first body chunk
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if stream is not None:
+                message["body"] = stream.compress(body, last=not more_body)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+
+            if more_body:
+                stream = StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                message["body"] = stream.compress(body, last=False)
+            elif len(body) >= self.minimum_size:
+                # Only responses of public data endpoints are repeated, see http_cache.py
+                cache = self.cache if "etag" in headers and self.cache.max_bytes > 0 else None
+                if len(body) >= THREAD_MIN_SIZE:
+                    compressed = await anyio.to_thread.run_sync(get_compressed, body, encoding, cache)
+                else:
+                    compressed = get_compressed(body, encoding, cache)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                message["body"] = compressed
+
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 def _get_int(name: str, default: int) -> int:
@@ -24,12 +25,97 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_NAME = os.getenv("DB_NAME", "cep")
 
+# Optional read replica. When DB_REPLICA_HOST is set, public read-only endpoints
+# use it; user/password/database default to the primary ones.
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST", "")
+DB_REPLICA_PORT = _get_int("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_USER = os.getenv("DB_REPLICA_USER", DB_USER)
+DB_REPLICA_PASSWORD = os.getenv("DB_REPLICA_PASSWORD", DB_PASSWORD)
+# After a commit in this process, reads stay on the primary for this many seconds
+# so that replica lag does not hide freshly written data
+DB_REPLICA_STICKY_SECONDS = _get_int("DB_REPLICA_STICKY_SECONDS", 5)
+
+# Connection pool settings
+DB_POOL_SIZE = _get_int("DB_POOL_SIZE", 10)
+DB_POOL_MAX_OVERFLOW = _get_int("DB_POOL_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _get_int("DB_POOL_TIMEOUT", 30)  # seconds to wait for a free connection
+DB_POOL_RECYCLE = _get_int("DB_POOL_RECYCLE", 3600)  # seconds, 0 = never recycle
+DB_POOL_PRE_PING = _get_int("DB_POOL_PRE_PING", 1) == 1
+
+# Worker threads used by async endpoints to run blocking DB code off the event loop
+DB_EXECUTOR_WORKERS = _get_int("DB_EXECUTOR_WORKERS", DB_POOL_SIZE)
+
+# Reference data catalog (books, translations, voices) is reloaded after this many
+# seconds even without admin updates; 0 = only on startup and admin updates
+CATALOG_TTL = _get_int("CATALOG_TTL", 3600)
+
+# Memory budget of the assembled chapter documents cache, bytes; 0 disables it
+CHAPTER_CACHE_MAX_BYTES = _get_int("CHAPTER_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# Cache-Control max-age of public JSON responses, seconds; clients revalidate with
+# If-None-Match afterwards (cheap 304 until an admin write changes the data)
+HTTP_CACHE_MAX_AGE = _get_int("HTTP_CACHE_MAX_AGE", 60)
+
+# Data version shared by the worker processes (ETags, invalidation of
+# process-local caches after an admin write in another worker)
+DATA_VERSION_FILE = os.getenv("DATA_VERSION_FILE", os.path.join(tempfile.gettempdir(), "bible-api-data-version"))
+
+# Negotiated gzip/brotli compression of JSON responses: bodies smaller than
+# COMPRESSION_MIN_SIZE bytes are sent as is; compressed variants of public data
+# responses are kept in a cache of COMPRESSION_CACHE_MAX_BYTES (0 disables it)
+COMPRESSION_MIN_SIZE = _get_int("COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_GZIP_LEVEL = _get_int("COMPRESSION_GZIP_LEVEL", 6)
+COMPRESSION_BROTLI_QUALITY = _get_int("COMPRESSION_BROTLI_QUALITY", 5)
+COMPRESSION_CACHE_MAX_BYTES = _get_int("COMPRESSION_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+
+# Directory of offline translation/voice packs (SQLite files and their manifests)
+PACKS_PATH = os.getenv("PACKS_PATH", "packs")
+
+# Directory of static JSON snapshots served by nginx (see app/snapshots.py);
+# empty disables refreshing them after admin writes
+SNAPSHOTS_PATH = os.getenv("SNAPSHOTS_PATH", "")
+
+# Production server (app/server.py): worker processes, keep-alive of idle client
+# connections and time given to running requests on shutdown, seconds
+WEB_CONCURRENCY = _get_int("WEB_CONCURRENCY", 1)
+SERVER_TIMEOUT_KEEP_ALIVE = _get_int("SERVER_TIMEOUT_KEEP_ALIVE", 5)
+SERVER_TIMEOUT_GRACEFUL_SHUTDOWN = _get_int("SERVER_TIMEOUT_GRACEFUL_SHUTDOWN", 30)
+# Threads running sync (def) endpoints in each worker process
+SYNC_THREADPOOL_SIZE = _get_int("SYNC_THREADPOOL_SIZE", 40)
+
+# Startup warm-up (app/warmup.py): catalog, audio coverage of active voices and
+# the chapters listed in WARMUP_CHAPTERS ("translation:book:chapter[:voice],...");
+# /api/ready answers 503 until it has finished
+WARMUP_ENABLED = _get_int("WARMUP_ENABLED", 1) == 1
+WARMUP_CHAPTERS = os.getenv("WARMUP_CHAPTERS", "")
+WARMUP_RETRY_SECONDS = _get_int("WARMUP_RETRY_SECONDS", 5)
+
+# Readiness checks (app/health.py): time limits of the DB ping and of the audio
+# storage check, latency percentiles over the last HEALTH_LATENCY_WINDOW requests
+# made within HEALTH_LATENCY_SECONDS
+HEALTH_DB_TIMEOUT_MS = _get_int("HEALTH_DB_TIMEOUT_MS", 1000)
+HEALTH_AUDIO_TIMEOUT_MS = _get_int("HEALTH_AUDIO_TIMEOUT_MS", 1000)
+HEALTH_LATENCY_WINDOW = _get_int("HEALTH_LATENCY_WINDOW", 1000)
+HEALTH_LATENCY_SECONDS = _get_int("HEALTH_LATENCY_SECONDS", 300)
+
 # Path to MP3 files storage (inside container)
 MP3_FILES_PATH = os.getenv("MP3_FILES_PATH", "audio")
 
 # Base URL for audio files
 AUDIO_BASE_URL = os.getenv("AUDIO_BASE_URL", "http://localhost:8000")
 
+# X-Accel-Redirect offload: when set (e.g. "/internal/audio/"), /audio checks the
+# API key and the file and lets nginx send it from this internal location
+# (deploy/nginx/audio.locations); empty = the app sends the file itself
+AUDIO_ACCEL_REDIRECT = os.getenv("AUDIO_ACCEL_REDIRECT", "")
+
+# Seconds a 404 for a missing mp3 file (with its alternative URL) is answered from memory
+AUDIO_MISSING_CACHE_SECONDS = _get_int("AUDIO_MISSING_CACHE_SECONDS", 30)
+
+# Ranges allowed in one Range header of an audio request (multipart/byteranges);
+# with more the whole file is sent, like nginx max_ranges
+AUDIO_MAX_RANGES = _get_int("AUDIO_MAX_RANGES", 16)
+
 # API Authorization settings (required)
 API_KEY = _require("API_KEY")
 
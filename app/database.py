@@ -1,21 +1,535 @@
 # database.py
+import asyncio
+import functools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
 import mysql.connector
 from mysql.connector import Error
 from config import *
 
-def create_connection():
+
+class PoolTimeoutError(Error):
+    """Raised when no pooled connection became available within DB_POOL_TIMEOUT"""
+
+
+def _connect(host: str = DB_HOST, port: int = DB_PORT, user: str = DB_USER, password: str = DB_PASSWORD):
+    return mysql.connector.connect(
+        host     = host,
+        user     = user,
+        password = password,
+        database = DB_NAME,
+        port     = port
+    )
+
+
+class PreparedSQL(str):
+    """
+    Marks a hot statement to be run as a server-side prepared statement.
+
+    Cursors of pooled connections prepare such a statement once per connection and
+    reuse it with bound parameters; any other cursor treats it as a plain string.
+    """
+
+
+_NAMED_PARAM = re.compile(r'%\((\w+)\)s')
+
+
+class StatementCache:
+    """Prepared statements of one raw connection, keyed by SQL text"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._statements = {}  # sql -> (prepared cursor, positional sql, param names or None)
+        self.hits = 0
+        self.misses = 0
+
+    def execute(self, sql: str, params=None) -> list:
+        entry = self._statements.get(sql)
+        if entry is None:
+            self.misses += 1
+            names = _NAMED_PARAM.findall(sql) or None
+            # Keep one canonical string object: the prepared cursor re-prepares
+            # whenever it gets a different object
+            positional = _NAMED_PARAM.sub('%s', sql) if names else str(sql)
+            entry = (self._raw.cursor(prepared=True, dictionary=True), positional, names)
+            self._statements[sql] = entry
+        else:
+            self.hits += 1
+        cursor, positional, names = entry
+        if names and isinstance(params, dict):
+            params = tuple(params[name] for name in names)
+        cursor.execute(positional, params)
+        # Always drain the result so the connection has no unread rows
+        return cursor.fetchall()
+
+    def close(self):
+        for cursor, _, _ in self._statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._statements.clear()
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class PooledCursor:
+    """
+    Cursor of a pooled connection.
+
+    Plain statements go to a regular cursor; PreparedSQL statements go through the
+    connection's StatementCache and their rows are served from a buffer.
+    """
+
+    def __init__(self, cursor, statements: StatementCache):
+        self._cursor = cursor
+        self._statements = statements
+        self._rows = None
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        if isinstance(operation, PreparedSQL):
+            self._rows = iter(self._statements.execute(operation, params))
+            return None
+        self._rows = None
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def fetchone(self):
+        if self._rows is not None:
+            return next(self._rows, None)
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = list(self._rows), iter(())
+            return rows
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int = 1):
+        if self._rows is not None:
+            return [row for _, row in zip(range(size), self._rows)]
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        if self._rows is not None:
+            return self._rows
+        return iter(self._cursor)
+
+    def close(self):
+        self._rows = None
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PooledConnection:
+    """
+    Proxy around a raw MySQL connection checked out from ConnectionPool.
+
+    Behaves like the underlying connection (cursor(), commit(), rollback(), ...),
+    but close() returns it to the pool instead of closing the socket.
+    Can be used as a context manager.
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw, created_at: float, statements: StatementCache):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._statements = statements
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if args or kwargs != {"dictionary": True}:
+            return cursor
+        return PooledCursor(cursor, self._statements)
+
+    def commit(self):
+        self._raw.commit()
+        self._pool.last_commit_at = time.monotonic()
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def discard(self):
+        """
+        Closes the socket instead of returning the connection to the pool: for a
+        connection with an unread (unbuffered) result, which close() would read to
+        the end during the rollback on release
+        """
+        if self._released:
+            return
+        self._released = True
+        self._pool._invalidate(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe MySQL connection pool.
+
+    Keeps up to `size` idle connections, allows `max_overflow` extra connections
+    under load (closed on release), waits up to `timeout` seconds for a free slot,
+    recycles connections older than `recycle` seconds and optionally pings
+    connections on checkout (pre-ping) to drop ones killed by the server.
+    """
+
+    def __init__(self, connect=_connect, size: int = 10, max_overflow: int = 10,
+                 timeout: float = 30, recycle: int = 3600, pre_ping: bool = True):
+        self._connect = connect
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = []  # list of (raw_connection, created_at)
+        self._statements = {}  # id(raw_connection) -> StatementCache
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self.last_commit_at = None  # monotonic time of the last commit made through this pool
+
+        # Monitoring counters
+        self._checkouts = 0
+        self._connects = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        started = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._in_use >= self.size + self.max_overflow:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            msg=f"Connection pool exhausted ({self._in_use} in use), timeout {self.timeout}s"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - started
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+            self._checkouts += 1
+            self._in_use += 1
+            item = self._idle.pop() if self._idle else None
+
+        # Network I/O happens outside the lock
+        try:
+            raw, created_at = self._checkout(item)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw, created_at, self._statement_cache(raw))
+
+    def _statement_cache(self, raw) -> StatementCache:
+        with self._cond:
+            cache = self._statements.get(id(raw))
+            if cache is None:
+                cache = self._statements[id(raw)] = StatementCache(raw)
+            return cache
+
+    def _checkout(self, item):
+        if item is not None:
+            raw, created_at = item
+            if self.recycle and time.monotonic() - created_at > self.recycle:
+                self._discard(raw)
+                with self._cond:
+                    self._recycled += 1
+            elif self.pre_ping and not self._is_alive(raw):
+                self._discard(raw)
+                with self._cond:
+                    self._invalidated += 1
+            else:
+                return raw, created_at
+
+        raw = self._connect()
+        with self._cond:
+            self._connects += 1
+        return raw, time.monotonic()
+
+    @staticmethod
+    def _is_alive(raw) -> bool:
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        with self._cond:
+            cache = self._statements.pop(id(raw), None)
+        if cache is not None:
+            cache.close()
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _invalidate(self, raw):
+        self._discard(raw)
+        with self._cond:
+            self._in_use -= 1
+            self._invalidated += 1
+            self._cond.notify()
+
+    def _release(self, raw, created_at: float):
+        # End any implicit transaction so the next user does not see a stale snapshot
+        healthy = True
+        try:
+            raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            keep = healthy and len(self._idle) < self.size
+            if keep:
+                self._idle.append((raw, created_at))
+            self._cond.notify()
+        if not keep:
+            self._discard(raw)
+
+    def ping(self) -> str:
+        """
+        Health check without a new connection per call.
+
+        Pings an idle connection; when every connection is checked out the server
+        is answering them, so 'busy' is returned without waiting for one. Only an
+        empty pool connects, and that connection stays in the pool for the next
+        checks. Raises when the server does not answer.
+        """
+        with self._cond:
+            if self._idle:
+                item = self._idle.pop()
+            elif self._in_use:
+                return "busy"
+            else:
+                item = None
+            self._in_use += 1
+
+        try:
+            # Pre-ping drops a connection killed by the server and connects a replacement
+            raw, created_at = self._checkout(item)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        if item is not None and raw is item[0] and not self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._invalidate(raw)
+                raise
+        self._release(raw, created_at)
+        return "ok"
+
+    def dispose(self):
+        """Close all idle connections (checked out connections are closed on release)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "overflow": max(0, self._in_use + len(self._idle) - self.size),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "connects": self._connects,
+                "recycled": self._recycled,
+                "invalidated": self._invalidated,
+                "timeouts": self._timeouts,
+                "wait_time_total": round(self._wait_time_total, 6),
+                "wait_time_avg": round(self._wait_time_total / self._checkouts, 6) if self._checkouts else 0.0,
+                "wait_time_max": round(self._wait_time_max, 6),
+                "prepared_statements": sum(len(cache) for cache in self._statements.values()),
+                "prepared_hits": sum(cache.hits for cache in self._statements.values()),
+                "prepared_misses": sum(cache.misses for cache in self._statements.values()),
+            }
+
+
+_pool = None
+_replica_pool = None
+_pool_lock = threading.Lock()
+
+
+def _new_pool(connect) -> ConnectionPool:
+    return ConnectionPool(
+        connect      = connect,
+        size         = DB_POOL_SIZE,
+        max_overflow = DB_POOL_MAX_OVERFLOW,
+        timeout      = DB_POOL_TIMEOUT,
+        recycle      = DB_POOL_RECYCLE,
+        pre_ping     = DB_POOL_PRE_PING,
+    )
+
+
+def get_pool() -> ConnectionPool:
+    """Pool for the primary server (all writes and admin reads)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _new_pool(_connect)
+    return _pool
+
+
+def get_replica_pool() -> Optional[ConnectionPool]:
+    """Pool for the read replica, None when DB_REPLICA_HOST is not configured"""
+    global _replica_pool
+    if not DB_REPLICA_HOST:
+        return None
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                _replica_pool = _new_pool(functools.partial(
+                    _connect,
+                    host     = DB_REPLICA_HOST,
+                    port     = DB_REPLICA_PORT,
+                    user     = DB_REPLICA_USER,
+                    password = DB_REPLICA_PASSWORD,
+                ))
+    return _replica_pool
+
+
+def get_read_pool() -> ConnectionPool:
+    """
+    Pool for read-only queries.
+
+    Returns the replica pool, except when no replica is configured or this process
+    committed a write less than DB_REPLICA_STICKY_SECONDS ago (read-your-writes).
+    Writes of other workers count too once they are seen (see note_commit).
+    """
+    replica = get_replica_pool()
+    if replica is None:
+        return get_pool()
+    last_commit_at = get_pool().last_commit_at
+    if last_commit_at is not None and time.monotonic() - last_commit_at < DB_REPLICA_STICKY_SECONDS:
+        return get_pool()
+    return replica
+
+
+def note_commit(committed_at: float):
+    """
+    A write committed by another process at committed_at (time.time()): reads of
+    this process go to the primary for the rest of the DB_REPLICA_STICKY_SECONDS
+    window, as after a commit of its own
+    """
+    pool = get_pool()
+    commit_at = time.monotonic() - max(0.0, time.time() - committed_at)
+    if pool.last_commit_at is None or commit_at > pool.last_commit_at:
+        pool.last_commit_at = commit_at
+
+
+def _acquire(readonly: bool) -> PooledConnection:
+    pool = get_read_pool() if readonly else get_pool()
+    try:
+        return pool.acquire()
+    except Error:
+        # Replica is down or exhausted: serve the read from the primary
+        if pool is get_pool():
+            raise
+        return get_pool().acquire()
+
+
+def create_connection(readonly: bool = False):
+    """
+    Check out a pooled connection; connection.close() returns it to the pool.
+
+    readonly=True routes the connection to the read replica (if configured),
+    falling back to the primary when the replica is unavailable.
+    """
     connection = None
     try:
-        connection = mysql.connector.connect(
-            host     = DB_HOST,
-            user     = DB_USER,
-            password = DB_PASSWORD,
-            database = DB_NAME,
-			port     = DB_PORT
-        )
-        print("Connection to MySQL DB successful")
+        connection = _acquire(readonly)
     except Error as e:
         print(f"The error '{e}' occurred")
 
     return connection
-	
\ No newline at end of file
+
+
+@contextmanager
+def get_connection(readonly: bool = False):
+    """
+    Context manager for a pooled connection:
+
+        with get_connection(readonly=True) as connection:
+            cursor = connection.cursor(dictionary=True)
+            ...
+    """
+    connection = _acquire(readonly)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def get_pool_stats() -> dict:
+    stats = {"primary": get_pool().stats()}
+    replica = get_replica_pool()
+    if replica is not None:
+        stats["replica"] = replica.stats()
+    return stats
+
+
+_executor = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, DB_EXECUTOR_WORKERS),
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+
+async def run_in_db_thread(func, *args, **kwargs):
+    """
+    Run blocking DB code in the bounded DB thread pool and await the result.
+
+    Used by async endpoints so that mysql.connector calls never block the event loop.
+    The pool is sized by DB_EXECUTOR_WORKERS (defaults to DB_POOL_SIZE), so at most
+    that many queries are in flight per worker process.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional
-from database import create_connection
+from database import create_connection, run_in_db_thread, PreparedSQL
+from catalog import get_catalog
+from chapter_cache import chapter_cache
+from responses import FastJSONResponse
+from http_cache import ConditionalGet
 import re
 import os
 from pathlib import Path
@@ -13,15 +17,9 @@ from auth import RequireAPIKey
 router = APIRouter()
 
 def get_translation_name(cursor, translation: int) -> str:
-    query = '''
-        SELECT name
-        FROM translations
-        WHERE code = %s
-          AND active=1
-    '''
-    cursor.execute(query, (translation,))
-    result = cursor.fetchone()
-    if not result:
+    # Справочники берутся из каталога в памяти, cursor оставлен для совместимости вызовов
+    result = get_catalog().translations.get(translation)
+    if not result or not result['active']:
         raise HTTPException(
             status_code=422, 
             detail=f"Translation {translation} not found."
@@ -30,27 +28,25 @@ def get_translation_name(cursor, translation: int) -> str:
     return result['name']
     
 def get_voice_info(cursor, voice: int, translation: int) -> dict:
-    query = '''
-        SELECT v.name, v.link_template, v.alias as voice_alias, t.alias as translation_alias
-        FROM voices v
-        JOIN translations t ON v.translation = t.code
-        WHERE v.code = %s
-          AND v.translation = %s
-          AND v.active=1
-          AND t.active=1
-    '''
-    cursor.execute(query, (voice, translation,))
-    result = cursor.fetchone()
-    if not result:
+    catalog = get_catalog()
+    voice_row = catalog.voices.get(voice)
+    translation_row = catalog.translations.get(translation)
+    if (not voice_row or voice_row['translation'] != translation or not voice_row['active']
+            or not translation_row or not translation_row['active']):
         raise HTTPException(
             status_code=422, 
             detail=f"Voice {voice} not found for translation {translation}."
         )
     
-    return result
+    return {
+        'name': voice_row['name'],
+        'link_template': voice_row['link_template'],
+        'voice_alias': voice_row['alias'],
+        'translation_alias': translation_row['alias'],
+    }
 
 
-@lru_cache(maxsize=20)  # Cache for translation+voice combinations
+@lru_cache(maxsize=128)  # Cache for translation+voice combinations (all voices are scanned on warm-up)
 def get_all_existing_audio_chapters(translation_alias: str, voice_alias: str) -> dict:
     """
     Получает список всех существующих глав для всех книг (с кешированием)
@@ -133,13 +129,7 @@ def check_audio_file_exists(translation_alias: str, voice_alias: str, book_numbe
 
 
 def get_book_number(cursor: int, book_alias: str) -> str:
-    query = '''
-        SELECT number 
-        FROM bible_books 
-        WHERE code1 = %s 
-    '''
-    cursor.execute(query, (book_alias,))
-    result = cursor.fetchone()
+    result = get_catalog().book_numbers.get(book_alias)
     
     if not result:
         raise HTTPException(
@@ -147,15 +137,9 @@ def get_book_number(cursor: int, book_alias: str) -> str:
             detail=f"Book '{book_alias}' not found."
         )
     
-    return str(result['number'])
+    return str(result)
 def get_book_alias(cursor: int, book_number: str) -> str:
-    query = '''
-        SELECT code1
-        FROM bible_books 
-        WHERE number = %s
-    '''
-    cursor.execute(query, (book_number,))
-    result = cursor.fetchone()
+    result = get_catalog().books.get(int(book_number))
     
     if not result:
         raise HTTPException(
@@ -183,154 +167,248 @@ def get_chapter_data(cursor, translation: int, book_info: dict, chapter_number:
     Returns:
         dict: Словарь с данными главы
     """
-    # Формирование SQL-запроса для получения стихов с учетом корректировок
-    verses_query = '''
+    chapter_data = get_chapters_data(cursor, translation, [(book_info, chapter_number, start_verse, end_verse)], voice, voice_info)[0]
+    if not chapter_data['verses']:
+        raise HTTPException(
+            status_code=422, 
+            detail=f"No verses found for book {book_info['number']}, chapter {chapter_number}."
+        )
+    return chapter_data
+
+
+# Запросы не больше чем на столько частей выполняются как подготовленные
+# (форма запроса зависит только от числа частей)
+PREPARED_MAX_PARTS = 8
+# Диапазон стихов, которым задается глава целиком
+ALL_VERSES = (0, 32767)
+
+
+def get_chapters_data(cursor, translation: int, chapters: list, voice: Optional[int] = None, voice_info: Optional[dict] = None) -> list:
+    """
+    Получает данные нескольких глав (частей отрывка) одним запросом
+    
+    Стихи (с учетом корректировок), заголовки и примечания всех частей
+    загружаются одним запросом (UNION ALL по ключу перевод/книга/глава/диапазон)
+    за один round-trip и раскладываются по частям в Python. Части могут
+    пересекаться, строка попадает в каждую часть, в диапазон которой входит.
+    Несколько целых глав одной книги подряд выбираются по диапазону глав
+    (chapter_number BETWEEN), а не отдельным условием на каждую главу.
+    
+    Args:
+        cursor: Курсор базы данных
+        translation: Код перевода
+        chapters: Список частей (book_info, chapter_number, start_verse, end_verse),
+            start_verse/end_verse равны None для главы целиком
+        voice: Код голоса (опционально)
+        voice_info: Информация о голосе (опционально)
+    
+    Returns:
+        list: Словари с данными глав в порядке частей; для части без стихов
+            список 'verses' пуст
+    """
+    params = {
+        'voice': voice,
+        'translation': translation,
+    }
+    
+    # Фильтр по главам (и диапазонам стихов) для всех частей запроса
+    ranges = []
+    part_filters = []
+    for i, (book_info, chapter_number, start_verse, end_verse) in enumerate(chapters):
+        if start_verse is not None:
+            verse_range = (start_verse, end_verse if end_verse else start_verse)
+        else:
+            verse_range = ALL_VERSES
+        ranges.append((book_info['number'], chapter_number) + verse_range)
+        params.update({
+            f'book_number_{i}': book_info['number'],
+            f'chapter_number_{i}': chapter_number,
+            f'start_verse_{i}': verse_range[0],
+            f'end_verse_{i}': verse_range[1],
+        })
+        part_filters.append(f'''(
+                v.book_number = %(book_number_{i})s
+                AND v.chapter_number = %(chapter_number_{i})s
+                AND v.verse_number BETWEEN %(start_verse_{i})s AND %(end_verse_{i})s
+            )''')
+    verse_filter = '''
+            v.translation = %(translation)s
+            AND (''' + '''
+            OR '''.join(part_filters) + ''')
+    '''
+
+    is_chapter_range = len(ranges) > 1 and all(
+        (book_number, start_verse, end_verse) == (ranges[0][0],) + ALL_VERSES and chapter_number == ranges[0][1] + i
+        for i, (book_number, chapter_number, start_verse, end_verse) in enumerate(ranges)
+    )
+    if is_chapter_range:
+        # Целые главы одной книги подряд: форма запроса не зависит от их числа
+        params = {
+            'voice': voice,
+            'translation': translation,
+            'book_number': ranges[0][0],
+            'first_chapter': ranges[0][1],
+            'last_chapter': ranges[-1][1],
+        }
+        verse_filter = '''
+            v.translation = %(translation)s
+            AND v.book_number = %(book_number)s
+            AND v.chapter_number BETWEEN %(first_chapter)s AND %(last_chapter)s
+    '''
+    
+    # kind: 1 - стих (с учетом корректировок), 2 - заголовок, 3 - примечание
+    chapter_query = '''
         SELECT 
-            v.code, v.verse_number, v.verse_number_join, v.html, v.text, v.start_paragraph,
+            1 AS kind, v.code AS code, v.verse_number AS number, v.verse_number_join, v.text, v.html, v.start_paragraph,
             COALESCE(vmf.begin, a.begin) as begin,
-            COALESCE(vmf.end, a.end) as end
+            COALESCE(vmf.end, a.end) as end,
+            NULL AS verse_code, NULL AS title_code, NULL AS metadata, NULL AS reference, NULL AS subtitle,
+            NULL AS position_text, NULL AS position_html,
+            v.book_number AS book_number, v.chapter_number AS chapter_number, v.verse_number AS verse_number
         FROM translation_verses AS v
             LEFT JOIN voice_alignments a ON (
                 a.voice = %(voice)s AND 
-                a.book_number = %(book_number)s AND 
-                a.chapter_number = %(chapter_number)s AND 
+                a.book_number = v.book_number AND 
+                a.chapter_number = v.chapter_number AND 
                 a.verse_number = v.verse_number
             )
             LEFT JOIN voice_manual_fixes vmf ON (
                 vmf.voice = %(voice)s AND 
-                vmf.book_number = %(book_number)s AND 
-                vmf.chapter_number = %(chapter_number)s AND 
+                vmf.book_number = v.book_number AND 
+                vmf.chapter_number = v.chapter_number AND 
                 vmf.verse_number = v.verse_number
             )
-        WHERE v.translation = %(translation)s
-            AND v.book_number = %(book_number)s
-            AND v.chapter_number = %(chapter_number)s
+        WHERE ''' + verse_filter + '''
+        UNION ALL
+        SELECT 
+            2, t.code, v.verse_number, NULL, t.text, NULL, NULL, NULL, NULL,
+            t.before_translation_verse, NULL, t.metadata, t.reference, t.subtitle,
+            t.position_text, t.position_html,
+            v.book_number, v.chapter_number, v.verse_number
+        FROM translation_titles AS t
+            JOIN translation_verses AS v ON v.code = t.before_translation_verse
+        WHERE ''' + verse_filter + '''
+        UNION ALL
+        SELECT 
+            3, n.code, n.note_number, NULL, n.text, NULL, NULL, NULL, NULL,
+            n.translation_verse, n.translation_title, NULL, NULL, NULL,
+            n.position_text, n.position_html,
+            v.book_number, v.chapter_number, v.verse_number
+        FROM translation_notes AS n
+            JOIN translation_verses AS v ON v.code = n.translation_verse
+        WHERE ''' + verse_filter + '''
+        UNION ALL
+        SELECT 
+            3, n.code, n.note_number, NULL, n.text, NULL, NULL, NULL, NULL,
+            n.translation_verse, n.translation_title, NULL, NULL, NULL,
+            n.position_text, n.position_html,
+            v.book_number, v.chapter_number, v.verse_number
+        FROM translation_notes AS n
+            JOIN translation_titles AS t ON t.code = n.translation_title
+            JOIN translation_verses AS v ON v.code = t.before_translation_verse
+        WHERE n.translation_verse IS NULL AND ''' + verse_filter + '''
+        ORDER BY kind, number, code
     '''
     
-    params = {
-        'voice': voice,
-        'translation': translation,
-        'book_number': book_info['number'],
-        'chapter_number': chapter_number,
-    }
+    # Подготовленный запрос: MySQL разбирает его один раз на соединение
+    if len(chapters) <= PREPARED_MAX_PARTS or is_chapter_range:
+        chapter_query = PreparedSQL(chapter_query)
+    cursor.execute(chapter_query, params)
+    rows = cursor.fetchall()
+
+    result = split_chapter_rows(rows, ranges)
+
+    for data, (book_info, chapter_number, _, _) in zip(result, chapters):
+        data['audio_link'] = get_audio_link(voice_info, book_info['number'], chapter_number)
+    return result
+
+
+def split_chapter_rows(rows: list, ranges: list) -> list:
+    """
+    Раскладывает строки запроса get_chapters_data по частям
     
-    # Добавляем фильтрацию по диапазону стихов, если указано
-    if start_verse is not None:
-        params['start_verse'] = start_verse
-        params['end_verse'] = end_verse if end_verse else start_verse
-        if start_verse == end_verse:
-            verses_query += '''
-                AND v.verse_number = %(start_verse)s
-            '''
-        else:
-            verses_query += '''
-                AND v.verse_number BETWEEN %(start_verse)s AND %(end_verse)s
-            '''
+    Стихи, заголовки и примечания собираются сразу словарями в форме
+    VerseWithAlignmentModel, TitleModel и NoteModel, без создания моделей:
+    ответ сериализуется orjson напрямую (см. responses.py).
     
-    verses_query += '''
-        ORDER BY v.verse_number
-    '''
+    Args:
+        rows: Строки запроса (kind, поля элемента, book_number/chapter_number/verse_number)
+        ranges: Части (book_number, chapter_number, start_verse, end_verse)
     
-    cursor.execute(verses_query, params)
-    verses_results = cursor.fetchall()
+    Returns:
+        list: Словари {'verses', 'titles', 'notes'} в порядке частей
+    """
+    result = [{'verses': [], 'titles': [], 'notes': []} for _ in ranges]
+    parts_by_chapter = {}
+    for index, (book_number, chapter_number, start_verse, end_verse) in enumerate(ranges):
+        parts_by_chapter.setdefault((book_number, chapter_number), []).append((index, start_verse, end_verse))
+    for row in rows:
+        key, item = chapter_row_item(row)
+        for index, start_verse, end_verse in parts_by_chapter[(row['book_number'], row['chapter_number'])]:
+            if start_verse <= row['verse_number'] <= end_verse:
+                result[index][key].append(item)
+    return result
 
-    if not verses_results:
-        raise HTTPException(
-            status_code=422, 
-            detail=f"No verses found for book {book_info['number']}, chapter {chapter_number}."
-        )
 
-    verses = []
-    for verse in verses_results:
-        if verse['begin'] is None or verse['end'] is None:
-            verse['begin'] = 0
-            verse['end'] = 0
-        
-        verse_model = VerseWithAlignmentModel(
-            code=verse['code'],
-            number=verse['verse_number'],
-            join=verse['verse_number_join'],
-            html=verse['html'],
-            text=verse['text'],
-            begin=verse['begin'],
-            end=verse['end'] if verse['end'] is not None else 0.0,
-            start_paragraph=verse['start_paragraph']
-        )
-        verses.append(verse_model)
-
-    # Ссылка на медиафайл
-    audio_link = ''
-    if voice_info:
-        # Проверяем, существует ли аудиофайл в папке audio
-        if check_audio_file_exists(
-            voice_info['translation_alias'], 
-            voice_info['voice_alias'], 
-            book_info['number'], 
-            chapter_number
-        ):
-            # Если файл существует, формируем ссылку на внутренний эндпоинт
-            book_str = str(book_info['number']).zfill(2)
-            chapter_str = str(chapter_number).zfill(2)
-            audio_link = f"{AUDIO_BASE_URL}/audio/{voice_info['translation_alias']}/{voice_info['voice_alias']}/{book_str}/{chapter_str}.mp3"
-
-    codes = ", ".join(str(verse.code) for verse in verses)
-    
-    # Заголовки
-    titles_query = '''
-        SELECT code, text, before_translation_verse, metadata, reference, subtitle, position_text, position_html
-        FROM translation_titles
-        WHERE before_translation_verse IN (%s)
-    ''' % codes
-    cursor.execute(titles_query)
-    titles_results = cursor.fetchall()
-    titles = []
-    title_codes = []
-    for title in titles_results:
-        title_model = TitleModel(
-            code=title['code'],
-            text=title['text'],
-            before_verse_code=title['before_translation_verse'],
-            metadata=title['metadata'],
-            reference=title['reference'],
-            subtitle=bool(title['subtitle']),
-            position_text=title['position_text'],
-            position_html=title['position_html']
-        )
-        titles.append(title_model)
-        title_codes.append(str(title['code']))
-
-    # Примечания для стихов и заголовков
-    notes_query = '''
-        SELECT code, note_number, text, translation_verse, translation_title, position_text, position_html
-        FROM translation_notes
-        WHERE translation_verse IN (%s)
-    ''' % codes
-    
-    if title_codes:
-        title_codes_str = ", ".join(title_codes)
-        notes_query += ''' OR translation_title IN (%s)''' % title_codes_str
-    
-    cursor.execute(notes_query)
-    notes_results = cursor.fetchall()
-    notes = []
-    for note in notes_results:
-        note_model = NoteModel(
-            code=note['code'],
-            number=note['note_number'],
-            text=note['text'],
-            verse_code=note['translation_verse'],
-            title_code=note['translation_title'],
-            position_text=note['position_text'],
-            position_html=note['position_html']
-        )
-        notes.append(note_model)
+def chapter_row_item(row: dict) -> tuple:
+    """Элемент главы из строки запроса get_chapters_data: ('verses' | 'titles' | 'notes', словарь элемента)"""
+    kind = row['kind']
+    if kind == 1:
+        has_timing = row['begin'] is not None and row['end'] is not None
+        item = {
+            'code': row['code'],
+            'number': row['number'],
+            'join': row['verse_number_join'],
+            'text': row['text'],
+            'html': row['html'],
+            'begin': float(row['begin']) if has_timing else 0.0,
+            'end': float(row['end']) if has_timing else 0.0,
+            'start_paragraph': bool(row['start_paragraph']),
+        }
+        key = 'verses'
+    elif kind == 2:
+        item = {
+            'code': row['code'],
+            'text': row['text'],
+            'before_verse_code': row['verse_code'],
+            'metadata': row['metadata'],
+            'reference': row['reference'],
+            'subtitle': bool(row['subtitle']),
+            'position_text': row['position_text'],
+            'position_html': row['position_html'],
+        }
+        key = 'titles'
+    else:
+        item = {
+            'code': row['code'],
+            'number': row['number'],
+            'text': row['text'],
+            'verse_code': row['verse_code'],
+            'title_code': row['title_code'],
+            'position_text': row['position_text'],
+            'position_html': row['position_html'],
+        }
+        key = 'notes'
+    return key, item
+
+
+def get_audio_link(voice_info: Optional[dict], book_number: int, chapter_number: int) -> str:
+    """Ссылка на медиафайл главы или пустая строка, если голоса или файла нет"""
+    if not voice_info:
+        return ''
+    # Проверяем, существует ли аудиофайл в папке audio
+    if not check_audio_file_exists(
+        voice_info['translation_alias'], 
+        voice_info['voice_alias'], 
+        book_number, 
+        chapter_number
+    ):
+        return ''
+    # Если файл существует, формируем ссылку на внутренний эндпоинт
+    book_str = str(book_number).zfill(2)
+    chapter_str = str(chapter_number).zfill(2)
+    return f"{AUDIO_BASE_URL}/audio/{voice_info['translation_alias']}/{voice_info['voice_alias']}/{book_str}/{chapter_str}.mp3"
 
-    return {
-        'verses': verses,
-        'titles': titles,
-        'notes': notes,
-        'audio_link': audio_link
-    }
 
 """
 def get_book_name(cursor: int, translation: int, book_number: str) -> str:
@@ -356,8 +434,8 @@ def get_book_name(cursor: int, translation: int, book_number: str) -> str:
 class SimpleErrorResponse(BaseModel):
     detail: str
 
-@router.get('/chapter_with_alignment', response_model=ExcerptWithAlignmentModel, operation_id="get_chapter_with_alignment", responses={422: {"model": SimpleErrorResponse}}, tags=["Excerpts"])
-async def get_chapter_with_alignment(translation: int, book_number: int, chapter_number: int, voice: Optional[int] = None, api_key: bool = RequireAPIKey):
+@router.get('/chapter_with_alignment', response_model=ExcerptWithAlignmentModel, response_class=FastJSONResponse, operation_id="get_chapter_with_alignment", responses={422: {"model": SimpleErrorResponse}}, tags=["Excerpts"])
+async def get_chapter_with_alignment(translation: int, book_number: int, chapter_number: int, voice: Optional[int] = None, api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
     """
     Получить главу с выравниванием по номеру книги и главы
     
@@ -370,136 +448,192 @@ async def get_chapter_with_alignment(translation: int, book_number: int, chapter
     Returns:
         ExcerptWithAlignmentModel: Данные главы с выравниванием
     """
-    connection = create_connection()
-    cursor = connection.cursor(dictionary=True)
-    try:
-        # Валидация входных параметров
-        if book_number < 1 or book_number > 66:
-            raise HTTPException(
-                status_code=422,
-                detail=f"Invalid book number ({book_number}). Must be between 1 and 66."
-            )
-        
-        if chapter_number < 1:
-            raise HTTPException(
-                status_code=422,
-                detail=f"Invalid chapter number ({chapter_number}). Must be greater than 0."
-            )
-        
-        translation_name = get_translation_name(cursor, translation)
-        voice_info = get_voice_info(cursor, voice, translation) if voice else None
-
-        # Получаем информацию о книге по номеру
-        cursor.execute('''
-            SELECT tb.code, tb.book_number AS number, tb.name, bb.code1 AS alias, bb.code2, bb.code3, bb.code4, bb.code5, bb.code6, bb.code7, bb.code8, bb.code9,
-                   (SELECT max(chapter_number) FROM translation_verses WHERE book_number = tb.book_number) AS chapters_count
-            FROM translation_books AS tb
-            LEFT JOIN bible_books AS bb ON bb.number = tb.book_number
-            WHERE tb.translation = %s AND tb.book_number = %s
-        ''', (translation, book_number))
-        
-        book_info = cursor.fetchone()
-        if not book_info:
-            raise HTTPException(
-                status_code=422, 
-                detail=f"Book {book_number} not found for translation {translation}."
-            )
-        
-        # Проверяем, что глава существует
-        if chapter_number > book_info['chapters_count']:
-            raise HTTPException(
-                status_code=422,
-                detail=f"Chapter {chapter_number} not found. Book {book_number} has only {book_info['chapters_count']} chapters."
-            )
+    # Блокирующие запросы к MySQL выполняются в пуле потоков, а не в event loop
+    response = await run_in_db_thread(build_chapter_with_alignment, translation, book_number, chapter_number, voice)
+    response.headers.update(validators)
+    return response
 
-        # Получаем данные главы через общую функцию
-        chapter_data = get_chapter_data(cursor, translation, book_info, chapter_number, voice, voice_info)
-
-        part = PartsWithAlignmentModel(
-            book=book_info,
-            prev_excerpt=get_prev_excerpt(cursor, translation, book_info, chapter_number),
-            next_excerpt=get_next_excerpt(cursor, translation, book_info, chapter_number),
-            chapter_number=chapter_number,
-            audio_link=chapter_data['audio_link'],
-            verses=chapter_data['verses'],
-            notes=chapter_data['notes'],
-            titles=chapter_data['titles']
+
+def build_chapter_with_alignment(translation: int, book_number: int, chapter_number: int, voice: Optional[int] = None) -> FastJSONResponse:
+    """Синхронная сборка ответа /chapter_with_alignment (выполняется в пуле потоков БД)"""
+    # Валидация входных параметров
+    if book_number < 1 or book_number > 66:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid book number ({book_number}). Must be between 1 and 66."
+        )
+    
+    if chapter_number < 1:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid chapter number ({chapter_number}). Must be greater than 0."
         )
+    
+    get_translation_name(None, translation)
+    voice_info = get_voice_info(None, voice, translation) if voice else None
+
+    # Получаем информацию о книге по номеру
+    book_info = get_catalog().translation_books.get(translation, {}).get(book_number)
+    book_info = dict(book_info) if book_info else None
+    if not book_info:
+        raise HTTPException(
+            status_code=422, 
+            detail=f"Book {book_number} not found for translation {translation}."
+        )
+    
+    # Проверяем, что глава существует
+    if chapter_number > book_info['chapters_count']:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Chapter {chapter_number} not found. Book {book_number} has only {book_info['chapters_count']} chapters."
+        )
+
+    key = (translation, book_number, chapter_number, voice)
+    part_json = chapter_cache.get(key)
+    if part_json is None:
+        generation = chapter_cache.generation()
+        connection = create_connection(readonly=True)
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # Получаем данные главы через общую функцию
+            chapter_data = get_chapter_data(cursor, translation, book_info, chapter_number, voice, voice_info)
+        finally:
+            cursor.close()
+            connection.close()
+        part_json = build_part_json(translation, book_info, chapter_number, chapter_data)
+        chapter_cache.put(key, part_json, generation)
+
+    title = f"{book_info['name']} {chapter_number}"
+
+    return excerpt_response(title, True, [part_json])
+
+
+def build_part_json(translation: int, book_info: dict, chapter_number: int, chapter_data: dict) -> bytes:
+    """Сериализованная часть отрывка (PartsWithAlignmentModel) в том виде, в котором она хранится в кеше глав"""
+    part = {
+        'book': {
+            'code': book_info['code'],
+            'number': book_info['number'],
+            'alias': book_info['alias'],
+            'name': book_info['name'],
+            'chapters_count': book_info['chapters_count'],
+        },
+        'chapter_number': chapter_number,
+        'audio_link': chapter_data['audio_link'],
+        'prev_excerpt': get_prev_excerpt(None, translation, book_info, chapter_number),
+        'next_excerpt': get_next_excerpt(None, translation, book_info, chapter_number),
+        'verses': chapter_data['verses'],
+        'notes': chapter_data['notes'],
+        'titles': chapter_data['titles'],
+    }
+    return FastJSONResponse.encode(part)
+
+
+def excerpt_response(title: str, is_single_chapter: bool, parts_json: list) -> FastJSONResponse:
+    """Ответ ExcerptWithAlignmentModel, собранный из уже сериализованных частей"""
+    return FastJSONResponse(b''.join([
+        b'{"title":', FastJSONResponse.encode(title),
+        b',"is_single_chapter":', b'true' if is_single_chapter else b'false',
+        b',"parts":[', b','.join(parts_json), b']}',
+    ]))
 
-        title = f"{book_info['name']} {chapter_number}"
 
-        return ExcerptWithAlignmentModel(
-            title=title, 
-            is_single_chapter=True,
-            parts=[part]
+# Регулярное выражение для парсинга строки отрывка
+EXCERPT_PATTERN = re.compile(r'(?P<book>[0-9a-z]+) (?P<chapter>\d+)(:(?P<start_verse>\d+)(?:-(?P<end_verse>\d+))?)?')
+
+
+@router.get('/excerpt_with_alignment', response_model=ExcerptWithAlignmentModel, response_class=FastJSONResponse, operation_id="get_excerpt_with_alignment", responses={422: {"model": SimpleErrorResponse}}, tags=["Excerpts"])
+async def get_excerpt_with_alignment(translation: int, excerpt: str, voice: Optional[int] = None, api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
+    # Блокирующие запросы к MySQL выполняются в пуле потоков, а не в event loop
+    response = await run_in_db_thread(build_excerpt_with_alignment, translation, excerpt, voice)
+    response.headers.update(validators)
+    return response
+
+
+def build_excerpt_with_alignment(translation: int, excerpt: str, voice: Optional[int] = None) -> FastJSONResponse:
+    """Синхронная сборка ответа /excerpt_with_alignment (выполняется в пуле потоков БД)"""
+    get_translation_name(None, translation)
+    voice_info = get_voice_info(None, voice, translation) if voice else None
+
+    matches = list(EXCERPT_PATTERN.finditer(excerpt))
+    
+    if not matches:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid excerpt format ({excerpt})."
         )
+
+    parts = build_excerpt_parts(translation, matches, voice, voice_info)
+
+    is_single_chapter = all(match.group('start_verse') is None for match in matches)
     
-    except HTTPException as e:
-        raise e
-    finally:
-        cursor.close()
-        connection.close()
+    if len(parts) == 1:
+        book_info, chapter_number, _ = parts[0]
+        title = f"{book_info['name']} {chapter_number}"
+    elif len(parts) > 1:
+        is_single_chapter = False
+        title = f"Excerpt {excerpt}"
+    else:
+        title = ''
 
+    return excerpt_response(title, is_single_chapter, [part_json for _, _, part_json in parts])
 
-@router.get('/excerpt_with_alignment', response_model=ExcerptWithAlignmentModel, operation_id="get_excerpt_with_alignment", responses={422: {"model": SimpleErrorResponse}}, tags=["Excerpts"])
-async def get_excerpt_with_alignment(translation: int, excerpt: str, voice: Optional[int] = None, api_key: bool = RequireAPIKey):
-    connection = create_connection()
-    cursor = connection.cursor(dictionary=True)
-    try:
-        translation_name = get_translation_name(cursor, translation)
-        voice_info = get_voice_info(cursor, voice, translation) if voice else None
 
-        is_single_chapter = True
-        book_name = ''
+def build_excerpt_parts(translation: int, matches: list, voice: Optional[int] = None, voice_info: Optional[dict] = None) -> list:
+    """
+    Собирает части отрывка: список (book_info, chapter_number, JSON части)
+    
+    Книги и соседние главы берутся из каталога, целые главы - из кеша глав,
+    а стихи, заголовки и примечания остальных частей загружаются одним
+    запросом (get_chapters_data), поэтому время ответа почти не зависит от
+    числа частей. Ошибка возвращается для первой по порядку некорректной части.
+    """
+    plan = []
+    for match in matches:
+        book_alias = match.group('book')
+        chapter_number = int(match.group('chapter'))
+        start_verse = match.group('start_verse')
+        end_verse = match.group('end_verse')
+
+        # Получение кода книги на основе alias
+        books_info_list = get_books_info(None, translation, book_alias)
+        book_info = books_info_list[0] if books_info_list else None
+
+        # Обработка диапазонов стихов
+        if start_verse is not None:
+            start_verse_int = int(start_verse)
+            end_verse_int = int(end_verse) if end_verse else start_verse_int
+        else:
+            start_verse_int = None
+            end_verse_int = None
 
-        # Регулярное выражение для парсинга строки
-        pattern = r'(?P<book>[0-9a-z]+) (?P<chapter>\d+)(:(?P<start_verse>\d+)(?:-(?P<end_verse>\d+))?)?'
-        
-        matches = list(re.finditer(pattern, excerpt))
-        
-        if not matches:
+        # Целые главы могут уже быть в кеше
+        key = (translation, book_info['number'], chapter_number, voice) if book_info and start_verse is None else None
+        part_json = chapter_cache.get(key) if key else None
+
+        plan.append((match, book_info, chapter_number, start_verse_int, end_verse_int, key, part_json))
+
+    generation = chapter_cache.generation()
+    chapters = [(book_info, chapter_number, start_verse, end_verse)
+                for _, book_info, chapter_number, start_verse, end_verse, _, part_json in plan
+                if book_info and part_json is None]
+    chapters_data = iter(load_chapters_data(translation, chapters, voice, voice_info) if chapters else [])
+
+    parts = []
+    for match, book_info, chapter_number, _, _, key, part_json in plan:
+        book_alias = match.group('book')
+        if not book_info:
             raise HTTPException(
-                status_code=422,
-                detail=f"Invalid excerpt format ({excerpt})."
+                status_code=422, 
+                detail=f"Book with alias '{book_alias}' not found for translation {translation}."
             )
 
-        parts = []
-
-        for match in matches:
-            book_alias = match.group('book')
-            chapter_number = int(match.group('chapter'))
-            start_verse = match.group('start_verse')
-            end_verse = match.group('end_verse')
-
-            # Получение кода книги на основе alias
-            books_info_list = get_books_info(cursor, translation, book_alias)
-            if not books_info_list:
-                raise HTTPException(
-                    status_code=422, 
-                    detail=f"Book with alias '{book_alias}' not found for translation {translation}."
-                )
-            book_info = books_info_list[0]
-            #book_number = book_info['number'] # get_book_number(cursor, book_alias)
-            #book_name = book_info['name'] # get_book_name(cursor, translation, book_number)
-
-            # Обработка диапазонов стихов
-            if start_verse is not None:
-                is_single_chapter = False
-                start_verse_int = int(start_verse)
-                end_verse_int = int(end_verse) if end_verse else start_verse_int
-            else:
-                start_verse_int = None
-                end_verse_int = None
-
-            # Получаем данные главы через общую функцию
-            try:
-                chapter_data = get_chapter_data(cursor, translation, book_info, chapter_number, voice, voice_info, start_verse_int, end_verse_int)
-                verses = chapter_data['verses']
-                titles = chapter_data['titles']
-                notes = chapter_data['notes']
-                audio_link = chapter_data['audio_link']
-            except HTTPException as e:
-                # Перехватываем и адаптируем сообщения об ошибках для excerpt формата
+        if part_json is None:
+            chapter_data = next(chapters_data)
+            if not chapter_data['verses']:
+                # Сообщение об ошибке в формате отрывка
+                start_verse = match.group('start_verse')
+                end_verse = match.group('end_verse')
                 if start_verse is None:
                     raise HTTPException(
                         status_code=422, 
@@ -512,59 +646,160 @@ async def get_excerpt_with_alignment(translation: int, excerpt: str, voice: Opti
                         detail=f"No verses found for {book_alias} {chapter_number}:{verse_range}."
                     )
 
-            part = PartsWithAlignmentModel(
-                book=book_info,
-                prev_excerpt=get_prev_excerpt(cursor, translation, book_info, chapter_number),
-                next_excerpt=get_next_excerpt(cursor, translation, book_info, chapter_number),
-                chapter_number=chapter_number,
-                audio_link=audio_link,
-                verses=verses,
-                notes=notes,
-                titles=titles
-            )
+            part_json = build_part_json(translation, book_info, chapter_number, chapter_data)
+            if key:
+                chapter_cache.put(key, part_json, generation)
 
-            parts.append(part)
-        
-        if len(parts) == 1:
-            title = f"{book_info['name']} {chapter_number}"
-        elif len(parts) > 1:
-            is_single_chapter = False
-            title = f"Excerpt {excerpt}"
-        else:
-            title = ''
+        parts.append((book_info, chapter_number, part_json))
+    return parts
 
-        return ExcerptWithAlignmentModel(
-            title=title, 
-            is_single_chapter=is_single_chapter,
-            parts=parts
-        )
-    
-    except HTTPException as e:
-        raise e  # Позволяем HTTPException пробрасываться дальше с корректным кодом ошибки
-    #except Exception as e:
-    #    raise HTTPException(status_code=500, detail="Internal Server Error")  # Для любых непредвиденных ошибок
+
+def load_chapters_data(translation: int, chapters: list, voice: Optional[int] = None, voice_info: Optional[dict] = None,
+                       readonly: bool = True) -> list:
+    """
+    get_chapters_data на отдельном соединении из пула
+
+    readonly=False читает с основного сервера: нужно, когда данные только что
+    изменены и реплика может еще не получить изменения
+    """
+    connection = create_connection(readonly=readonly)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        return get_chapters_data(cursor, translation, chapters, voice, voice_info)
     finally:
         cursor.close()
         connection.close()
 
 
+# Столько глав диапазона загружается одним запросом и одновременно держится в памяти
+RANGE_BATCH_CHAPTERS = 10
+
+
+@router.get('/chapters_with_alignment', response_model=ExcerptWithAlignmentModel, response_class=FastJSONResponse, operation_id="get_chapters_with_alignment", responses={422: {"model": SimpleErrorResponse}}, tags=["Excerpts"])
+async def get_chapters_with_alignment(translation: int, book_number: int, from_chapter: int = 1, to_chapter: Optional[int] = None, voice: Optional[int] = None, api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
+    """
+    Получить диапазон глав книги с выравниванием (например, всю книгу для чтения офлайн)
+    
+    Ответ имеет ту же форму, что и /chapter_with_alignment, с частью на каждую
+    главу, и передается потоком: главы загружаются пачками по
+    RANGE_BATCH_CHAPTERS (одним запросом на пачку) и отправляются по мере
+    сборки, поэтому память не зависит от числа глав.
+    
+    Args:
+        translation: Код перевода
+        book_number: Номер книги (1-66)
+        from_chapter: Первая глава диапазона
+        to_chapter: Последняя глава диапазона (по умолчанию последняя глава книги)
+        voice: Код голоса (опционально)
+    """
+    # Проверки выполняются до начала ответа, чтобы ошибка вернулась кодом 422
+    title, is_single_chapter, book_info, chapters, voice_info = await run_in_db_thread(
+        plan_chapter_range, translation, book_number, from_chapter, to_chapter, voice
+    )
+    response = StreamingResponse(
+        stream_chapter_range(translation, title, is_single_chapter, book_info, chapters, voice, voice_info),
+        media_type=FastJSONResponse.media_type,
+    )
+    response.headers.update(validators)
+    return response
+
+
+def plan_chapter_range(translation: int, book_number: int, from_chapter: int, to_chapter: Optional[int], voice: Optional[int] = None) -> tuple:
+    """Проверяет диапазон глав: (заголовок, is_single_chapter, book_info, номера глав с текстом, voice_info)"""
+    get_translation_name(None, translation)
+    voice_info = get_voice_info(None, voice, translation) if voice else None
+
+    book_info = get_catalog().translation_books.get(translation, {}).get(book_number)
+    if not book_info:
+        raise HTTPException(
+            status_code=422, 
+            detail=f"Book {book_number} not found for translation {translation}."
+        )
+    book_info = dict(book_info)
+
+    if to_chapter is None:
+        to_chapter = book_info['chapters_count']
+    if from_chapter < 1 or to_chapter < from_chapter:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid chapter range ({from_chapter}-{to_chapter})."
+        )
+    if to_chapter > book_info['chapters_count']:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Chapter {to_chapter} not found. Book {book_number} has only {book_info['chapters_count']} chapters."
+        )
+
+    # Главы без текста в этом переводе пропускаются
+    existing_chapters = get_catalog().get_chapters(translation, book_number)
+    chapters = [number for number in range(from_chapter, to_chapter + 1) if number in existing_chapters]
+
+    is_single_chapter = from_chapter == to_chapter
+    title = f"{book_info['name']} {from_chapter}" if is_single_chapter else f"{book_info['name']} {from_chapter}-{to_chapter}"
+    return title, is_single_chapter, book_info, chapters, voice_info
+
+
+async def stream_chapter_range(translation: int, title: str, is_single_chapter: bool, book_info: dict, chapters: list, voice: Optional[int] = None, voice_info: Optional[dict] = None):
+    """Части ответа ExcerptWithAlignmentModel пачками глав; соединение с БД берется только на время пачки"""
+    yield b''.join([
+        b'{"title":', FastJSONResponse.encode(title),
+        b',"is_single_chapter":', b'true' if is_single_chapter else b'false',
+        b',"parts":[',
+    ])
+    for start in range(0, len(chapters), RANGE_BATCH_CHAPTERS):
+        batch = chapters[start:start + RANGE_BATCH_CHAPTERS]
+        parts = await run_in_db_thread(build_chapter_range_parts, translation, book_info, batch, voice, voice_info)
+        yield (b',' if start else b'') + b','.join(parts)
+    yield b']}'
+
+
+def build_chapter_range_parts(translation: int, book_info: dict, chapters: list, voice: Optional[int] = None, voice_info: Optional[dict] = None) -> list:
+    """JSON частей для глав одной пачки: из кеша глав, остальные - запросом по каждому диапазону глав без кеша"""
+    book_number = book_info['number']
+    parts = {number: chapter_cache.get((translation, book_number, number, voice)) for number in chapters}
+    missing_runs = get_missing_runs(chapters, parts)
+    if missing_runs:
+        generation = chapter_cache.generation()
+    for first, last in missing_runs:
+        # Диапазон целых глав подряд выбирается запросом с chapter_number BETWEEN
+        span = range(first, last + 1)
+        chapters_data = load_chapters_data(translation, [(book_info, number, None, None) for number in span], voice, voice_info)
+        for number, chapter_data in zip(span, chapters_data):
+            if parts.get(number, b'') is None:
+                part_json = build_part_json(translation, book_info, number, chapter_data)
+                chapter_cache.put((translation, book_number, number, voice), part_json, generation)
+                parts[number] = part_json
+    return [parts[number] for number in chapters]
+
+
+def get_missing_runs(chapters: list, parts: dict) -> list:
+    """
+    Диапазоны (первая, последняя) глав подряд, которых нет в кеше
+
+    Главы из кеша в диапазон не попадают; главы без текста между соседними
+    главами пачки не разрывают диапазон, в запросе для них просто нет строк.
+    """
+    runs = []
+    run_start = None
+    for index, number in enumerate(chapters):
+        if parts[number] is None:
+            if run_start is None:
+                run_start = number
+            if index + 1 == len(chapters) or parts[chapters[index + 1]] is not None:
+                runs.append((run_start, number))
+                run_start = None
+    return runs
+
+
 def get_books_info(cursor: any, translation: int, alias: str=None):
-    params = { 'translation': translation }
-    sql = '''
-        SELECT 
-            tb.code, tb.book_number AS number, tb.name, bb.code1 AS alias, bb.code2, bb.code3, bb.code4, bb.code5, bb.code6, bb.code7, bb.code8, bb.code9,
-            (SELECT max(chapter_number) FROM translation_verses WHERE book_number = tb.book_number) AS chapters_count
-        FROM translation_books AS tb
-        LEFT JOIN bible_books AS bb ON bb.number = tb.book_number
-        WHERE tb.translation = %(translation)s
-    '''
+    catalog = get_catalog()
     if alias:
-        sql += ''' AND (bb.code1 = %(alias)s OR bb.code2 = %(alias)s OR bb.code3 = %(alias)s OR bb.code4 = %(alias)s OR bb.code5 = %(alias)s
-                      OR bb.short_name_en = %(alias)s OR bb.short_name_ru = %(alias)s)
-        '''
-        params['alias'] = alias
-    cursor.execute(sql, params)
-    return cursor.fetchall()
+        book_info = catalog.get_book_info(translation, alias)
+        books = [book_info] if book_info else []
+    else:
+        books = catalog.translation_books.get(translation, {}).values()
+    # Копии, чтобы вызывающий код не мог изменить снимок каталога
+    return [dict(book) for book in books]
 
 def get_prev_excerpt(cursor: any, translation: int, book: BookInfoModel, chapter_number: int):
     if chapter_number > 1:
@@ -0,0 +1,210 @@
+"""
+Router for exporting a whole translation as NDJSON
+"""
+
+import asyncio
+from typing import Optional
+
+import anyio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from auth import RequireJWT
+from catalog import get_catalog
+from database import create_connection, run_in_db_thread
+from excerpt import chapter_row_item, get_audio_link, get_translation_name, get_voice_info
+from responses import FastJSONResponse
+
+router = APIRouter()
+
+# Rows fetched from the unbuffered cursor per round-trip; also the size of one streamed chunk
+EXPORT_FETCH_ROWS = 1000
+
+RECORD_TYPES = {'verses': 'verse', 'titles': 'title', 'notes': 'note'}
+
+# Same columns as the chapter query of get_chapters_data (see chapter_row_item), for
+# one book of the translation, in reading order: titles before their verse, notes
+# after it. sort_kind: 0 - title, 1 - verse, 2 - note
+# The export runs it book by book: the ORDER BY of a UNION can't use an index, so a
+# single query would sort the whole translation before returning the first row;
+# per book only that book is sorted (rows found by translation_verses'
+# (translation, book_number, chapter_number) index)
+EXPORT_QUERY = '''
+    SELECT
+        1 AS kind, v.code AS code, v.verse_number AS number, v.verse_number_join, v.text, v.html, v.start_paragraph,
+        COALESCE(vmf.begin, a.begin) AS begin,
+        COALESCE(vmf.end, a.end) AS end,
+        NULL AS verse_code, NULL AS title_code, NULL AS metadata, NULL AS reference, NULL AS subtitle,
+        NULL AS position_text, NULL AS position_html,
+        v.book_number AS book_number, v.chapter_number AS chapter_number, v.verse_number AS verse_number,
+        1 AS sort_kind
+    FROM translation_verses AS v
+        LEFT JOIN voice_alignments a ON (
+            a.voice = %(voice)s AND
+            a.book_number = v.book_number AND
+            a.chapter_number = v.chapter_number AND
+            a.verse_number = v.verse_number
+        )
+        LEFT JOIN voice_manual_fixes vmf ON (
+            vmf.voice = %(voice)s AND
+            vmf.book_number = v.book_number AND
+            vmf.chapter_number = v.chapter_number AND
+            vmf.verse_number = v.verse_number
+        )
+    WHERE v.translation = %(translation)s AND v.book_number = %(book_number)s
+    UNION ALL
+    SELECT
+        2, t.code, v.verse_number, NULL, t.text, NULL, NULL, NULL, NULL,
+        t.before_translation_verse, NULL, t.metadata, t.reference, t.subtitle,
+        t.position_text, t.position_html,
+        v.book_number, v.chapter_number, v.verse_number,
+        0
+    FROM translation_titles AS t
+        JOIN translation_verses AS v ON v.code = t.before_translation_verse
+    WHERE v.translation = %(translation)s AND v.book_number = %(book_number)s
+    UNION ALL
+    SELECT
+        3, n.code, n.note_number, NULL, n.text, NULL, NULL, NULL, NULL,
+        n.translation_verse, n.translation_title, NULL, NULL, NULL,
+        n.position_text, n.position_html,
+        v.book_number, v.chapter_number, v.verse_number,
+        2
+    FROM translation_notes AS n
+        JOIN translation_verses AS v ON v.code = n.translation_verse
+    WHERE v.translation = %(translation)s AND v.book_number = %(book_number)s
+    UNION ALL
+    SELECT
+        3, n.code, n.note_number, NULL, n.text, NULL, NULL, NULL, NULL,
+        n.translation_verse, n.translation_title, NULL, NULL, NULL,
+        n.position_text, n.position_html,
+        v.book_number, v.chapter_number, v.verse_number,
+        2
+    FROM translation_notes AS n
+        JOIN translation_titles AS t ON t.code = n.translation_title
+        JOIN translation_verses AS v ON v.code = t.before_translation_verse
+    WHERE n.translation_verse IS NULL AND v.translation = %(translation)s AND v.book_number = %(book_number)s
+    ORDER BY chapter_number, verse_number, sort_kind, number, code
+'''
+
+
+@router.get(
+    '/translations/{translation_code}/export',
+    response_class=StreamingResponse,
+    operation_id="export_translation",
+    tags=["Translations"],
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "NDJSON records"}},
+)
+async def export_translation(translation_code: int, voice: Optional[int] = None, username: str = RequireJWT):
+    """
+    Export a whole translation as NDJSON (requires JWT authentication)
+
+    One JSON record per line, in reading order:
+
+    - `{"type": "translation", "code", "name", "voice"}` - first line
+    - `{"type": "chapter", "book_number", "chapter_number", "audio_link"}` - before the chapter's records
+    - `{"type": "title" | "verse" | "note", "book_number", "chapter_number", "verse_number", ...}` -
+      fields of TitleModel / VerseWithAlignmentModel / NoteModel; verses carry the
+      effective alignment of `voice` (manual fixes over voice_alignments)
+
+    Rows are read book by book from an unbuffered cursor EXPORT_FETCH_ROWS at a time
+    and sent as they are read, so memory does not depend on the size of the translation.
+    """
+    # Checked before the response starts so that errors are returned as 422
+    name = await run_in_db_thread(get_translation_name, None, translation_code)
+    voice_info = await run_in_db_thread(get_voice_info, None, voice, translation_code) if voice else None
+    book_numbers = (await run_in_db_thread(get_catalog)).get_book_numbers(translation_code)
+
+    header = {'type': 'translation', 'code': translation_code, 'name': name, 'voice': voice}
+    return StreamingResponse(
+        stream_translation(translation_code, voice, book_numbers, voice_info, header),
+        media_type="application/x-ndjson",
+    )
+
+
+def open_export_cursor() -> tuple:
+    """Unbuffered cursor for the export queries: rows stay on the server until fetched"""
+    connection = create_connection(readonly=True)
+    if connection is None:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    return connection, connection.cursor(dictionary=True, buffered=False)
+
+
+def close_export_cursor(connection, cursor, finished: bool):
+    """
+    A finished export has read all rows and its connection goes back to the pool.
+    An interrupted one leaves unread rows: returning it to the pool would read them
+    all during the rollback on release, so the connection is discarded instead.
+    """
+    if finished:
+        cursor.close()
+        connection.close()
+    else:
+        connection.discard()
+
+
+def export_records(rows: list, voice_info: Optional[dict], current_chapter: Optional[tuple]) -> tuple:
+    """NDJSON lines for a batch of export rows; returns (bytes, last chapter)"""
+    lines = []
+    for row in rows:
+        chapter = (row['book_number'], row['chapter_number'])
+        if chapter != current_chapter:
+            current_chapter = chapter
+            lines.append(FastJSONResponse.encode({
+                'type': 'chapter',
+                'book_number': chapter[0],
+                'chapter_number': chapter[1],
+                'audio_link': get_audio_link(voice_info, chapter[0], chapter[1]),
+            }))
+        key, item = chapter_row_item(row)
+        lines.append(FastJSONResponse.encode({
+            'type': RECORD_TYPES[key],
+            'book_number': chapter[0],
+            'chapter_number': chapter[1],
+            'verse_number': row['verse_number'],
+            **item,
+        }))
+    return b'\n'.join(lines) + b'\n' if lines else b'', current_chapter
+
+
+async def stream_translation(translation: int, voice: Optional[int], book_numbers: list,
+                             voice_info: Optional[dict], header: dict):
+    """
+    NDJSON chunks of the export.
+
+    The connection is checked out when the body starts (a client that disconnects
+    before never holds one) and held for the whole export (the result set is
+    streamed by the server), but the DB threads are used only while a batch is
+    fetched. The DB calls are shielded: when the client disconnects, the call in
+    progress is awaited before the connection is closed in a DB thread, so the
+    event loop never waits for MySQL.
+    """
+    connection = cursor = None
+    finished = False
+    pending = None
+    try:
+        pending = asyncio.ensure_future(run_in_db_thread(open_export_cursor))
+        connection, cursor = await asyncio.shield(pending)
+        yield FastJSONResponse.encode(header) + b'\n'
+
+        current_chapter = None
+        for book_number in book_numbers:
+            params = {'translation': translation, 'voice': voice, 'book_number': book_number}
+            pending = asyncio.ensure_future(run_in_db_thread(cursor.execute, EXPORT_QUERY, params))
+            await asyncio.shield(pending)
+            while True:
+                pending = asyncio.ensure_future(run_in_db_thread(cursor.fetchmany, EXPORT_FETCH_ROWS))
+                rows = await asyncio.shield(pending)
+                if not rows:
+                    break
+                chunk, current_chapter = export_records(rows, voice_info, current_chapter)
+                yield chunk
+        finished = True
+    finally:
+        with anyio.CancelScope(shield=True):
+            if pending is not None:
+                await asyncio.wait([pending])
+            if connection is None and pending is not None and pending.exception() is None:
+                # Cancelled while the connection was being checked out
+                connection, cursor = pending.result()
+            if connection is not None:
+                await run_in_db_thread(close_export_cursor, connection, cursor, finished)
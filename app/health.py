@@ -0,0 +1,173 @@
+# health.py
+"""
+Liveness and readiness probes
+
+GET /api/health answers 200 as long as the worker serves requests and touches
+nothing else (liveness). GET /api/ready tells the load balancer whether the
+instance can serve traffic: 200 or 503 with the state of its dependencies:
+
+- warmup: state of the startup warm-up (warmup.py);
+- database: an idle pooled connection of the primary (and of the replica) is
+  pinged within HEALTH_DB_TIMEOUT_MS. Probes never open connections of their
+  own: when all connections are checked out the pool is reported busy, and only
+  an empty pool connects once (the connection stays in the pool);
+- pools: saturation of the connection pools;
+- caches: catalog loaded, chapter documents and audio file lists cached;
+- audio: MP3_FILES_PATH can be listed within HEALTH_AUDIO_TIMEOUT_MS;
+- latency: p50/p95/p99 of the requests this worker served recently (not
+  counting the in-process renders of static snapshots).
+
+The instance is ready when the warm-up has finished and the primary database
+answers. The rest is reported only: reads fall back from the replica to the
+primary, text endpoints work without the audio storage, and a saturated or slow
+instance still serves better than none.
+
+A check that hangs (a stalled NFS mount, a server that does not answer) is not
+started again by the next probes; they wait for the same check within their
+own time limit. Every worker process answers for itself.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from catalog import get_catalog_fingerprint
+from chapter_cache import chapter_cache
+from config import (
+    HEALTH_AUDIO_TIMEOUT_MS, HEALTH_DB_TIMEOUT_MS, HEALTH_LATENCY_SECONDS, HEALTH_LATENCY_WINDOW, MP3_FILES_PATH
+)
+from database import get_pool, get_replica_pool
+from excerpt import get_all_existing_audio_chapters
+from snapshots import SNAPSHOT_CLIENT
+from warmup import get_warmup_state
+
+router = APIRouter()
+
+PROBE_PATHS = ('/api/health', '/api/ready')
+
+# One thread per check: primary, replica, audio
+_check_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="health")
+_pending_checks = {}
+
+
+class LatencyRecorder:
+    """Durations of the last `window` requests; percentiles over those not older than `max_age` seconds"""
+
+    def __init__(self, window: int = HEALTH_LATENCY_WINDOW, max_age: int = HEALTH_LATENCY_SECONDS):
+        self.max_age = max_age
+        self._samples = deque(maxlen=max(1, window))  # (monotonic end time, seconds)
+
+    def record(self, seconds: float):
+        self._samples.append((time.monotonic(), seconds))
+
+    def clear(self):
+        self._samples.clear()
+
+    def percentiles(self) -> dict:
+        oldest = time.monotonic() - self.max_age
+        durations = sorted(seconds for finished, seconds in list(self._samples) if finished >= oldest)
+        result = {'requests': len(durations), 'window_seconds': self.max_age}
+        for name, percent in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99)):
+            # Nearest-rank percentile
+            value = durations[math.ceil(percent / 100 * len(durations)) - 1] if durations else None
+            result[name] = round(value * 1000, 1) if value is not None else None
+        return result
+
+
+latency = LatencyRecorder()
+
+
+class LatencyMiddleware:
+    """Records how long this worker takes to serve each request (probes and snapshot renders excluded)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in PROBE_PATHS or tuple(scope.get('client') or ()) == SNAPSHOT_CLIENT:
+            await self.app(scope, receive, send)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            latency.record(time.monotonic() - started)
+
+
+async def run_check(name: str, check, timeout_ms: int) -> dict:
+    """Runs a blocking check in a thread within the time limit"""
+    future = _pending_checks.get(name)
+    if future is None or future.done():
+        future = _pending_checks[name] = _check_executor.submit(check)
+    started = time.monotonic()
+    try:
+        status = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        return {'ok': False, 'error': f"no answer within {timeout_ms} ms"}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'status': status, 'ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+def check_audio_storage() -> str:
+    with os.scandir(MP3_FILES_PATH) as entries:
+        next(entries, None)
+    return "ok"
+
+
+def pool_saturation(pool) -> dict:
+    stats = pool.stats()
+    capacity = stats['size'] + stats['max_overflow']
+    return {
+        'in_use': stats['in_use'],
+        'idle': stats['idle'],
+        'capacity': capacity,
+        'saturation': round(stats['in_use'] / capacity, 3),
+        'waiting': stats['waiting'],
+        'timeouts': stats['timeouts'],
+    }
+
+
+def cache_state() -> dict:
+    return {
+        'catalog_loaded': get_catalog_fingerprint() != '',
+        'chapter_documents': chapter_cache.stats()['entries'],
+        'audio_voices': get_all_existing_audio_chapters.cache_info().currsize,
+    }
+
+
+@router.get('/health', operation_id="get_health", tags=["Admin"])
+def get_health():
+    """Liveness: the worker serves requests (no authentication, no dependencies checked)"""
+    return {"status": "ok"}
+
+
+@router.get('/ready', operation_id="get_ready", tags=["Admin"], responses={503: {"description": "Not ready"}})
+async def get_ready():
+    """Readiness for the load balancer: warm-up finished and the database answers (no authentication)"""
+    pools = {'primary': get_pool()}
+    replica = get_replica_pool()
+    if replica is not None:
+        pools['replica'] = replica
+
+    checks = [run_check(f"database:{name}", pool.ping, HEALTH_DB_TIMEOUT_MS) for name, pool in pools.items()]
+    checks.append(run_check("audio", check_audio_storage, HEALTH_AUDIO_TIMEOUT_MS))
+    *databases, audio = await asyncio.gather(*checks)
+
+    warmup = get_warmup_state()
+    database = dict(zip(pools, databases))
+    ready = warmup['status'] == 'ready' and database['primary']['ok']
+    return JSONResponse({
+        'status': 'ready' if ready else 'not ready',
+        'warmup': warmup,
+        'database': database,
+        'pools': {name: pool_saturation(pool) for name, pool in pools.items()},
+        'caches': cache_state(),
+        'audio': audio,
+        'latency': latency.percentiles(),
+    }, status_code=200 if ready else 503)
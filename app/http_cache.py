@@ -0,0 +1,223 @@
+# http_cache.py
+"""
+HTTP validators (ETag, Cache-Control) for the public JSON endpoints.
+
+A response of /languages, /translations, /translation_info,
+/translations/{code}/books, /chapter_with_alignment or /excerpt_with_alignment
+depends only on the request URL and the data in MySQL. That data changes
+through the admin endpoints, which call bump_data_version() after committing
+(and after dropping what they invalidate from the caches). The ETag is derived
+from the data version, the fingerprint of the current catalog snapshot (it changes
+when a reload after CATALOG_TTL finds changed rows) and the URL, so it is known
+before any query runs:
+
+    @api_router.get('/languages', ...)
+    def get_languages(api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
+
+A request whose If-None-Match contains the current ETag is answered with
+304 Not Modified by the dependency itself and the endpoint is not called.
+Otherwise the ETag and Cache-Control headers are added to the 200 response:
+endpoints returning plain data get them via the dependency's Response, endpoints
+that return a Response object themselves apply the returned `validators`.
+
+The data version is shared by the worker processes through DATA_VERSION_FILE,
+so every worker issues the same ETag for the same data. Each bump also appends
+what the write invalidated (kind and key, e.g. ('chapter', (voice, book,
+chapter))) and its commit time to DATA_VERSION_FILE.log, the last
+INVALIDATION_LOG_SIZE bumps. A worker that notices a version written by another
+worker (DataVersionSyncMiddleware checks the file before each request, a single
+stat):
+
+- applies the same targeted invalidations to its process-local caches through
+  the callbacks registered with on_data_version_change (everything is dropped
+  only when some bumps are missing from the log);
+- sends its reads to the primary for DB_REPLICA_STICKY_SECONDS after the
+  commit (database.note_commit), so it doesn't cache data of a lagging replica
+  under the new ETag.
+
+The server (app/server.py) starts the version from the current time, so ETags
+issued before a restart (the data may have been loaded by scripts meanwhile) do
+not match.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+
+from catalog import get_catalog_fingerprint
+from config import DATA_VERSION_FILE, HTTP_CACHE_MAX_AGE
+from database import note_commit
+
+# Bumps kept in DATA_VERSION_FILE.log; a worker that falls further behind drops all its caches
+INVALIDATION_LOG_SIZE = 256
+
+
+_data_version = 0
+# (inode, mtime) of DATA_VERSION_FILE when _data_version was read from it; the
+# file is replaced on every write, so a new inode means a new version
+_data_version_stat = None
+_data_version_lock = threading.Lock()
+_invalidation_callbacks = []
+
+
+def on_data_version_change(callback):
+    """
+    Registers callback(kind, key) that drops process-local caches after a write
+    in another worker; kind 'all' (key None) means everything
+    """
+    _invalidation_callbacks.append(callback)
+    return callback
+
+
+def _stat_version_file():
+    try:
+        stat = os.stat(DATA_VERSION_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _read_version_file() -> int:
+    try:
+        with open(DATA_VERSION_FILE) as f:
+            return int(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _read_invalidation_log() -> list:
+    try:
+        with open(f"{DATA_VERSION_FILE}.log") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def _replace_file(path: str, content: str):
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'w') as f:
+        f.write(content)
+    os.replace(temp, path)
+
+
+def _update_shared_version(new_version, kind: str, key: Optional[tuple]) -> int:
+    """
+    Writes new_version(current shared version) under an exclusive lock of all
+    workers; the log entry is written first, so a worker that sees the version finds it
+    """
+    global _data_version, _data_version_stat
+    with _data_version_lock, open(f"{DATA_VERSION_FILE}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        shared, previous, synced = _read_version_file(), _data_version, _data_version_stat is not None
+        version = new_version(max(shared, previous))
+        log = _read_invalidation_log()[-(INVALIDATION_LOG_SIZE - 1):]
+        log.append({'version': version, 'kind': kind, 'key': key, 'committed_at': time.time()})
+        _replace_file(f"{DATA_VERSION_FILE}.log", json.dumps(log))
+        _replace_file(DATA_VERSION_FILE, str(version))
+        _data_version, _data_version_stat = version, _stat_version_file()
+    # Bumps of other workers since the last sync of this one
+    if synced and shared != previous:
+        _apply_invalidations(previous, shared)
+    return version
+
+
+def reset_data_version() -> int:
+    """Starts a new version from the current time (on server start)"""
+    return _update_shared_version(lambda current: max(time.time_ns(), current + 1), 'all', None)
+
+
+def _apply_invalidations(version: int, new_version: int):
+    """Runs the callbacks for the bumps of other workers after version up to new_version"""
+    entries = [entry for entry in _read_invalidation_log() if version < entry['version'] <= new_version]
+    if entries:
+        note_commit(max(entry['committed_at'] for entry in entries))
+    # Contiguous bumps only; a restart moves the version to time_ns, so the gap may be huge
+    if len(entries) == new_version - version and all(
+        entry['version'] == version + 1 + i for i, entry in enumerate(entries)
+    ):
+        invalidations = [(entry['kind'], tuple(entry['key']) if entry['key'] is not None else None) for entry in entries]
+    else:
+        # Some bumps are not in the log any more (or the server was restarted)
+        invalidations = [('all', None)]
+    for kind, key in invalidations:
+        for callback in _invalidation_callbacks:
+            callback(kind, key)
+
+
+def sync_data_version() -> int:
+    """Picks up the version written by another worker, dropping local caches if it changed"""
+    global _data_version, _data_version_stat
+    stat = _stat_version_file()
+    if stat is not None and stat == _data_version_stat:
+        return _data_version
+    if stat is None:
+        # First process (or the file was removed)
+        return reset_data_version()
+    with _data_version_lock:
+        version, previous = _read_version_file(), _data_version
+        changed = _data_version_stat is not None and version != previous
+        _data_version, _data_version_stat = version, stat
+    if changed:
+        _apply_invalidations(previous, version)
+    return version
+
+
+def get_data_version() -> int:
+    return _data_version
+
+
+def bump_data_version(kind: str = 'all', key: Optional[tuple] = None) -> int:
+    """
+    Call after every write that changes public data; all issued ETags stop
+    matching in all workers, and the other workers drop from their caches what
+    kind and key name (see on_data_version_change)
+    """
+    return _update_shared_version(lambda current: current + 1, kind, key)
+
+
+class DataVersionSyncMiddleware:
+    """Brings the data version (and the local caches) of this worker up to date before each request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            sync_data_version()
+        await self.app(scope, receive, send)
+
+
+def make_etag(request: Request) -> str:
+    query = '&'.join(sorted(f'{name}={value}' for name, value in request.query_params.multi_items()))
+    key = f'{get_data_version()}:{get_catalog_fingerprint()}:{request.url.path}?{query}'
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110, 13.1.2) of an If-None-Match header with an ETag"""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in if_none_match.split(','))
+
+
+def cache_control() -> str:
+    return f'private, max-age={HTTP_CACHE_MAX_AGE}' if HTTP_CACHE_MAX_AGE > 0 else 'private, no-cache'
+
+
+def check_not_modified(request: Request, response: Response) -> dict:
+    """Dependency: 304 for a matching If-None-Match, otherwise the validators of the 200 response"""
+    validators = {'ETag': make_etag(request), 'Cache-Control': cache_control()}
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and etag_matches(if_none_match, validators['ETag']):
+        raise HTTPException(status_code=304, headers=validators)
+    response.headers.update(validators)
+    return validators
+
+
+ConditionalGet = Depends(check_not_modified)
@@ -1,11 +1,20 @@
 from typing import Union, Optional
 from datetime import timedelta, datetime
 from functools import wraps
+import asyncio
+from contextlib import asynccontextmanager
 import hashlib
 import json
 
+from anyio import to_thread
 from fastapi import FastAPI, HTTPException, status, APIRouter
-from database import create_connection
+from database import create_connection, get_pool_stats, run_in_db_thread
+from catalog import get_catalog, refresh_catalog, invalidate_catalog
+from chapter_cache import chapter_cache
+from http_cache import (
+    ConditionalGet, DataVersionSyncMiddleware, bump_data_version, on_data_version_change, sync_data_version
+)
+from compression import CompressionMiddleware, compressed_cache
 from models import *
 
 from fastapi.routing import APIRoute
@@ -13,12 +22,20 @@ from fastapi.routing import APIRoute
 from excerpt import router as excerpt_router
 from excerpt import get_books_info, check_audio_file_exists
 from checks import router as checks_router
-from audio import router as audio_router
+from audio import router as audio_router, missing_files
+from export import router as export_router
+from packs import router as packs_router, schedule_pack_update
+from warmup import warm_up
+from health import router as health_router, LatencyMiddleware
+from snapshots import (
+    clear_snapshots, init_snapshots, refresh_anomaly_snapshots, refresh_chapter_snapshots,
+    refresh_translation_snapshots, refresh_voice_snapshots
+)
 from auth import (
     Token, LoginRequest, authenticate_user, create_access_token,
     RequireAPIKey, RequireJWT
 )
-from config import JWT_EXPIRE_HOURS
+from config import JWT_EXPIRE_HOURS, SYNC_THREADPOOL_SIZE
 
 # Simple in-memory cache with TTL
 _cache = {}
@@ -79,7 +96,23 @@ tags_metadata = [
     },
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Threads of this worker for sync (def) endpoints
+    to_thread.current_default_thread_limiter().total_tokens = SYNC_THREADPOOL_SIZE
+    # Shared data version of the workers (DATA_VERSION_FILE), read before the first request
+    sync_data_version()
+    # Catalog, audio coverage and popular chapters are loaded in the background;
+    # /api/ready reports ready afterwards. Requests arriving earlier load what
+    # they need on first use
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     openapi_tags=tags_metadata,
     title="Bible API",
     description="API для работы с библией",
@@ -92,6 +125,16 @@ app = FastAPI(
     }
 )
 
+# gzip/brotli for JSON responses, compressed variants of public data are cached
+app.add_middleware(CompressionMiddleware)
+# Local caches follow admin writes made in other worker processes
+app.add_middleware(DataVersionSyncMiddleware)
+# Request durations for the latency percentiles of /api/ready
+app.add_middleware(LatencyMiddleware)
+
+# Static snapshots of read-only responses are rendered by this app after admin writes
+init_snapshots(app)
+
 # Create main router with /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -99,6 +142,9 @@ api_router = APIRouter(prefix="/api")
 api_router.include_router(excerpt_router)
 api_router.include_router(checks_router)
 api_router.include_router(audio_router)
+api_router.include_router(export_router)
+api_router.include_router(packs_router)
+api_router.include_router(health_router)
 
 
 @api_router.post('/auth/login', response_model=Token, operation_id="login", tags=["Auth"])
@@ -130,26 +176,17 @@ def login(credentials: LoginRequest):
 
 
 @api_router.get('/languages', response_model=list[LanguageModel], operation_id="get_languages", tags=["Languages"])
-def get_languages(api_key: bool = RequireAPIKey):
-    connection = create_connection()
-    cursor = connection.cursor(dictionary=True)
+def get_languages(api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
     try:
-        cursor.execute('''
-			SELECT alias, name_en, name_national 
-			FROM languages
-		''')
-        result = cursor.fetchall()
+        result = get_catalog().languages
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        connection.close()
     return result
 
 
 @api_router.get('/translations', response_model=list[TranslationModel], operation_id="get_translations", tags=["Translations"])
-def get_translations(language: Optional[str] = None, only_active: int = 1, api_key: bool = RequireAPIKey):
-    connection = create_connection()
+def get_translations(language: Optional[str] = None, only_active: int = 1, api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
+    connection = create_connection(readonly=True)
     cursor = connection.cursor(dictionary=True)
     try:
         params = []
@@ -229,8 +266,8 @@ def get_translations(language: Optional[str] = None, only_active: int = 1, api_k
     return result
 
 @api_router.get('/translation_info', response_model=TranslationInfoModel, operation_id="get_translation_info", tags=["Translations"])
-def get_translation_info(translation: int, api_key: bool = RequireAPIKey):
-    connection = create_connection()
+def get_translation_info(translation: int, api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
+    connection = create_connection(readonly=True)
     cursor = connection.cursor(dictionary=True)
     result = []
     try:
@@ -260,47 +297,9 @@ def get_translation_info(translation: int, api_key: bool = RequireAPIKey):
     return result
 
 
-@timed_cache(seconds=3600)  # Cache for 1 hour
-def get_chapters_by_book(translation_code: int) -> dict:
-    """Get all chapters for all books in a translation (cached)"""
-    connection = create_connection()
-    cursor = connection.cursor(dictionary=True)
-    try:
-        # Get all book numbers for this translation
-        cursor.execute('''
-            SELECT book_number FROM translation_books WHERE translation = %s
-        ''', (translation_code,))
-        book_numbers = [row['book_number'] for row in cursor.fetchall()]
-        
-        if not book_numbers:
-            return {}
-        
-        # Get all chapters in one query
-        placeholders = ','.join(['%s'] * len(book_numbers))
-        cursor.execute(f'''
-            SELECT book_number, chapter_number
-            FROM translation_verses
-            WHERE book_number IN ({placeholders})
-            GROUP BY book_number, chapter_number
-        ''', book_numbers)
-        
-        # Build map
-        chapters_by_book = {}
-        for row in cursor.fetchall():
-            book_number = row['book_number']
-            if book_number not in chapters_by_book:
-                chapters_by_book[book_number] = set()
-            chapters_by_book[book_number].add(row['chapter_number'])
-        
-        return chapters_by_book
-    finally:
-        cursor.close()
-        connection.close()
-
-
 @api_router.get('/translations/{translation_code}/books', response_model=list[TranslationBookModel], operation_id="get_translation_books", tags=["Translations"])
-def get_translation_books(translation_code: int, voice_code: Optional[int] = None, api_key: bool = RequireAPIKey):
-    connection = create_connection()
+def get_translation_books(translation_code: int, voice_code: Optional[int] = None, api_key: bool = RequireAPIKey, validators: dict = ConditionalGet):
+    connection = create_connection(readonly=True)
     cursor = connection.cursor(dictionary=True)
     try:
         # Check if translation exists and get alias
@@ -326,7 +325,6 @@ def get_translation_books(translation_code: int, voice_code: Optional[int] = Non
             cursor.execute('''
                 SELECT 
                     tb.code, tb.book_number, tb.name, bb.code1 AS alias,
-                    (SELECT max(chapter_number) FROM translation_verses WHERE book_number = tb.book_number) AS chapters_count,
                     COALESCE(
                         (SELECT COUNT(*) FROM voice_anomalies va WHERE va.book_number = tb.book_number AND va.voice = %s), 
                         0
@@ -347,8 +345,7 @@ def get_translation_books(translation_code: int, voice_code: Optional[int] = Non
             # Original query without anomalies count
             cursor.execute('''
                 SELECT 
-                    tb.code, tb.book_number, tb.name, bb.code1 AS alias,
-                    (SELECT max(chapter_number) FROM translation_verses WHERE book_number = tb.book_number) AS chapters_count
+                    tb.code, tb.book_number, tb.name, bb.code1 AS alias
                 FROM translation_books AS tb
                 LEFT JOIN bible_books AS bb ON bb.number = tb.book_number
                 WHERE tb.translation = %s
@@ -357,21 +354,22 @@ def get_translation_books(translation_code: int, voice_code: Optional[int] = Non
         
         books = cursor.fetchall()
         
-        # Get all existing chapters from cache
-        chapters_by_book = get_chapters_by_book(translation_code)
+        # Chapters present in this translation, from the in-memory catalog
+        catalog = get_catalog()
         
         # Check for chapters without text and audio
         for book in books:
             book_number = book['book_number']
             book_code = book['code']
-            chapters_count = book['chapters_count'] or 0
-            
-            # Get existing chapters from pre-loaded data
-            existing_chapters = chapters_by_book.get(book_number, set())
+            existing_chapters = catalog.get_chapters(translation_code, book_number)
+            chapters_count = max(existing_chapters, default=0)
+            book['chapters_count'] = chapters_count
+            # Expected chapters come from bible_stat, so missing trailing chapters are reported too
+            expected_count = max(catalog.bible_chapters_count.get(book_number, 0), chapters_count)
             
             # Find chapters without text (missing in translation_verses)
-            if chapters_count > 0:
-                expected_chapters = set(range(1, chapters_count + 1))
+            if expected_count > 0:
+                expected_chapters = set(range(1, expected_count + 1))
                 chapters_without_text = sorted(expected_chapters - existing_chapters)
             else:
                 chapters_without_text = []
@@ -400,9 +398,13 @@ def get_translation_books(translation_code: int, voice_code: Optional[int] = Non
         connection.close()
 
 
-@api_router.post('/cache/clear', operation_id="clear_cache", tags=["Admin"])
-def clear_cache(username: str = RequireJWT):
-    """Clear all cached data (requires JWT authentication)"""
+def clear_local_caches() -> dict:
+    """
+    Clear the caches of this worker process
+
+    Called by /cache/clear and, in every other worker, after /cache/clear or
+    when the invalidations of other workers can't be told (see apply_invalidation).
+    """
     from excerpt import get_all_existing_audio_chapters, get_existing_audio_chapters, check_audio_file_exists
     
     global _cache, _cache_timestamps
@@ -414,14 +416,72 @@ def clear_cache(username: str = RequireJWT):
     get_all_existing_audio_chapters.cache_clear()
     get_existing_audio_chapters.cache_clear()
     check_audio_file_exists.cache_clear()
+
+    # Reference data catalog is reloaded on next use
+    invalidate_catalog()
+    chapters_cleared = chapter_cache.clear()
+    compressed_cache.clear()
+    missing_files.clear()
+    return {"items_cleared": cache_size, "chapter_documents_cleared": chapters_cleared}
+
+
+@on_data_version_change
+def apply_invalidation(kind: str, key: Optional[tuple]):
+    """
+    The invalidation done by an admin write in another worker, applied to the
+    caches of this one (see http_cache.on_data_version_change)
+    """
+    if kind == 'chapter':
+        chapter_cache.invalidate_chapter(*key)
+    elif kind in ('translation', 'voice'):
+        # The writing worker reloaded its catalog
+        invalidate_catalog()
+        if kind == 'translation':
+            chapter_cache.invalidate_translation(*key)
+        else:
+            chapter_cache.invalidate_voice(*key)
+    elif kind == 'all':
+        clear_local_caches()
+    # 'anomalies': counts are read from the database on each request, nothing is cached
+
+
+@api_router.post('/cache/clear', operation_id="clear_cache", tags=["Admin"])
+def clear_cache(username: str = RequireJWT):
+    """
+    Clear all cached data in all worker processes (requires JWT authentication)
+
+    Static snapshots are removed (nginx falls back to the API); run
+    scripts/build_snapshots.py to render them again.
+    """
+    cleared = clear_local_caches()
+    # Other workers clear their caches when they see the new data version
+    bump_data_version()
+    clear_snapshots()
     
     return {
         "message": f"All caches cleared successfully", 
-        "items_cleared": cache_size,
-        "lru_caches_cleared": ["get_all_existing_audio_chapters", "get_existing_audio_chapters", "check_audio_file_exists"]
+        "items_cleared": cleared["items_cleared"],
+        "lru_caches_cleared": ["get_all_existing_audio_chapters", "get_existing_audio_chapters", "check_audio_file_exists"],
+        "chapter_documents_cleared": cleared["chapter_documents_cleared"]
+    }
+
+
+@api_router.get('/cache/stats', operation_id="get_cache_stats", tags=["Admin"])
+def get_cache_stats(username: str = RequireJWT):
+    """Statistics of the chapter documents and compressed responses caches (requires JWT authentication)"""
+    return {
+        "catalog_version": get_catalog().version,
+        "chapter_documents": chapter_cache.stats(),
+        "compressed_variants": compressed_cache.stats()
     }
 
 
+@api_router.get('/db/pool', operation_id="get_db_pool_stats", tags=["Admin"])
+def get_db_pool_stats(username: str = RequireJWT):
+    """Connection pool statistics for monitoring (requires JWT authentication)"""
+    return get_pool_stats()
+
+
 @api_router.put('/translations/{translation_code}', response_model=TranslationModel, operation_id="update_translation", tags=["Translations"])
 def update_translation(translation_code: int, update_data: TranslationUpdateModel, username: str = RequireJWT):
     connection = create_connection()
@@ -461,6 +521,10 @@ def update_translation(translation_code: int, update_data: TranslationUpdateMode
         update_sql = f"UPDATE translations SET {', '.join(update_fields)} WHERE code = %s"
         cursor.execute(update_sql, params)
         connection.commit()
+        refresh_catalog(cursor)
+        chapter_cache.invalidate_translation(translation_code)
+        bump_data_version('translation', (translation_code,))
+        refresh_translation_snapshots(translation_code)
         
         # Return updated translation
         cursor.execute('''
@@ -550,6 +614,10 @@ def update_voice(voice_code: int, update_data: VoiceUpdateModel, username: str =
         update_sql = f"UPDATE voices SET {', '.join(update_fields)} WHERE code = %s"
         cursor.execute(update_sql, params)
         connection.commit()
+        refresh_catalog(cursor)
+        chapter_cache.invalidate_voice(voice_code)
+        bump_data_version('voice', (voice_code,))
+        refresh_voice_snapshots(voice_code)
         
         # Return updated voice
         cursor.execute('''
@@ -677,6 +745,99 @@ def get_voice_anomalies(voice_code: int, page: int = 1, limit: int = 50, anomaly
         connection.close()
 
 
+# The watermark is moved back by this many seconds: a change whose timestamp was
+# set just before the sync query but committed after it is sent again, not lost.
+# The watermark and the changes are read from the primary: on a lagging replica
+# the watermark would pass changes the replica has not received yet, and they
+# would never be sent
+SYNC_WATERMARK_LAG_SECONDS = 5
+
+
+@api_router.get('/voices/{voice_code}/changes', response_model=VoiceChangesModel, operation_id="get_voice_changes", tags=["Voices"])
+def get_voice_changes(voice_code: int, since: Optional[datetime] = None, api_key: bool = RequireAPIKey):
+    """
+    Verse timings of a voice changed since a watermark
+
+    Returns the effective timings (manual fixes over the alignment) of verses whose
+    manual fix was created, updated or removed, or whose anomaly changed status,
+    since `since`, and a new `watermark` to pass as `since` next time. Without
+    `since` all verses that ever had such a change are returned. A verse can be
+    returned again by the next call; applying it twice is harmless.
+    """
+    catalog = get_catalog()
+    if voice_code not in catalog.voices:
+        raise HTTPException(status_code=404, detail=f"Voice {voice_code} not found")
+
+    connection = create_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        # Taken before the changes are read, so nothing changed meanwhile is skipped
+        cursor.execute(
+            "SELECT CURRENT_TIMESTAMP - INTERVAL %s SECOND AS watermark",
+            (SYNC_WATERMARK_LAG_SECONDS,)
+        )
+        watermark = cursor.fetchone()['watermark']
+
+        params = {'voice': voice_code, 'since': since}
+        since_filter = "AND {} >= %(since)s" if since is not None else ""
+        # All parts are range scans of the (voice, updated_at/deleted_at) indexes; deleted
+        # manual fixes are recorded in voice_manual_fixes_deleted by a trigger
+        cursor.execute(
+            f"""
+            SELECT c.book_number, c.chapter_number, c.verse_number,
+                   COALESCE(vmf.begin, a.begin) AS begin,
+                   COALESCE(vmf.end, a.end) AS end
+            FROM (
+                SELECT book_number, chapter_number, verse_number
+                FROM voice_manual_fixes
+                WHERE voice = %(voice)s {since_filter.format('updated_at')}
+                UNION
+                SELECT book_number, chapter_number, verse_number
+                FROM voice_manual_fixes_deleted
+                WHERE voice = %(voice)s {since_filter.format('deleted_at')}
+                UNION
+                SELECT book_number, chapter_number, verse_number
+                FROM voice_anomalies
+                WHERE voice = %(voice)s {since_filter.format('updated_at')}
+            ) AS c
+            LEFT JOIN voice_alignments a ON (
+                a.voice = %(voice)s AND
+                a.book_number = c.book_number AND
+                a.chapter_number = c.chapter_number AND
+                a.verse_number = c.verse_number
+            )
+            LEFT JOIN voice_manual_fixes vmf ON (
+                vmf.voice = %(voice)s AND
+                vmf.book_number = c.book_number AND
+                vmf.chapter_number = c.chapter_number AND
+                vmf.verse_number = c.verse_number
+            )
+            ORDER BY c.book_number, c.chapter_number, c.verse_number
+            """,
+            params
+        )
+        verses = [
+            {
+                'book_number': row['book_number'],
+                'chapter_number': row['chapter_number'],
+                'verse_number': row['verse_number'],
+                # As in chapter responses: 0 when the verse has no timing
+                'begin': float(row['begin']) if row['begin'] is not None else 0.0,
+                'end': float(row['end']) if row['end'] is not None else 0.0,
+            }
+            for row in cursor.fetchall()
+        ]
+        return {"voice": voice_code, "watermark": watermark, "verses": verses}
+
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        connection.close()
+
+
 @api_router.post("/voices/anomalies", response_model=VoiceAnomalyModel, operation_id="create_voice_anomaly", tags=["Voices"])
 def create_voice_anomaly(anomaly_data: VoiceAnomalyCreateModel, username: str = RequireJWT):
     """Create a new voice anomaly"""
@@ -733,6 +894,9 @@ def create_voice_anomaly(anomaly_data: VoiceAnomalyCreateModel, username: str =
         anomaly_id = cursor.lastrowid
         
         connection.commit()
+        # Anomaly counts are part of /translations and /translations/{code}/books
+        bump_data_version('anomalies', (anomaly_data.voice,))
+        refresh_anomaly_snapshots(anomaly_data.voice)
         
         # Fetch and return the created anomaly with all fields
         cursor.execute(
@@ -911,6 +1075,11 @@ def update_anomaly_status(anomaly_code: int, update_data: AnomalyStatusUpdateMod
         )
         
         connection.commit()
+        # Effective alignment of this chapter may have changed
+        chapter_cache.invalidate_chapter(anomaly['voice'], anomaly['book_number'], anomaly['chapter_number'])
+        bump_data_version('chapter', (anomaly['voice'], anomaly['book_number'], anomaly['chapter_number']))
+        schedule_pack_update(anomaly['voice'], anomaly['book_number'], anomaly['chapter_number'])
+        refresh_chapter_snapshots(anomaly['voice'], anomaly['book_number'], anomaly['chapter_number'])
         
         # Return updated anomaly
         cursor.execute(
@@ -1018,6 +1187,10 @@ def create_voice_manual_fix(fix_data: VoiceManualFixCreateModel, username: str =
             fix_id = cursor.lastrowid
         
         connection.commit()
+        chapter_cache.invalidate_chapter(fix_data.voice, fix_data.book_number, fix_data.chapter_number)
+        bump_data_version('chapter', (fix_data.voice, fix_data.book_number, fix_data.chapter_number))
+        schedule_pack_update(fix_data.voice, fix_data.book_number, fix_data.chapter_number)
+        refresh_chapter_snapshots(fix_data.voice, fix_data.book_number, fix_data.chapter_number)
         
         # Return created/updated correction
         cursor.execute(
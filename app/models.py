@@ -141,6 +141,18 @@ class VoiceAnomaliesResponseModel(BaseModel):
     items: list[VoiceAnomalyModel]
     total_count: int
 
+class VerseTimingChangeModel(BaseModel):
+    book_number: int
+    chapter_number: int
+    verse_number: int
+    begin: float
+    end: float
+
+class VoiceChangesModel(BaseModel):
+    voice: int
+    watermark: datetime
+    verses: list[VerseTimingChangeModel]
+
 class AnomalyStatusUpdateModel(BaseModel):
     status: AnomalyStatus
     begin: Optional[float] = None  # New begin time for corrected status
@@ -261,3 +273,16 @@ class VoiceManualFixModel(BaseModel):
     end: float
     info: Optional[str] = None
 
+
+class PackManifestModel(BaseModel):
+    translation: int
+    voice: Optional[int] = None
+    format_version: int
+    file: str
+    size: int
+    sha256: str
+    etag: str
+    built_at: str
+    updated_at: str
+    chapters: int
+    audio_chapters: int
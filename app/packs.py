@@ -0,0 +1,405 @@
+"""
+Router and builder for offline translation/voice packs
+
+A pack is a single SQLite file with everything an app needs to read a
+translation offline: books, chapters (with the audio link of each chapter that
+has audio), verses with the effective alignment of the voice, titles and notes.
+Clients download one file instead of calling /chapter_with_alignment for every
+chapter.
+
+Packs are stored under PACKS_PATH/<translation>/ as <voice>-<sha256>.sqlite
+(<voice> is "text" for packs without a voice) next to a <voice>.json manifest
+that points to the current file. The content hash in the file name is the ETag,
+so it is stable across processes and restarts and changes only with the content.
+A new version is written to a temporary file of its own (builds of the API and
+of scripts/build_packs.py may run at the same time) and published by rewriting
+the manifest; the previous file is kept so that running downloads can finish.
+
+Full builds read the same rows as /translations/{code}/export. Manual fixes and
+anomaly status changes only change verse timings, so they are applied
+incrementally: the timings of the changed chapter are reloaded with
+get_chapters_data (from the primary: the change has just been written) and
+updated in a copy of the pack. All pack writes of a process run on a single
+background thread, one at a time; a build or update of a pack holds an
+exclusive lock of its <voice>.lock file, so writes of other workers and of
+scripts/build_packs.py never start from the same published version.
+
+    python scripts/build_packs.py --translation 1 --voice 1
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from audio import multipart_length, multipart_parts, parse_ranges, read_file_range
+from auth import RequireAPIKey, RequireJWT
+from catalog import get_catalog
+from config import AUDIO_MAX_RANGES, PACKS_PATH
+from database import create_connection
+from excerpt import chapter_row_item, get_audio_link, get_translation_name, get_voice_info, load_chapters_data
+from export import EXPORT_FETCH_ROWS, EXPORT_QUERY
+from http_cache import etag_matches
+from models import PackManifestModel
+
+router = APIRouter(prefix="/packs", tags=["Translations"])
+
+PACK_FORMAT_VERSION = 1
+PACK_MEDIA_TYPE = "application/vnd.sqlite3"
+READ_CHUNK_SIZE = 256 * 1024
+# A download retries with the new manifest when a publish removed the file meanwhile
+PACK_OPEN_ATTEMPTS = 3
+
+PACK_SCHEMA = '''
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE books (number INTEGER PRIMARY KEY, code INTEGER, alias TEXT, name TEXT, chapters_count INTEGER);
+    CREATE TABLE chapters (
+        book_number INTEGER, chapter_number INTEGER, audio_link TEXT,
+        PRIMARY KEY (book_number, chapter_number)
+    ) WITHOUT ROWID;
+    CREATE TABLE verses (
+        code INTEGER PRIMARY KEY, book_number INTEGER, chapter_number INTEGER, number INTEGER, "join" INTEGER,
+        text TEXT, html TEXT, begin REAL, "end" REAL, start_paragraph INTEGER
+    );
+    CREATE TABLE titles (
+        code INTEGER PRIMARY KEY, book_number INTEGER, chapter_number INTEGER, verse_number INTEGER,
+        before_verse_code INTEGER, text TEXT, metadata TEXT, reference TEXT, subtitle INTEGER,
+        position_text INTEGER, position_html INTEGER
+    );
+    CREATE TABLE notes (
+        code INTEGER PRIMARY KEY, book_number INTEGER, chapter_number INTEGER, verse_number INTEGER,
+        number INTEGER, text TEXT, verse_code INTEGER, title_code INTEGER,
+        position_text INTEGER, position_html INTEGER
+    );
+'''
+PACK_INDEXES = '''
+    CREATE INDEX verses_chapter ON verses (book_number, chapter_number, number);
+    CREATE INDEX titles_chapter ON titles (book_number, chapter_number, verse_number);
+    CREATE INDEX notes_chapter ON notes (book_number, chapter_number, verse_number);
+'''
+
+# All pack writes (builds and incremental updates) run here, one at a time
+_pack_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="packs")
+
+
+def pack_name(voice: Optional[int]) -> str:
+    return str(voice) if voice else "text"
+
+
+def manifest_path(translation: int, voice: Optional[int]) -> Path:
+    return Path(PACKS_PATH) / str(translation) / f"{pack_name(voice)}.json"
+
+
+def read_manifest(translation: int, voice: Optional[int]) -> Optional[dict]:
+    try:
+        with open(manifest_path(translation, voice), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def pack_lock(directory: Path, voice: Optional[int]):
+    """Exclusive lock of a pack (translation directory and voice) across processes"""
+    with open(directory / f"{pack_name(voice)}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def create_temp_path(directory: Path, voice: Optional[int], suffix: str) -> Path:
+    """Unique temporary file in the pack directory (os.replace to the final name stays atomic)"""
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=f"{pack_name(voice)}.", suffix=suffix, delete=False) as f:
+        return Path(f.name)
+
+
+def open_pack(translation: int, voice: Optional[int]) -> tuple:
+    """
+    Current manifest and its opened pack file; (None, None) when the pack is not built.
+    A publish between reading the manifest and opening the file may remove the
+    file the manifest pointed to, then the manifest is read again.
+    """
+    for _ in range(PACK_OPEN_ATTEMPTS):
+        manifest = read_manifest(translation, voice)
+        if manifest is None:
+            break
+        try:
+            return manifest, open(Path(PACKS_PATH) / str(translation) / manifest['file'], 'rb')
+        except FileNotFoundError:
+            continue
+    return None, None
+
+
+def write_pack_rows(db, rows: list, voice_info: Optional[dict], chapters: set):
+    """Inserts a batch of export rows; chapters collects the chapters seen so far"""
+    for row in rows:
+        chapter = (row['book_number'], row['chapter_number'])
+        if chapter not in chapters:
+            chapters.add(chapter)
+            db.execute("INSERT INTO chapters VALUES (?, ?, ?)", chapter + (get_audio_link(voice_info, *chapter),))
+        key, item = chapter_row_item(row)
+        if key == 'verses':
+            db.execute("INSERT INTO verses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                item['code'], *chapter, item['number'], item['join'], item['text'], item['html'],
+                item['begin'], item['end'], item['start_paragraph'],
+            ))
+        elif key == 'titles':
+            db.execute("INSERT INTO titles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                item['code'], *chapter, row['verse_number'], item['before_verse_code'], item['text'],
+                item['metadata'], item['reference'], item['subtitle'], item['position_text'], item['position_html'],
+            ))
+        else:
+            db.execute("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                item['code'], *chapter, row['verse_number'], item['number'], item['text'],
+                item['verse_code'], item['title_code'], item['position_text'], item['position_html'],
+            ))
+
+
+def publish_pack(translation: int, voice: Optional[int], temp_path: Path, manifest: dict) -> dict:
+    """Moves a finished pack file in place under its content hash and points the manifest to it"""
+    sha256 = hashlib.sha256()
+    with open(temp_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    directory = temp_path.parent
+    file_name = f"{pack_name(voice)}-{digest[:32]}.sqlite"
+    os.replace(temp_path, directory / file_name)
+
+    previous = read_manifest(translation, voice)
+    manifest.update({
+        'file': file_name,
+        'size': (directory / file_name).stat().st_size,
+        'sha256': digest,
+        'etag': f'"{digest[:32]}"',
+    })
+    manifest_temp = create_temp_path(directory, voice, '.json.tmp')
+    with open(manifest_temp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_temp, manifest_path(translation, voice))
+
+    # Keep the previous version for downloads that are still running, drop older ones
+    keep = {file_name, previous['file'] if previous else None}
+    for old in directory.glob(f"{pack_name(voice)}-*.sqlite"):
+        if old.name not in keep:
+            old.unlink(missing_ok=True)
+    return manifest
+
+
+def build_pack(translation: int, voice: Optional[int] = None) -> dict:
+    """Builds the pack of a translation (and voice) from scratch, returns its manifest"""
+    translation_name = get_translation_name(None, translation)
+    voice_info = get_voice_info(None, voice, translation) if voice else None
+
+    directory = Path(PACKS_PATH) / str(translation)
+    directory.mkdir(parents=True, exist_ok=True)
+    with pack_lock(directory, voice):
+        return _build_pack(translation, voice, translation_name, voice_info, directory)
+
+
+def _build_pack(translation: int, voice: Optional[int], translation_name: str, voice_info: Optional[dict],
+                directory: Path) -> dict:
+    connection = create_connection(readonly=True)
+    if connection is None:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    cursor = connection.cursor(dictionary=True, buffered=False)
+    temp_path = create_temp_path(directory, voice, '.sqlite.tmp')
+    db = sqlite3.connect(temp_path)
+    chapters = set()
+    finished = False
+    try:
+        db.executescript(PACK_SCHEMA)
+        books = get_catalog().translation_books.get(translation, {}).values()
+        db.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?)", [
+            (book['number'], book['code'], book['alias'], book['name'], book['chapters_count']) for book in books
+        ])
+
+        for book_number in get_catalog().get_book_numbers(translation):
+            cursor.execute(EXPORT_QUERY, {'translation': translation, 'voice': voice, 'book_number': book_number})
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+                if not rows:
+                    break
+                write_pack_rows(db, rows, voice_info, chapters)
+        cursor.close()
+
+        built_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        db.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('format_version', str(PACK_FORMAT_VERSION)),
+            ('translation', str(translation)),
+            ('translation_name', translation_name),
+            ('voice', str(voice or '')),
+            ('voice_name', voice_info['name'] if voice_info else ''),
+            ('built_at', built_at),
+        ])
+        db.executescript(PACK_INDEXES)
+        db.commit()
+        db.execute("VACUUM")
+        finished = True
+    finally:
+        db.close()
+        connection.close()
+        if not finished:
+            temp_path.unlink(missing_ok=True)
+
+    return publish_pack(translation, voice, temp_path, {
+        'translation': translation,
+        'voice': voice,
+        'format_version': PACK_FORMAT_VERSION,
+        'built_at': built_at,
+        'updated_at': built_at,
+        'chapters': len(chapters),
+        'audio_chapters': sum(1 for chapter in chapters if get_audio_link(voice_info, *chapter)),
+    })
+
+
+def update_pack_timings(translation: int, voice: int, chapters: list) -> Optional[dict]:
+    """
+    Reloads verse timings of the given (book_number, chapter_number) in an existing
+    pack; returns the new manifest, None when the pack has not been built
+    """
+    directory = Path(PACKS_PATH) / str(translation)
+    if read_manifest(translation, voice) is None:
+        return None
+    # The manifest and the timings are read under the lock: the copy starts from
+    # the latest published version and no older timings are published after newer ones
+    with pack_lock(directory, voice):
+        return _update_pack_timings(translation, voice, chapters, directory)
+
+
+def _update_pack_timings(translation: int, voice: int, chapters: list, directory: Path) -> Optional[dict]:
+    manifest = read_manifest(translation, voice)
+    if manifest is None:
+        return None
+    voice_info = get_voice_info(None, voice, translation)
+    books = get_catalog().translation_books.get(translation, {})
+    parts = [(books[book_number], chapter_number, None, None)
+             for book_number, chapter_number in sorted(set(chapters)) if book_number in books]
+    chapters_data = load_chapters_data(translation, parts, voice, voice_info, readonly=False) if parts else []
+
+    temp_path = create_temp_path(directory, voice, '.sqlite.tmp')
+    finished = False
+    try:
+        shutil.copyfile(directory / manifest['file'], temp_path)
+        db = sqlite3.connect(temp_path)
+        try:
+            for chapter_data in chapters_data:
+                db.executemany('UPDATE verses SET begin = ?, "end" = ? WHERE code = ?', [
+                    (verse['begin'], verse['end'], verse['code']) for verse in chapter_data['verses']
+                ])
+            db.commit()
+        finally:
+            db.close()
+        finished = True
+    finally:
+        if not finished:
+            temp_path.unlink(missing_ok=True)
+
+    manifest['updated_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    return publish_pack(translation, voice, temp_path, manifest)
+
+
+def schedule_pack_update(voice: int, book_number: int, chapter_number: int):
+    """Called after a change of the voice's alignment; the pack (if built) is updated in the background"""
+    # Only the file system is checked here: most voices have no pack
+    for manifest_file in Path(PACKS_PATH).glob(f"*/{pack_name(voice)}.json"):
+        if not manifest_file.parent.name.isdigit():
+            continue
+        future = _pack_executor.submit(update_pack_timings, int(manifest_file.parent.name), voice, [(book_number, chapter_number)])
+        future.add_done_callback(report_pack_error)
+
+
+def report_pack_error(future):
+    e = future.exception()
+    if e is not None:
+        print(f"The error '{e}' occurred while updating pack")
+
+
+@router.post('/{translation_code}/build', response_model=PackManifestModel, operation_id="build_pack", tags=["Admin"])
+async def build_pack_endpoint(translation_code: int, voice: Optional[int] = None, username: str = RequireJWT):
+    """Build (or rebuild) the offline pack of a translation and voice (requires JWT authentication)"""
+    # Awaited on the event loop: no request thread waits for the build
+    return await asyncio.wrap_future(_pack_executor.submit(build_pack, translation_code, voice))
+
+
+@router.get('/{translation_code}', operation_id="get_pack", response_class=Response,
+            responses={200: {"content": {PACK_MEDIA_TYPE: {}}, "description": "SQLite pack"}, 206: {"description": "Part of the pack"}})
+@router.head('/{translation_code}', include_in_schema=False)
+def get_pack(translation_code: int, request: Request, voice: Optional[int] = None, api_key: bool = RequireAPIKey):
+    """
+    Download the offline pack (SQLite) of a translation and voice
+
+    Supports Range (resumable downloads, several ranges as multipart/byteranges),
+    If-Range and If-None-Match; the ETag is the content hash of the pack.
+    """
+    # Opened before answering: the file stays readable even if a newer version replaces it meanwhile
+    manifest, f = open_pack(translation_code, voice)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail=f"Pack for translation {translation_code} and voice {voice} is not built")
+    etag = manifest['etag']
+    size = manifest['size']
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f'attachment; filename="{translation_code}-{pack_name(voice)}.sqlite"',
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and etag_matches(if_none_match, etag):
+        f.close()
+        return Response(status_code=304, headers=headers)
+
+    ranges = [(0, size - 1)]
+    status_code = 200
+    media_type = PACK_MEDIA_TYPE
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range == etag) and range_header.count(',') < AUDIO_MAX_RANGES:
+        ranges = parse_ranges(range_header, size)
+        if ranges is None:
+            f.close()
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"})
+        status_code = 206
+
+    parts, closing = [], b''
+    if len(ranges) > 1:
+        boundary = uuid.uuid4().hex
+        parts, closing = multipart_parts(ranges, size, boundary, PACK_MEDIA_TYPE)
+        media_type = f"multipart/byteranges; boundary={boundary}"
+        headers["Content-Length"] = str(multipart_length(parts, closing))
+    else:
+        start, end = ranges[0]
+        if status_code == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        f.close()
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    def read_ranges():
+        try:
+            if not parts:
+                yield from read_file_range(f, start, end - start + 1, READ_CHUNK_SIZE)
+                return
+            for header, part_start, part_end in parts:
+                yield header
+                yield from read_file_range(f, part_start, part_end - part_start + 1, READ_CHUNK_SIZE)
+            yield closing
+        finally:
+            f.close()
+
+    return StreamingResponse(read_ranges(), status_code=status_code, headers=headers, media_type=media_type)
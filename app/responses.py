@@ -0,0 +1,23 @@
+# responses.py
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson.
+
+    Content may also be already serialized JSON (bytes), e.g. a chapter document
+    from the chapter cache; it is sent as is. Endpoints that return this class
+    directly skip FastAPI's response_model validation, the response_model is
+    still used for the OpenAPI schema.
+    """
+
+    @staticmethod
+    def encode(content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return self.encode(content)
@@ -0,0 +1,60 @@
+# server.py
+"""
+Production server
+
+    python app/server.py [--host 0.0.0.0] [--port 8000]
+
+Runs the app in WEB_CONCURRENCY uvicorn worker processes with uvloop and
+httptools, without the reloader of `fastapi dev` (which is for development
+only). Idle keep-alive connections are closed after SERVER_TIMEOUT_KEEP_ALIVE
+seconds; on shutdown running requests get SERVER_TIMEOUT_GRACEFUL_SHUTDOWN
+seconds to finish. Sync endpoints of each worker run in SYNC_THREADPOOL_SIZE
+threads (set in the lifespan of main.py).
+
+Every worker has its own caches (catalog, chapter documents, compressed
+responses, audio file lists) and its own DB pool of DB_POOL_SIZE connections,
+so the database sees up to WEB_CONCURRENCY * (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW)
+connections. The workers share the data version (see http_cache.py): ETags are
+the same in all of them and an admin write in one worker clears the caches of
+the others.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from config import (
+    SERVER_TIMEOUT_GRACEFUL_SHUTDOWN, SERVER_TIMEOUT_KEEP_ALIVE, WEB_CONCURRENCY
+)
+from http_cache import reset_data_version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Bible API in production mode")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    args = parser.parse_args()
+
+    # ETags issued before the restart stop matching in all workers
+    reset_data_version()
+
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop",
+        http="httptools",
+        timeout_keep_alive=SERVER_TIMEOUT_KEEP_ALIVE,
+        timeout_graceful_shutdown=SERVER_TIMEOUT_GRACEFUL_SHUTDOWN,
+        # Behind nginx: client address and scheme from X-Forwarded-* of the
+        # addresses in FORWARDED_ALLOW_IPS (read by uvicorn)
+        proxy_headers=True,
+        server_header=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
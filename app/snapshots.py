@@ -0,0 +1,356 @@
+"""
+Static JSON snapshots of the read-only endpoints, served by nginx
+
+The answers of /chapter_with_alignment and of the catalog endpoints change only
+when an admin edits something, so they are rendered into files once and nginx
+serves the files directly (see deploy/nginx/snapshots.locations); on a miss
+nginx falls back to the app. The tree under SNAPSHOTS_PATH mirrors the query
+parameters so that nginx can map a request to a file:
+
+    languages.json                                  /languages
+    translations/all.json                           /translations
+    translations/<language>.json                    /translations?language=...
+    translation_info/<translation>.json             /translation_info?translation=...
+    translations/<translation>/books.json           /translations/{code}/books
+    chapter_with_alignment/<translation>/<book>/<chapter>/<voice or "text">.json
+
+Every file has a .json.gz neighbour for gzip_static. Files are rendered by the
+app itself (in-process ASGI requests), so they are byte for byte the responses
+of the endpoints.
+
+Admin writes call the refresh_* functions: the affected files are removed
+immediately (nginx then asks the app, which has fresh data) and rendered again
+in the background, one refresh at a time. Each removal starts a new generation
+of its scopes (a chapter of a voice, a voice, a translation, a catalog file...);
+a render started before it does not write files of those scopes, so a file
+removed after a change is never written back with the data from before it.
+/cache/clear only removes the tree (clear_snapshots); a full render is the
+job of the script below. Without SNAPSHOTS_PATH these functions do nothing.
+
+    python scripts/build_snapshots.py
+"""
+
+import asyncio
+import gzip
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+import httpx
+
+from catalog import get_catalog
+from config import API_KEY, SNAPSHOTS_PATH
+
+CHAPTERS_DIR = "chapter_with_alignment"
+
+# Snapshot requests rendered at the same time (each holds a DB connection while loading)
+RENDER_CONCURRENCY = 4
+# Client address of the in-process snapshot requests (not counted in the latency of the worker)
+SNAPSHOT_CLIENT = ("snapshots", 0)
+
+_snapshot_app = None
+_snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshots")
+
+# Removals and writes of files are serialized, so a removal can't happen between
+# the generation check of a render and its write
+_generation_lock = threading.Lock()
+_generation = 0
+_removed = {}  # scope -> generation of the last refresh that removed its files
+
+
+def init_snapshots(app):
+    """Registers the app whose responses are rendered by the refresh_* functions"""
+    global _snapshot_app
+    _snapshot_app = app
+
+
+def chapter_snapshot_path(translation: int, book_number: int, chapter_number: int, voice: Optional[int]) -> str:
+    return f"{CHAPTERS_DIR}/{translation}/{book_number}/{chapter_number}/{voice or 'text'}.json"
+
+
+def snapshot_scopes(path: str, url: str, params: dict) -> list:
+    """Scopes a snapshot file belongs to (see remove_snapshots)"""
+    if url != "/api/chapter_with_alignment":
+        return [('catalog',), ('file', path)]
+    voice = params.get('voice')
+    return [
+        ('chapters',),
+        ('translation', params['translation']),
+        ('voice', voice),
+        ('chapter', voice, params['book_number'], params['chapter_number']),
+    ]
+
+
+def is_stale(path: str, url: str, params: dict, generation: Optional[int]) -> bool:
+    """Whether a render of the given generation started before a removal of the file; call under _generation_lock"""
+    if generation is None:
+        return False
+    return any(_removed.get(scope, 0) > generation for scope in snapshot_scopes(path, url, params))
+
+
+def remove_snapshots(root: Path, scopes: list, paths: Iterable[str] = (), trees: Iterable[Path] = ()) -> tuple:
+    """
+    Starts a new generation of the scopes and removes their files: single files
+    and whole trees (moved out of the served tree at once, deleted in the
+    background). Returns (generation, trash directories)
+    """
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        for scope in scopes:
+            _removed[scope] = _generation
+        for path in paths:
+            remove_snapshot(root, path)
+        trash = [detach_tree(root, tree) for tree in trees]
+        return _generation, [path for path in trash if path is not None]
+
+
+def forget_removals(generation: int):
+    """After the refresh of a generation: renders started before it have finished (one refresh at a time)"""
+    with _generation_lock:
+        for scope in [scope for scope, removed in _removed.items() if removed <= generation]:
+            del _removed[scope]
+
+
+def catalog_targets(catalog) -> list:
+    """(file, url, params) of the catalog endpoints"""
+    targets = [
+        ("languages.json", "/api/languages", {}),
+        ("translations/all.json", "/api/translations", {}),
+    ]
+    targets += [
+        (f"translations/{language['alias']}.json", "/api/translations", {'language': language['alias']})
+        for language in catalog.languages
+    ]
+    for code, translation in sorted(catalog.translations.items()):
+        if translation['active']:
+            targets.append((f"translation_info/{code}.json", "/api/translation_info", {'translation': code}))
+            targets.append((f"translations/{code}/books.json", f"/api/translations/{code}/books", {}))
+    return targets
+
+
+def voice_catalog_targets(catalog, voice: int) -> list:
+    """(file, url, params) of the catalog files with the anomaly counts of a voice"""
+    voice_row = catalog.voices.get(voice)
+    translation = catalog.translations.get(voice_row['translation']) if voice_row else None
+    if translation is None:
+        return []
+    return [
+        (path, url, params) for path, url, params in catalog_targets(catalog)
+        if path in ("translations/all.json", f"translations/{translation['language']}.json")
+    ]
+
+
+def chapter_targets(catalog, translation: int, voice: Optional[int] = None) -> list:
+    """
+    (file, url, params) of all chapters of a translation: without a voice and with
+    each active voice, or only with the given voice
+    """
+    if not catalog.translations.get(translation, {}).get('active'):
+        return []
+    if voice is not None:
+        voices = [voice]
+    else:
+        voices = [None] + [code for code, row in sorted(catalog.voices.items())
+                           if row['translation'] == translation and row['active']]
+    targets = []
+    for book_number in catalog.translation_books.get(translation, {}):
+        for chapter_number in sorted(catalog.get_chapters(translation, book_number)):
+            for voice_code in voices:
+                params = {'translation': translation, 'book_number': book_number, 'chapter_number': chapter_number}
+                if voice_code:
+                    params['voice'] = voice_code
+                targets.append((
+                    chapter_snapshot_path(translation, book_number, chapter_number, voice_code),
+                    "/api/chapter_with_alignment",
+                    params,
+                ))
+    return targets
+
+
+def write_snapshot(root: Path, path: str, body: bytes):
+    file_path = root / path
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # .gz first: nginx looks for the .json, so a new .json never goes with an old .gz
+    for target, data in ((file_path.with_name(file_path.name + '.gz'), gzip.compress(body, 9, mtime=0)),
+                         (file_path, body)):
+        temp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        temp.write_bytes(data)
+        os.replace(temp, target)
+
+
+def remove_snapshot(root: Path, path: str):
+    file_path = root / path
+    file_path.unlink(missing_ok=True)
+    file_path.with_name(file_path.name + '.gz').unlink(missing_ok=True)
+
+
+async def render_snapshots(app, root: Path, targets: Iterable[tuple], generation: Optional[int] = None) -> tuple:
+    """
+    Renders targets through the app and writes them; returns (written, removed).
+    With a generation, files removed by a later refresh are skipped (see remove_snapshots)
+    """
+    semaphore = asyncio.Semaphore(RENDER_CONCURRENCY)
+    counts = [0, 0]
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False, client=SNAPSHOT_CLIENT)
+    headers = {'X-API-Key': API_KEY, 'Accept-Encoding': 'identity'}
+    async with httpx.AsyncClient(transport=transport, base_url="http://snapshots", headers=headers) as client:
+        async def render(path: str, url: str, params: dict):
+            async with semaphore:
+                response = await client.get(url, params=params)
+            with _generation_lock:
+                if is_stale(path, url, params, generation):
+                    return
+                if response.status_code == 200:
+                    write_snapshot(root, path, response.content)
+                    counts[0] += 1
+                else:
+                    # Not found any more (deactivated translation, removed chapter): the app answers
+                    remove_snapshot(root, path)
+                    counts[1] += 1
+
+        await asyncio.gather(*(render(*target) for target in targets))
+    return tuple(counts)
+
+
+def generate_snapshots(app, root: Path, translations: Optional[list] = None) -> tuple:
+    """Renders the catalog files and all chapters of the translations (all active by default)"""
+    catalog = get_catalog()
+    if translations is None:
+        translations = [code for code, row in sorted(catalog.translations.items()) if row['active']]
+    targets = catalog_targets(catalog)
+    for translation in translations:
+        targets += chapter_targets(catalog, translation)
+    return asyncio.run(render_snapshots(app, root, targets))
+
+
+def catalog_snapshot_paths(root: Path) -> list:
+    return [
+        str(file_path.relative_to(root))
+        for pattern in ("languages.json", "translations/*.json", "translation_info/*.json", "translations/*/books.json")
+        for file_path in root.glob(pattern)
+    ]
+
+
+def detach_tree(root: Path, path: Path):
+    """Moves a directory out of the served tree at once; it is deleted in the background"""
+    if not path.exists():
+        return None
+    trash = root / f".trash-{uuid.uuid4().hex}"
+    os.replace(path, trash)
+    return trash
+
+
+def schedule_refresh(root: Path, build_targets, generation: int, trash: Iterable[Path] = ()):
+    app = _snapshot_app
+
+    def refresh():
+        try:
+            for path in trash:
+                shutil.rmtree(path, ignore_errors=True)
+            asyncio.run(render_snapshots(app, root, build_targets(get_catalog()), generation))
+        finally:
+            forget_removals(generation)
+
+    _snapshot_executor.submit(refresh).add_done_callback(report_snapshot_error)
+
+
+def report_snapshot_error(future):
+    e = future.exception()
+    if e is not None:
+        print(f"The error '{e}' occurred while refreshing snapshots")
+
+
+def snapshots_root() -> Optional[Path]:
+    if not SNAPSHOTS_PATH or _snapshot_app is None:
+        return None
+    root = Path(SNAPSHOTS_PATH)
+    return root if root.is_dir() else None
+
+
+def refresh_anomaly_snapshots(voice: int):
+    """After an anomaly of a voice is added: only the catalog files with its anomaly counts change"""
+    root = snapshots_root()
+    if root is None:
+        return
+    paths = [path for path, _, _ in voice_catalog_targets(get_catalog(), voice)]
+    generation, _ = remove_snapshots(root, [('file', path) for path in paths], paths)
+    schedule_refresh(root, lambda catalog: voice_catalog_targets(catalog, voice), generation)
+
+
+def refresh_chapter_snapshots(voice: int, book_number: int, chapter_number: int):
+    """After a change of the alignment of a chapter; anomaly counts of the voice change too"""
+    root = snapshots_root()
+    if root is None:
+        return
+    catalog = get_catalog()
+    voice_row = catalog.voices.get(voice)
+    paths = [path for path, _, _ in voice_catalog_targets(catalog, voice)]
+    if voice_row is not None:
+        paths.append(chapter_snapshot_path(voice_row['translation'], book_number, chapter_number, voice))
+    scopes = [('file', path) for path in paths] + [('chapter', voice, book_number, chapter_number)]
+    generation, _ = remove_snapshots(root, scopes, paths)
+
+    def targets(catalog):
+        voice_row = catalog.voices.get(voice)
+        if voice_row is None or not voice_row['active']:
+            return []
+        chapter = [
+            target for target in chapter_targets(catalog, voice_row['translation'], voice)
+            if target[2]['book_number'] == book_number and target[2]['chapter_number'] == chapter_number
+        ]
+        return voice_catalog_targets(catalog, voice) + chapter
+    schedule_refresh(root, targets, generation)
+
+
+def refresh_translation_snapshots(translation: int):
+    """After a change of a translation or of its text: all its chapters are rendered again"""
+    root = snapshots_root()
+    if root is None:
+        return
+    generation, trash = remove_snapshots(
+        root, [('catalog',), ('translation', translation)], catalog_snapshot_paths(root),
+        [root / CHAPTERS_DIR / str(translation)]
+    )
+    schedule_refresh(root, lambda catalog: catalog_targets(catalog) + chapter_targets(catalog, translation), generation, trash)
+
+
+def refresh_voice_snapshots(voice: int):
+    """After a change of a voice (name, link template, active): its chapters are rendered again"""
+    root = snapshots_root()
+    if root is None:
+        return
+    paths = catalog_snapshot_paths(root) + [
+        str(path.relative_to(root)) for path in root.glob(f"{CHAPTERS_DIR}/*/*/*/{voice}.json")
+    ]
+    generation, _ = remove_snapshots(root, [('catalog',), ('voice', voice)], paths)
+
+    def targets(catalog):
+        voice_row = catalog.voices.get(voice)
+        chapters = chapter_targets(catalog, voice_row['translation'], voice) if voice_row and voice_row['active'] else []
+        return catalog_targets(catalog) + chapters
+    schedule_refresh(root, targets, generation)
+
+
+def clear_snapshots():
+    """
+    After the caches are cleared by hand: all files are removed and nginx asks the
+    app until scripts/build_snapshots.py renders them again (nothing is rendered here)
+    """
+    root = snapshots_root()
+    if root is None:
+        return
+    generation, trash = remove_snapshots(root, [('catalog',), ('chapters',)], catalog_snapshot_paths(root), [root / CHAPTERS_DIR])
+
+    def cleanup():
+        try:
+            for path in trash:
+                shutil.rmtree(path, ignore_errors=True)
+        finally:
+            forget_removals(generation)
+
+    _snapshot_executor.submit(cleanup).add_done_callback(report_snapshot_error)
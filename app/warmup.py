@@ -0,0 +1,114 @@
+# warmup.py
+"""
+Startup warm-up and readiness
+
+Right after a start every cache is cold: the catalog has to be loaded, the first
+chapter of each voice walks the whole MP3 tree of the voice (os.scandir in
+get_all_existing_audio_chapters) and every chapter is assembled from MySQL. The
+lifespan of main.py starts warm_up() in the background; until it has finished
+GET /api/ready (health.py) answers 503, so a load balancer routes requests only to warm
+instances. Requests that arrive earlier are still served.
+
+Steps:
+1. catalog - loaded from MySQL, retried every WARMUP_RETRY_SECONDS until the
+   database is reachable (the instance stays not ready meanwhile);
+2. audio - MP3 coverage of every active voice is scanned;
+3. chapters - chapters listed in WARMUP_CHAPTERS
+   ("translation:book:chapter[:voice]", comma separated) are assembled into the
+   chapter cache; errors of single chapters are reported and skipped.
+
+Each worker process warms up its own caches.
+"""
+import asyncio
+import time
+
+from catalog import refresh_catalog
+from config import WARMUP_CHAPTERS, WARMUP_ENABLED, WARMUP_RETRY_SECONDS
+from database import run_in_db_thread
+from excerpt import build_chapter_with_alignment, get_all_existing_audio_chapters
+
+_state = {
+    'status': 'pending',
+    'started_at': None,
+    'finished_at': None,
+    'steps': {},
+    'error': None,
+}
+
+
+def get_warmup_state() -> dict:
+    return {**_state, 'steps': dict(_state['steps'])}
+
+
+def is_ready() -> bool:
+    return _state['status'] == 'ready'
+
+
+def parse_warmup_chapters(value: str) -> list:
+    """"1:43:3:1, 1:1:1" -> [(1, 43, 3, 1), (1, 1, 1, None)]; malformed entries are skipped"""
+    chapters = []
+    for entry in value.split(','):
+        parts = entry.strip().split(':')
+        if len(parts) not in (3, 4) or not all(part.isdigit() for part in parts):
+            continue
+        numbers = [int(part) for part in parts]
+        chapters.append(tuple(numbers) if len(numbers) == 4 else (*numbers, None))
+    return chapters
+
+
+async def load_catalog_with_retry():
+    while True:
+        try:
+            return await run_in_db_thread(refresh_catalog)
+        except Exception as e:
+            print(f"The error '{e}' occurred while loading catalog, retrying in {WARMUP_RETRY_SECONDS}s")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+
+async def scan_audio(catalog) -> int:
+    """Fills the audio coverage cache of every active voice of an active translation"""
+    voices = [
+        (catalog.translations[voice['translation']]['alias'], voice['alias'])
+        for voice in catalog.voices.values()
+        if voice['active'] and catalog.translations.get(voice['translation'], {}).get('active')
+    ]
+    # File system only, runs on the default threads, not on the DB executor
+    await asyncio.gather(*(asyncio.to_thread(get_all_existing_audio_chapters, *voice) for voice in voices))
+    return len(voices)
+
+
+async def build_chapters(chapters: list) -> int:
+    built = 0
+    for translation, book_number, chapter_number, voice in chapters:
+        try:
+            await run_in_db_thread(build_chapter_with_alignment, translation, book_number, chapter_number, voice)
+            built += 1
+        except Exception as e:
+            print(f"The error '{e}' occurred while warming up chapter {translation}:{book_number}:{chapter_number}:{voice}")
+    return built
+
+
+async def warm_up():
+    """Runs all warm-up steps; the instance is ready afterwards"""
+    _state.update(status='running', started_at=time.time(), finished_at=None, steps={}, error=None)
+    try:
+        if WARMUP_ENABLED:
+            started = time.monotonic()
+            catalog = await load_catalog_with_retry()
+            _state['steps']['catalog'] = {'seconds': round(time.monotonic() - started, 3)}
+
+            started = time.monotonic()
+            voices = await scan_audio(catalog)
+            _state['steps']['audio'] = {'voices': voices, 'seconds': round(time.monotonic() - started, 3)}
+
+            started = time.monotonic()
+            built = await build_chapters(parse_warmup_chapters(WARMUP_CHAPTERS))
+            _state['steps']['chapters'] = {'built': built, 'seconds': round(time.monotonic() - started, 3)}
+        _state.update(status='ready', finished_at=time.time())
+    except asyncio.CancelledError:
+        _state['status'] = 'cancelled'
+        raise
+    except Exception as e:
+        # The caches fill on use; an instance that can't warm up is still able to serve
+        print(f"The error '{e}' occurred while warming up")
+        _state.update(status='ready', finished_at=time.time(), error=str(e))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Latency benchmark for chapter assembly (get_chapter_data).
+
+Compares two ways of loading verses, titles and notes of a chapter:
+
+  three-query  - previous implementation: verses, then titles by
+                 `before_translation_verse IN (...)`, then notes by
+                 `translation_verse IN (...) OR translation_title IN (...)`
+  single       - current get_chapter_data: one UNION ALL statement keyed by
+                 translation/book/chapter, stitched in Python
+
+Long chapters (Psalm 119, 176 verses) show the difference best. Needs the usual
+DB_* environment (e.g. inside the `bible-api` container):
+
+  python benchmarks/bench_chapter_assembly.py --translation 1 --voice 1 -n 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from database import get_pool
+from excerpt import get_books_info, get_book_alias, get_chapter_data
+
+
+CHAPTERS = [(1, 1), (43, 3), (19, 23), (19, 119)]
+
+
+def three_query_chapter(cursor, translation: int, book_number: int, chapter_number: int, voice: int | None) -> int:
+    """Previous three round-trip implementation (rows only, no models)"""
+    cursor.execute('''
+        SELECT
+            v.code, v.verse_number, v.verse_number_join, v.html, v.text, v.start_paragraph,
+            COALESCE(vmf.begin, a.begin) as begin,
+            COALESCE(vmf.end, a.end) as end
+        FROM translation_verses AS v
+            LEFT JOIN voice_alignments a ON (
+                a.voice = %(voice)s AND a.book_number = %(book_number)s AND
+                a.chapter_number = %(chapter_number)s AND a.verse_number = v.verse_number
+            )
+            LEFT JOIN voice_manual_fixes vmf ON (
+                vmf.voice = %(voice)s AND vmf.book_number = %(book_number)s AND
+                vmf.chapter_number = %(chapter_number)s AND vmf.verse_number = v.verse_number
+            )
+        WHERE v.translation = %(translation)s
+            AND v.book_number = %(book_number)s
+            AND v.chapter_number = %(chapter_number)s
+        ORDER BY v.verse_number
+    ''', {'voice': voice, 'translation': translation, 'book_number': book_number, 'chapter_number': chapter_number})
+    verses = cursor.fetchall()
+    codes = ", ".join(str(verse['code']) for verse in verses)
+
+    cursor.execute('''
+        SELECT code, text, before_translation_verse, metadata, reference, subtitle, position_text, position_html
+        FROM translation_titles
+        WHERE before_translation_verse IN (%s)
+    ''' % codes)
+    titles = cursor.fetchall()
+
+    notes_query = '''
+        SELECT code, note_number, text, translation_verse, translation_title, position_text, position_html
+        FROM translation_notes
+        WHERE translation_verse IN (%s)
+    ''' % codes
+    if titles:
+        notes_query += ''' OR translation_title IN (%s)''' % ", ".join(str(title['code']) for title in titles)
+    cursor.execute(notes_query)
+    notes = cursor.fetchall()
+    return len(verses) + len(titles) + len(notes)
+
+
+def timeit(func, n: int) -> list[float]:
+    timings = []
+    for _ in range(n):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--translation", type=int, default=1)
+    parser.add_argument("--voice", type=int, default=None)
+    parser.add_argument("-n", type=int, default=200, help="runs per chapter and mode")
+    args = parser.parse_args()
+
+    print(f"{'chapter':<10} {'verses':>6} {'3-query ms':>11} {'single ms':>10} {'p95 3q':>8} {'p95 1':>8}")
+    with get_pool().acquire() as connection:
+        cursor = connection.cursor(dictionary=True)
+        for book_number, chapter_number in CHAPTERS:
+            try:
+                book_info = get_books_info(cursor, args.translation, get_book_alias(cursor, book_number))[0]
+                verses_count = len(get_chapter_data(cursor, args.translation, book_info, chapter_number, args.voice)['verses'])
+            except Exception as e:
+                print(f"{book_number}:{chapter_number:<7} skipped ({e})")
+                continue
+
+            old = sorted(timeit(lambda: three_query_chapter(cursor, args.translation, book_number, chapter_number, args.voice), args.n))
+            new = sorted(timeit(lambda: get_chapter_data(cursor, args.translation, book_info, chapter_number, args.voice), args.n))
+            p95 = int(args.n * 0.95) - 1
+            print(f"{book_number}:{chapter_number:<7} {verses_count:>6} {statistics.median(old) * 1000:>11.2f} "
+                  f"{statistics.median(new) * 1000:>10.2f} {old[p95] * 1000:>8.2f} {new[p95] * 1000:>8.2f}")
+        cursor.close()
+
+
+if __name__ == "__main__":
+    main()
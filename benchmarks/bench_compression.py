@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Size and CPU benchmark of response compression on real chapters.
+
+Assembles a random sample of chapters of a translation exactly as
+/chapter_with_alignment sends them, then for every encoding and level reports
+the compressed size and the CPU time to compress one chapter. The last row is
+the cost of serving a compressed variant from the cache (digest + lookup), which
+is what repeated requests pay instead of compressing again.
+
+Needs the usual DB_* environment (e.g. inside the `bible-api` container):
+
+  python benchmarks/bench_compression.py --translation 1 --voice 1 --chapters 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from catalog import get_catalog
+from compression import CompressedCache, brotli, get_compressed
+from excerpt import build_chapter_with_alignment
+
+
+def sample_chapters(translation: int, count: int, seed: int) -> list[tuple[int, int]]:
+    catalog = get_catalog()
+    chapters = [
+        (book_number, chapter_number)
+        for book_number in catalog.translation_books.get(translation, {})
+        for chapter_number in sorted(catalog.get_chapters(translation, book_number))
+    ]
+    random.Random(seed).shuffle(chapters)
+    # Psalm 119 is the largest chapter, always measure it
+    return sorted(set(chapters[:count]) | ({(19, 119)} & set(chapters)))
+
+
+def codecs() -> list[tuple[str, callable]]:
+    result = [(f'gzip -{level}', lambda body, level=level: gzip.compress(body, level, mtime=0)) for level in (1, 6, 9)]
+    result.append(('deflate -6', lambda body: zlib.compress(body, 6)))
+    if brotli is not None:
+        result += [(f'br q{quality}', lambda body, quality=quality: brotli.compress(body, quality=quality, mode=brotli.MODE_TEXT))
+                   for quality in (4, 5, 6, 9, 11)]
+    return result
+
+
+def cpu_ms(func, body: bytes, repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        func(body)
+    return (time.process_time() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--translation", type=int, default=1)
+    parser.add_argument("--voice", type=int, default=None)
+    parser.add_argument("--chapters", type=int, default=50, help="sample size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-n", type=int, default=5, help="compressions per chapter and codec")
+    args = parser.parse_args()
+
+    bodies = [
+        build_chapter_with_alignment(args.translation, book_number, chapter_number, args.voice).body
+        for book_number, chapter_number in sample_chapters(args.translation, args.chapters, args.seed)
+    ]
+    raw_total = sum(len(body) for body in bodies)
+    print(f"{len(bodies)} chapters, {raw_total / 1024:.0f} KiB JSON, "
+          f"median {statistics.median(len(body) for body in bodies) / 1024:.1f} KiB, "
+          f"max {max(len(body) for body in bodies) / 1024:.1f} KiB")
+    print(f"{'codec':>12} {'KiB':>8} {'ratio':>6} {'ms/chapter':>11} {'ms max':>7}")
+    for name, func in codecs():
+        size = sum(len(func(body)) for body in bodies)
+        timings = [cpu_ms(func, body, args.n) for body in bodies]
+        print(f"{name:>12} {size / 1024:>8.0f} {raw_total / size:>6.2f} "
+              f"{statistics.mean(timings):>11.3f} {max(timings):>7.3f}")
+
+    cache = CompressedCache(max_bytes=256 * 1024 * 1024)
+    encoding = 'br' if brotli is not None else 'gzip'
+    for body in bodies:
+        get_compressed(body, encoding, cache)
+    timings = [cpu_ms(lambda body: get_compressed(body, encoding, cache), body, args.n) for body in bodies]
+    print(f"{'cached ' + encoding:>12} {cache.stats()['bytes'] / 1024:>8.0f} {raw_total / cache.stats()['bytes']:>6.2f} "
+          f"{statistics.mean(timings):>11.3f} {max(timings):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
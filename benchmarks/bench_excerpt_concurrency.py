@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for /chapter_with_alignment and /excerpt_with_alignment.
+
+Sends a mixed stream of chapter and multi-part excerpt requests with the given
+concurrency to the app in-process (ASGI transport, no network) and reports
+requests/second and latency percentiles for two modes:
+
+  blocking  - DB code runs directly inside the event loop (behaviour before the
+              DB thread pool was introduced)
+  offload   - DB code runs in the bounded DB thread pool (current behaviour)
+
+Needs the usual DB_*/API_KEY/JWT_SECRET_KEY environment (e.g. inside the
+`bible-api` container):
+
+  python benchmarks/bench_excerpt_concurrency.py --translation 16 --voice 1 \
+      --requests 400 --concurrency 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+import httpx
+
+import excerpt
+from config import API_KEY
+from main import app
+
+
+CHAPTERS = [(1, 1), (19, 23), (19, 119), (40, 5), (43, 3), (45, 8)]
+EXCERPTS = ["jhn 3:16-17", "gen 1 gen 2", "psa 23 mat 5 mat 6 mat 7", "rom 8:28-39 1co 13"]
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def build_requests(total: int, translation: int, voice: int | None) -> list[tuple[str, dict]]:
+    result = []
+    for i in range(total):
+        params = {"translation": translation}
+        if voice:
+            params["voice"] = voice
+        if i % 2 == 0:
+            book_number, chapter_number = CHAPTERS[(i // 2) % len(CHAPTERS)]
+            result.append(("/api/chapter_with_alignment", {**params, "book_number": book_number, "chapter_number": chapter_number}))
+        else:
+            result.append(("/api/excerpt_with_alignment", {**params, "excerpt": EXCERPTS[(i // 2) % len(EXCERPTS)]}))
+    return result
+
+
+async def run(mode: str, requests: list[tuple[str, dict]], concurrency: int) -> dict:
+    original = excerpt.run_in_db_thread
+    if mode == "blocking":
+        excerpt.run_in_db_thread = _inline
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"X-API-Key": API_KEY}) as client:
+            queue = list(reversed(requests))
+            latencies = []
+            errors = 0
+
+            async def worker():
+                nonlocal errors
+                while queue:
+                    url, params = queue.pop()
+                    started = time.perf_counter()
+                    response = await client.get(url, params=params)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        excerpt.run_in_db_thread = original
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--translation", type=int, default=16)
+    parser.add_argument("--voice", type=int, default=None)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--modes", default="blocking,offload")
+    args = parser.parse_args()
+
+    requests = build_requests(args.requests, args.translation, args.voice)
+    # Warm-up: fill audio caches and open pooled connections
+    asyncio.run(run("offload", requests[:20], 4))
+
+    print(f"{'mode':<10} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes.split(","):
+        r = asyncio.run(run(mode, requests, args.concurrency))
+        print(f"{r['mode']:<10} {r['requests']:>8} {r['errors']:>6} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Latency of multi-part excerpts as the number of parts grows.
+
+For excerpts of 1..N whole chapters (a reading plan like
+`gen 1 gen 2 psa 23 mat 5 mat 6 mat 7`) compares:
+
+  per-part  - one get_chapter_data round-trip per part
+  batched   - get_chapters_data: all parts in one statement (current behaviour
+              of /excerpt_with_alignment)
+
+Needs the usual DB_* environment (e.g. inside the `bible-api` container):
+
+  python benchmarks/bench_excerpt_parts.py --translation 1 --voice 1 -n 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from database import get_pool
+from excerpt import get_books_info, get_chapter_data, get_chapters_data
+
+
+PLAN = [('gen', 1), ('gen', 2), ('psa', 23), ('mat', 5), ('mat', 6), ('mat', 7), ('jhn', 3), ('rom', 8), ('1co', 13), ('psa', 119)]
+
+
+def median_ms(func, n: int) -> float:
+    timings = []
+    for _ in range(n):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--translation", type=int, default=1)
+    parser.add_argument("--voice", type=int, default=None)
+    parser.add_argument("-n", type=int, default=100, help="runs per excerpt size and mode")
+    args = parser.parse_args()
+
+    chapters = []
+    for alias, chapter_number in PLAN:
+        books = get_books_info(None, args.translation, alias)
+        if books:
+            chapters.append((books[0], chapter_number, None, None))
+
+    print(f"{'parts':>5} {'per-part ms':>12} {'batched ms':>11}")
+    with get_pool().acquire() as connection:
+        cursor = connection.cursor(dictionary=True)
+        for size in range(1, len(chapters) + 1):
+            parts = chapters[:size]
+
+            def per_part():
+                for book_info, chapter_number, _, _ in parts:
+                    get_chapter_data(cursor, args.translation, book_info, chapter_number, args.voice)
+
+            def batched():
+                get_chapters_data(cursor, args.translation, parts, args.voice)
+
+            per_part(), batched()  # warm-up
+            print(f"{size:>5} {median_ms(per_part, args.n):>12.2f} {median_ms(batched, args.n):>11.2f}")
+        cursor.close()
+
+
+if __name__ == "__main__":
+    main()
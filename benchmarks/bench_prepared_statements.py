@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Microbenchmark: text protocol vs prepared statements for the chapter verses query.
+
+For each chapter the verses/alignment/manual-fix join from get_chapter_data is
+captured and then executed N times:
+
+  text      - regular cursor, MySQL parses the statement on every execution
+  prepared  - StatementCache of a pooled connection, parsed once and re-executed
+              with bound parameters
+
+Chapters are picked to cover realistic sizes (31 to 176 verses). Needs the usual
+DB_* environment (e.g. inside the `bible-api` container):
+
+  python benchmarks/bench_prepared_statements.py --translation 1 --voice 1 -n 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from database import PreparedSQL, get_pool
+from excerpt import get_books_info, get_book_alias, get_chapter_data
+
+
+CHAPTERS = [(1, 1), (43, 3), (19, 23), (40, 5), (19, 119)]
+
+
+class RecordingCursor:
+    """Cursor wrapper that remembers the first prepared statement it executes"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.captured = None
+
+    def execute(self, operation, params=None):
+        if self.captured is None and isinstance(operation, PreparedSQL):
+            self.captured = (operation, params)
+        return self._cursor.execute(operation, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def capture_verses_query(connection, translation: int, book_number: int, chapter_number: int, voice: int | None):
+    cursor = connection.cursor(dictionary=True)
+    try:
+        alias = get_book_alias(cursor, book_number)
+        book_info = get_books_info(cursor, translation, alias)[0]
+        recorder = RecordingCursor(cursor)
+        data = get_chapter_data(recorder, translation, book_info, chapter_number, voice)
+        return recorder.captured, len(data['verses'])
+    finally:
+        cursor.close()
+
+
+def timeit(func, n: int) -> list[float]:
+    timings = []
+    for _ in range(n):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--translation", type=int, default=1)
+    parser.add_argument("--voice", type=int, default=None)
+    parser.add_argument("-n", type=int, default=500, help="executions per chapter and mode")
+    args = parser.parse_args()
+
+    pool = get_pool()
+    print(f"{'chapter':<10} {'verses':>6} {'text us':>10} {'prepared us':>12} {'speedup':>8}")
+    with pool.acquire() as connection:
+        for book_number, chapter_number in CHAPTERS:
+            try:
+                (sql, params), verses_count = capture_verses_query(connection, args.translation, book_number, chapter_number, args.voice)
+            except Exception as e:
+                print(f"{book_number}:{chapter_number:<7} skipped ({e})")
+                continue
+
+            text_cursor = connection.cursor(dictionary=True)._cursor
+
+            def run_text():
+                text_cursor.execute(str(sql), params)
+                text_cursor.fetchall()
+
+            def run_prepared():
+                connection._statements.execute(sql, params)
+
+            run_text(), run_prepared()  # warm-up
+            text = statistics.median(timeit(run_text, args.n)) * 1e6
+            prepared = statistics.median(timeit(run_prepared, args.n)) * 1e6
+            text_cursor.close()
+            print(f"{book_number}:{chapter_number:<7} {verses_count:>6} {text:>10.0f} {prepared:>12.0f} {text / prepared:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
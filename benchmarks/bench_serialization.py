@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""CPU cost of turning chapter rows into a /chapter_with_alignment response body.
+
+Both paths start from the rows returned by the chapter query and end with the
+JSON bytes sent to the client:
+
+  models  - previous path: VerseWithAlignmentModel/TitleModel/NoteModel per row,
+            PartsWithAlignmentModel and ExcerptWithAlignmentModel, validation
+            against response_model, jsonable_encoder and stdlib json
+  fast    - current path: dicts built straight from rows (split_chapter_rows)
+            and orjson (FastJSONResponse)
+
+Rows are synthetic (no database needed); the default of 176 verses matches
+Psalm 119:
+
+  python benchmarks/bench_serialization.py --verses 176 -n 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import excerpt
+from excerpt import build_part_json, excerpt_response, split_chapter_rows
+from models import ExcerptWithAlignmentModel, NoteModel, PartsWithAlignmentModel, TitleModel, VerseWithAlignmentModel
+
+
+BOOK_INFO = {'code': 19, 'number': 19, 'alias': 'psa', 'name': 'Псалтирь', 'chapters_count': 150}
+TEXT = "Блаженны непорочные в пути, ходящие в законе Господнем. " * 2
+
+
+def make_rows(verses: int) -> list[dict]:
+    base = {
+        'verse_number_join': None, 'html': None, 'start_paragraph': None, 'begin': None, 'end': None,
+        'verse_code': None, 'title_code': None, 'metadata': None, 'reference': None, 'subtitle': None,
+        'position_text': None, 'position_html': None, 'book_number': 19, 'chapter_number': 119,
+    }
+    rows = []
+    for number in range(1, verses + 1):
+        rows.append({**base, 'kind': 1, 'code': number, 'number': number, 'verse_number_join': 0, 'text': TEXT,
+                     'html': f'<p>{TEXT}</p>', 'start_paragraph': int(number % 8 == 1),
+                     'begin': Decimal(number * 7) / 2, 'end': Decimal(number * 7 + 6) / 2, 'verse_number': number})
+        if number % 8 == 1:
+            rows.append({**base, 'kind': 2, 'code': number, 'number': number, 'text': 'Алеф', 'verse_code': number,
+                         'subtitle': 0, 'verse_number': number})
+        if number % 5 == 0:
+            rows.append({**base, 'kind': 3, 'code': number, 'number': number // 5, 'text': 'Или: уставах',
+                         'verse_code': number, 'position_text': 10, 'position_html': 13, 'verse_number': number})
+    return rows
+
+
+def models_path(rows: list[dict]) -> bytes:
+    verses, titles, notes = [], [], []
+    for row in rows:
+        if row['kind'] == 1:
+            verses.append(VerseWithAlignmentModel(
+                code=row['code'], number=row['number'], join=row['verse_number_join'], html=row['html'],
+                text=row['text'], begin=row['begin'], end=row['end'], start_paragraph=row['start_paragraph']))
+        elif row['kind'] == 2:
+            titles.append(TitleModel(
+                code=row['code'], text=row['text'], before_verse_code=row['verse_code'], metadata=row['metadata'],
+                reference=row['reference'], subtitle=bool(row['subtitle']), position_text=row['position_text'],
+                position_html=row['position_html']))
+        else:
+            notes.append(NoteModel(
+                code=row['code'], number=row['number'], text=row['text'], verse_code=row['verse_code'],
+                title_code=row['title_code'], position_text=row['position_text'], position_html=row['position_html']))
+    part = PartsWithAlignmentModel(book=BOOK_INFO, prev_excerpt='psa 118', next_excerpt='psa 120', chapter_number=119,
+                                   audio_link='', verses=verses, notes=notes, titles=titles)
+    result = ExcerptWithAlignmentModel(title='Псалтирь 119', is_single_chapter=True, parts=[part])
+    # FastAPI: validate the returned object against response_model, then encode
+    validated = ExcerptWithAlignmentModel.model_validate(result.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def fast_path(rows: list[dict]) -> bytes:
+    chapter_data = split_chapter_rows(rows, [(19, 119, 0, 32767)])[0]
+    chapter_data['audio_link'] = ''
+    return excerpt_response('Псалтирь 119', True, [build_part_json(1, BOOK_INFO, 119, chapter_data)]).body
+
+
+def cpu_us(func, rows, n: int) -> float:
+    timings = []
+    for _ in range(n):
+        started = time.process_time()
+        func(rows)
+        timings.append(time.process_time() - started)
+    return statistics.mean(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verses", type=int, default=176)
+    parser.add_argument("-n", type=int, default=2000, help="iterations per path")
+    args = parser.parse_args()
+
+    # prev/next links come from the catalog, which needs the database
+    excerpt.get_prev_excerpt = lambda *a: 'psa 118'
+    excerpt.get_next_excerpt = lambda *a: 'psa 120'
+
+    rows = make_rows(args.verses)
+    assert models_path(rows) == fast_path(rows), "paths must produce identical JSON"
+
+    old, new = cpu_us(models_path, rows, args.n), cpu_us(fast_path, rows, args.n)
+    print(f"{'verses':>6} {'bytes':>7} {'models us':>10} {'fast us':>8} {'saved us':>9} {'speedup':>8}")
+    print(f"{args.verses:>6} {len(fast_path(rows)):>7} {old:>10.0f} {new:>8.0f} {old - new:>9.0f} {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
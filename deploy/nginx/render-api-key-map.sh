@@ -0,0 +1,27 @@
+#!/bin/sh
+# Writes the API key map of the snapshot locations (included by default.conf as
+# /etc/nginx/snippets/bible-api-key.map) from API_KEY of bible-api. The file holds
+# the secret and is not tracked; nginx does not start without it.
+#
+#   API_KEY=... deploy/nginx/render-api-key-map.sh [output, default deploy/nginx/api-key.map]
+#   set -a; . ./.env; set +a; deploy/nginx/render-api-key-map.sh
+set -eu
+
+: "${API_KEY:?API_KEY is not set}"
+case "$API_KEY" in
+    CHANGE_ME*)
+        echo "API_KEY is still the placeholder" >&2
+        exit 1
+        ;;
+    *[!A-Za-z0-9._~+/=-]*)
+        # The value is written into an nginx string as is
+        echo "API_KEY contains characters not allowed in the nginx map" >&2
+        exit 1
+        ;;
+esac
+
+output="${1:-$(dirname "$0")/api-key.map}"
+umask 077
+printf '"%s" 1;\n' "$API_KEY" > "$output.tmp"
+mv "$output.tmp" "$output"
+echo "Written $output"
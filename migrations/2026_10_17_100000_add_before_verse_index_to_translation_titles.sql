@@ -0,0 +1,7 @@
+-- Migration: add_before_verse_index_to_translation_titles
+-- Created: 2026-10-17 10:00:00
+
+-- get_chapter_data joins titles to the chapter verses by before_translation_verse
+
+ALTER TABLE `translation_titles`
+ADD INDEX `idx_translation_titles_before_verse` (`before_translation_verse`);
@@ -0,0 +1,17 @@
+-- Migration: add_sync_indexes_to_voice_changes
+-- Created: 2026-10-17 12:00:00
+
+-- /voices/{code}/changes returns verses whose timings changed since a watermark.
+-- created_at of voice_manual_fixes misses updates of an existing fix, so fixes get
+-- updated_at (maintained by MySQL on every update), initialized from created_at
+
+ALTER TABLE `voice_manual_fixes`
+ADD COLUMN `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'Record update timestamp';
+
+UPDATE `voice_manual_fixes` SET `updated_at` = COALESCE(`created_at`, `updated_at`);
+
+ALTER TABLE `voice_manual_fixes`
+ADD INDEX `idx_voice_manual_fixes_voice_updated` (`voice`, `updated_at`);
+
+ALTER TABLE `voice_anomalies`
+ADD INDEX `idx_voice_anomalies_voice_updated` (`voice`, `updated_at`);
@@ -0,0 +1,46 @@
+-- Migration: create_translation_chapters_table
+-- Created: 2026-10-17 13:00:00
+
+-- Chapters that have verses in each translation. The catalog reads this small table
+-- instead of grouping translation_verses (the largest table) on every reload.
+-- Triggers keep it in sync with translation_verses whatever loads the text.
+
+CREATE TABLE `translation_chapters` (
+  `translation` int NOT NULL,
+  `book_number` smallint NOT NULL,
+  `chapter_number` smallint NOT NULL,
+  PRIMARY KEY (`translation`, `book_number`, `chapter_number`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO `translation_chapters` (`translation`, `book_number`, `chapter_number`)
+SELECT `translation`, `book_number`, `chapter_number`
+FROM `translation_verses`
+GROUP BY `translation`, `book_number`, `chapter_number`;
+
+CREATE TRIGGER `translation_verses_chapters_insert` AFTER INSERT ON `translation_verses`
+FOR EACH ROW
+INSERT IGNORE INTO `translation_chapters` (`translation`, `book_number`, `chapter_number`)
+VALUES (NEW.`translation`, NEW.`book_number`, NEW.`chapter_number`);
+
+CREATE TRIGGER `translation_verses_chapters_update_new` AFTER UPDATE ON `translation_verses`
+FOR EACH ROW
+INSERT IGNORE INTO `translation_chapters` (`translation`, `book_number`, `chapter_number`)
+VALUES (NEW.`translation`, NEW.`book_number`, NEW.`chapter_number`);
+
+CREATE TRIGGER `translation_verses_chapters_update_old` AFTER UPDATE ON `translation_verses`
+FOR EACH ROW FOLLOWS `translation_verses_chapters_update_new`
+DELETE FROM `translation_chapters`
+WHERE `translation` = OLD.`translation` AND `book_number` = OLD.`book_number` AND `chapter_number` = OLD.`chapter_number`
+  AND NOT EXISTS (
+    SELECT 1 FROM `translation_verses`
+    WHERE `translation` = OLD.`translation` AND `book_number` = OLD.`book_number` AND `chapter_number` = OLD.`chapter_number`
+  );
+
+CREATE TRIGGER `translation_verses_chapters_delete` AFTER DELETE ON `translation_verses`
+FOR EACH ROW
+DELETE FROM `translation_chapters`
+WHERE `translation` = OLD.`translation` AND `book_number` = OLD.`book_number` AND `chapter_number` = OLD.`chapter_number`
+  AND NOT EXISTS (
+    SELECT 1 FROM `translation_verses`
+    WHERE `translation` = OLD.`translation` AND `book_number` = OLD.`book_number` AND `chapter_number` = OLD.`chapter_number`
+  );
@@ -0,0 +1,23 @@
+-- Migration: create_voice_manual_fixes_deleted_table
+-- Created: 2026-10-17 14:00:00
+
+-- /voices/{code}/changes finds changed verses by updated_at, but a deleted manual fix
+-- leaves no row behind. Deletions are recorded here (one row per verse, the time of
+-- the last deletion) by a trigger, so clients learn that the verse timing is back
+-- to the alignment.
+
+CREATE TABLE `voice_manual_fixes_deleted` (
+  `voice` int NOT NULL,
+  `book_number` smallint NOT NULL,
+  `chapter_number` smallint NOT NULL,
+  `verse_number` smallint NOT NULL,
+  `deleted_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'Last deletion timestamp',
+  PRIMARY KEY (`voice`, `book_number`, `chapter_number`, `verse_number`),
+  KEY `idx_voice_manual_fixes_deleted_voice_deleted` (`voice`, `deleted_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TRIGGER `voice_manual_fixes_record_delete` AFTER DELETE ON `voice_manual_fixes`
+FOR EACH ROW
+INSERT INTO `voice_manual_fixes_deleted` (`voice`, `book_number`, `chapter_number`, `verse_number`)
+VALUES (OLD.`voice`, OLD.`book_number`, OLD.`chapter_number`, OLD.`verse_number`)
+ON DUPLICATE KEY UPDATE `deleted_at` = CURRENT_TIMESTAMP;
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Build offline packs (SQLite) of translations and voices.
+
+Without arguments builds a text-only pack of every active translation and a
+pack of every active voice. Packs are written to PACKS_PATH (see app/packs.py)
+and served by GET /api/packs/{translation}?voice=...
+
+Designed to be executed inside the `bible-api` container where DB_*/API config is
+already available via `.env`:
+
+  python scripts/build_packs.py
+  python scripts/build_packs.py --translation 1 --voice 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from catalog import get_catalog
+from packs import build_pack
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Build offline translation/voice packs.")
+    ap.add_argument("--translation", type=int, default=None, help="only this translation")
+    ap.add_argument("--voice", type=int, default=None, help="only this voice (requires --translation)")
+    ap.add_argument("--no-text", action="store_true", help="skip text-only packs")
+    args = ap.parse_args()
+
+    catalog = get_catalog()
+    if args.voice is not None:
+        if args.translation is None:
+            ap.error("--voice requires --translation")
+        targets = [(args.translation, args.voice)]
+    else:
+        translations = [
+            code for code, translation in sorted(catalog.translations.items())
+            if translation['active'] and args.translation in (None, code)
+        ]
+        targets = []
+        for translation in translations:
+            if not args.no_text:
+                targets.append((translation, None))
+            targets += [(translation, code) for code, voice in sorted(catalog.voices.items())
+                        if voice['translation'] == translation and voice['active']]
+
+    failed = 0
+    for translation, voice in targets:
+        try:
+            manifest = build_pack(translation, voice)
+        except Exception as e:
+            failed += 1
+            print(f"translation {translation} voice {voice}: {e}", file=sys.stderr)
+            continue
+        print(f"translation {translation} voice {voice}: {manifest['file']} "
+              f"{manifest['size'] / 1024 / 1024:.1f} MiB, {manifest['chapters']} chapters")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Render static JSON snapshots of the read-only endpoints.
+
+Renders /chapter_with_alignment of every chapter (without a voice and with each
+active voice) and the catalog endpoints into SNAPSHOTS_PATH, the tree nginx
+serves with try_files (see app/snapshots.py and deploy/nginx/snapshots.locations).
+After that the app keeps the tree up to date on admin writes.
+
+Designed to be executed inside the `bible-api` container where DB_*/API config is
+already available via `.env`:
+
+  python scripts/build_snapshots.py
+  python scripts/build_snapshots.py --translation 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from config import SNAPSHOTS_PATH
+from main import app
+from snapshots import generate_snapshots
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Render static JSON snapshots of read-only endpoints.")
+    ap.add_argument("--translation", type=int, action="append", default=None,
+                    help="only chapters of this translation (repeatable); catalog files are always rendered")
+    ap.add_argument("--output", default=SNAPSHOTS_PATH, help="snapshots root (default: SNAPSHOTS_PATH)")
+    args = ap.parse_args()
+
+    if not args.output:
+        ap.error("set SNAPSHOTS_PATH or pass --output")
+    root = Path(args.output)
+    root.mkdir(parents=True, exist_ok=True)
+
+    started = time.monotonic()
+    written, removed = generate_snapshots(app, root, args.translation)
+    print(f"{written} files written, {removed} removed in {time.monotonic() - started:.0f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
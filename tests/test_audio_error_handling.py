@@ -2,12 +2,38 @@
 Тесты для обработки ошибок в аудио модуле
 """
 
+import time
+
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from pathlib import Path
 from fastapi import HTTPException
 
-from audio import create_range_response, get_voice_link_template, format_audio_url
+from audio import MissingFileCache, create_range_response, get_voice_link_template, format_audio_url, missing_files
+from catalog import Catalog
+
+
+@pytest.fixture
+def test_catalog():
+    return Catalog(
+        version=1,
+        books=[{'number': 1, 'code1': 'gen', 'code2': 'gn', 'code3': None}],
+        translations=[{'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1}],
+        voices=[
+            {'code': 1, 'alias': 'bondarenko', 'name': 'Бондаренко', 'translation': 1, 'active': 1,
+             'link_template': 'https://example.com/{book_zerofill}/{chapter_zerofill}.mp3'},
+            {'code': 2, 'alias': 'inactive', 'name': 'Off', 'translation': 1, 'active': 0,
+             'link_template': 'https://example.com/off.mp3'},
+        ],
+        translation_books=[], chapters=[], languages=[],
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_missing_files():
+    missing_files.clear()
+    yield
+    missing_files.clear()
 
 
 class TestAudioErrorHandling:
@@ -53,80 +79,74 @@ class TestAudioErrorHandling:
             "https://example.com/{book_zerofill}/{chapter_zerofill}.mp3", "1", "1"
         )
 
-    @patch('audio.create_connection')
-    def test_get_voice_link_template_success(self, mock_create_connection):
-        """Тест успешного получения link_template"""
-        mock_connection = MagicMock()
-        mock_cursor = MagicMock()
-        mock_create_connection.return_value = mock_connection
-        mock_connection.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = {
-            'link_template': 'https://example.com/{book_zerofill}/{chapter_zerofill}.mp3'
-        }
-        
-        result = get_voice_link_template("syn", "bondarenko")
+    def test_get_voice_link_template_success(self, test_catalog):
+        """Тест успешного получения link_template (из каталога, без запроса к БД)"""
+        with patch('audio.get_catalog', return_value=test_catalog):
+            result = get_voice_link_template("SYN", "bondarenko")
         
         assert result == 'https://example.com/{book_zerofill}/{chapter_zerofill}.mp3'
-        mock_cursor.execute.assert_called_once()
-        mock_cursor.close.assert_called_once()
-        mock_connection.close.assert_called_once()
-
-    @patch('audio.create_connection')
-    def test_get_voice_link_template_not_found(self, mock_create_connection):
-        """Тест случая, когда голос не найден"""
-        mock_connection = MagicMock()
-        mock_cursor = MagicMock()
-        mock_create_connection.return_value = mock_connection
-        mock_connection.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = None
-        
-        result = get_voice_link_template("unknown", "unknown")
-        
-        assert result == ''
 
-    @patch('audio.create_connection')
-    def test_get_voice_link_template_database_error(self, mock_create_connection):
-        """Тест обработки ошибки базы данных"""
-        mock_create_connection.side_effect = Exception("Database error")
-        
-        result = get_voice_link_template("syn", "bondarenko")
+    def test_get_voice_link_template_not_found(self, test_catalog):
+        """Тест случая, когда голос не найден или не активен"""
+        with patch('audio.get_catalog', return_value=test_catalog):
+            assert get_voice_link_template("unknown", "unknown") == ''
+            assert get_voice_link_template("syn", "inactive") == ''
+
+    def test_get_voice_link_template_database_error(self):
+        """Тест обработки ошибки загрузки каталога"""
+        with patch('audio.get_catalog', side_effect=Exception("Database error")):
+            result = get_voice_link_template("syn", "bondarenko")
         
         assert result == ''
 
-    @patch('audio.create_connection')
-    def test_format_audio_url_success(self, mock_create_connection):
+    def test_format_audio_url_success(self, test_catalog):
         """Тест успешного форматирования URL"""
-        mock_connection = MagicMock()
-        mock_cursor = MagicMock()
-        mock_create_connection.return_value = mock_connection
-        mock_connection.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = {
-            'number': 1,
-            'code1': 'gen',
-            'code2': 'gn',
-            'code3': 'gen'
-        }
+        template = "https://example.com/{book_zerofill}/{chapter_zerofill}/{book_alias_upper}.mp3"
+        with patch('audio.get_catalog', return_value=test_catalog):
+            result = format_audio_url(template, "1", "1")
         
-        template = "https://example.com/{book_zerofill}/{chapter_zerofill}.mp3"
-        result = format_audio_url(template, "1", "1")
-        
-        assert result == "https://example.com/01/01.mp3"
+        assert result == "https://example.com/01/01/GEN.mp3"
 
     def test_format_audio_url_empty_template(self):
         """Тест с пустым шаблоном"""
         result = format_audio_url("", "1", "1")
         assert result == ''
 
-    @patch('audio.create_connection')
-    def test_format_audio_url_book_not_found(self, mock_create_connection):
+    def test_format_audio_url_book_not_found(self, test_catalog):
         """Тест случая, когда книга не найдена"""
-        mock_connection = MagicMock()
-        mock_cursor = MagicMock()
-        mock_create_connection.return_value = mock_connection
-        mock_connection.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = None
-        
         template = "https://example.com/{book_zerofill}/{chapter_zerofill}.mp3"
-        result = format_audio_url(template, "999", "1")
+        with patch('audio.get_catalog', return_value=test_catalog):
+            result = format_audio_url(template, "999", "1")
         
         assert result == ''
+
+    def test_missing_file_is_cached(self, test_catalog):
+        """Повторные запросы отсутствующего файла не обращаются ни к диску, ни к каталогу"""
+        non_existent_path = Path("/non/existent/cached.mp3")
+
+        with patch('audio.get_catalog', return_value=test_catalog) as mock_get_catalog:
+            for _ in range(3):
+                with pytest.raises(HTTPException) as exc_info:
+                    create_range_response(non_existent_path, None, translation="syn", voice="bondarenko", book="1", chapter="1")
+                assert exc_info.value.detail['alternative_url'] == "https://example.com/01/01.mp3"
+
+            with patch.object(Path, 'stat') as mock_stat:
+                with pytest.raises(HTTPException):
+                    create_range_response(non_existent_path, None, translation="syn", voice="bondarenko", book="1", chapter="1")
+            mock_stat.assert_not_called()
+
+        # Шаблон и книга - по одному разу на первый 404
+        assert mock_get_catalog.call_count == 2
+
+    def test_missing_file_cache_expires(self):
+        """Запись кеша 404 устаревает через ttl и сбрасывается clear()"""
+        cache = MissingFileCache(ttl=60)
+        cache.put(('a',), {'detail': 'missing'})
+        assert cache.get(('a',)) == {'detail': 'missing'}
+
+        with patch('audio.time.monotonic', return_value=time.monotonic() + 61):
+            assert cache.get(('a',)) is None
+
+        cache.put(('a',), {'detail': 'missing'})
+        assert cache.clear() == 1
+        assert cache.get(('a',)) is None
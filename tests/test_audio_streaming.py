@@ -0,0 +1,233 @@
+"""
+Тесты потоковой отдачи mp3 и условных запросов (app/audio.py)
+"""
+import os
+from email.utils import formatdate
+from unittest.mock import patch
+
+import pytest
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+
+from audio import CHUNK_SIZE, FileRangeResponse, audio_etag, create_range_response, parse_ranges
+from main import app
+
+client = TestClient(app)
+
+URL = "/api/audio/syn/bondarenko/01/1.mp3"
+MTIME = 1700000000
+
+
+@pytest.fixture
+def mp3(tmp_path):
+    content = bytes(range(256)) * (CHUNK_SIZE // 64)  # 4 чанка
+    path = tmp_path / "syn" / "bondarenko" / "mp3" / "01" / "1.mp3"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(content)
+    os.utime(path, (MTIME, MTIME))
+    with patch('audio.MP3_FILES_PATH', str(tmp_path)):
+        yield path, content
+
+
+def test_full_file_is_not_read_into_memory(mp3):
+    path, content = mp3
+
+    assert isinstance(create_range_response(path, None), FileResponse)
+
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers['content-length'] == str(len(content))
+    assert response.headers['content-type'] == 'audio/mpeg'
+
+
+def test_large_range_is_streamed(mp3):
+    path, content = mp3
+    start, end = 100, 3 * CHUNK_SIZE
+
+    assert isinstance(create_range_response(path, f"bytes={start}-{end}"), FileRangeResponse)
+
+    response = client.get(URL, headers={"Range": f"bytes={start}-{end}"})
+    assert response.status_code == 206
+    assert response.content == content[start:end + 1]
+    assert response.headers['content-range'] == f"bytes {start}-{end}/{len(content)}"
+
+
+def test_open_range_uses_file_response(mp3):
+    path, content = mp3
+
+    # Одиночный диапазон идет тем же путем, что и весь файл
+    assert isinstance(create_range_response(path, "bytes=0-"), FileResponse)
+
+    response = client.get(URL, headers={"Range": "bytes=0-"})
+    assert response.status_code == 206
+    assert response.content == content
+    assert response.headers['content-length'] == str(len(content))
+
+
+def test_small_range(mp3):
+    path, content = mp3
+
+    response = client.get(URL, headers={"Range": "bytes=0-1"})
+
+    assert response.status_code == 206
+    assert response.content == content[:2]
+
+
+def test_range_at_end_of_file(mp3):
+    path, content = mp3
+
+    response = client.get(URL, headers={"Range": f"bytes=-{CHUNK_SIZE + 7}"})
+
+    assert response.status_code == 206
+    assert response.content == content[-(CHUNK_SIZE + 7):]
+
+
+def test_head_only_stats_file(mp3, api_headers):
+    path, content = mp3
+
+    with patch('audio.open') as mock_open, patch('audio.anyio.open_file') as mock_open_file:
+        full = client.head(URL, headers=dict(api_headers))
+        partial = client.head(URL, headers={**api_headers, "Range": "bytes=0-1023"})
+
+    mock_open.assert_not_called()
+    mock_open_file.assert_not_called()
+    assert full.status_code == 200
+    assert full.headers['content-length'] == str(len(content))
+    assert full.content == b''
+    assert partial.status_code == 206
+    assert partial.headers['content-length'] == '1024'
+    assert partial.headers['content-range'] == f"bytes 0-1023/{len(content)}"
+
+
+def test_etag_is_deterministic(mp3):
+    path, content = mp3
+
+    # Формат nginx: mtime и размер в hex, не зависит от процесса
+    assert audio_etag(path.stat()) == f'"{MTIME:x}-{len(content):x}"'
+    response = client.get(URL, headers={"Range": "bytes=0-1"})
+    assert response.headers['etag'] == f'"{MTIME:x}-{len(content):x}"'
+    assert response.headers['last-modified'] == 'Tue, 14 Nov 2023 22:13:20 GMT'
+
+
+def test_if_none_match_gives_304(mp3):
+    path, content = mp3
+    etag = audio_etag(path.stat())
+
+    response = client.get(URL, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response.headers['etag'] == etag
+
+    # If-None-Match важнее If-Modified-Since
+    response = client.get(URL, headers={"If-None-Match": '"other"', "If-Modified-Since": formatdate(MTIME, usegmt=True)})
+    assert response.status_code == 200
+
+
+def test_if_modified_since(mp3):
+    assert client.get(URL, headers={"If-Modified-Since": formatdate(MTIME, usegmt=True)}).status_code == 304
+    assert client.get(URL, headers={"If-Modified-Since": formatdate(MTIME - 1, usegmt=True)}).status_code == 200
+    assert client.get(URL, headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+
+def test_if_range(mp3):
+    path, content = mp3
+    etag = audio_etag(path.stat())
+
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.content == content[:10]
+
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": formatdate(MTIME, usegmt=True)})
+    assert response.status_code == 206
+
+    # Файл изменился: вместо части отдается весь файл
+    for if_range in ('"5f5e1000-10"', f'W/{etag}', formatdate(MTIME - 60, usegmt=True)):
+        response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": if_range})
+        assert response.status_code == 200
+        assert response.content == content
+
+
+def test_parse_ranges():
+    assert parse_ranges("bytes=0-999,5000-5999", 10000) == [(0, 999), (5000, 5999)]
+    # Суффикс, открытый конец, выход за конец файла
+    assert parse_ranges("bytes=-500", 10000) == [(9500, 9999)]
+    assert parse_ranges("bytes=9000-", 10000) == [(9000, 9999)]
+    assert parse_ranges("bytes=9000-20000, 20000-30000", 10000) == [(9000, 9999)]
+    # Пересекающиеся и близкие диапазоны склеиваются, порядок по возрастанию
+    assert parse_ranges("bytes=500-999,0-600,1010-1100,3000-3999", 10000) == [(0, 1100), (3000, 3999)]
+    assert parse_ranges("bytes=" + ",".join(["0-99"] * 10), 10000) == [(0, 99)]
+    # Некорректные и невыполнимые
+    for header in ("bytes=20000-", "items=0-1", "bytes=5-3", "bytes=a-b", "bytes=-", "bytes=1-2-3"):
+        assert parse_ranges(header, 10000) is None, header
+
+
+def parse_multipart(response) -> list:
+    boundary = response.headers['content-type'].split('boundary=')[1]
+    body = response.content
+    assert body.endswith(f"\r\n--{boundary}--\r\n".encode())
+    parts = []
+    for part in body.split(f"\r\n--{boundary}".encode())[1:-1]:
+        headers, data = part.split(b"\r\n\r\n", 1)
+        parts.append((headers.decode().strip().splitlines(), data))
+    return parts
+
+
+def test_multiple_ranges_are_sent_as_multipart(mp3):
+    path, content = mp3
+    size = len(content)
+
+    response = client.get(URL, headers={"Range": f"bytes=0-9,{size - 5}-,100-199"})
+
+    assert response.status_code == 206
+    assert response.headers['content-type'].startswith('multipart/byteranges; boundary=')
+    assert response.headers['content-length'] == str(len(response.content))
+    assert 'content-range' not in response.headers
+    parts = parse_multipart(response)
+    assert [data for _, data in parts] == [content[0:10], content[100:200], content[size - 5:]]
+    assert parts[2][0] == ['Content-Type: audio/mpeg', f'Content-Range: bytes {size - 5}-{size - 1}/{size}']
+
+
+def test_multipart_head_has_length_only(mp3, api_headers):
+    path, content = mp3
+
+    with patch('audio.open') as mock_open:
+        response = client.head(URL, headers={**api_headers, "Range": "bytes=0-9,1000-1999"})
+
+    mock_open.assert_not_called()
+    assert response.status_code == 206
+    get = client.get(URL, headers={"Range": "bytes=0-9,1000-1999"})
+    assert response.headers['content-length'] == get.headers['content-length']
+
+
+def test_too_many_ranges_give_whole_file(mp3):
+    path, content = mp3
+    ranges = ",".join(f"{n * 1000}-{n * 1000 + 9}" for n in range(17))
+
+    with patch('audio.AUDIO_MAX_RANGES', 16):
+        response = client.get(URL, headers={"Range": f"bytes={ranges}"})
+
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_accel_redirect_leaves_file_to_nginx(mp3):
+    with patch('audio.AUDIO_ACCEL_REDIRECT', '/internal/audio/'), patch('audio.open') as mock_open:
+        response = client.get(URL, headers={"Range": "bytes=0-9"})
+
+    mock_open.assert_not_called()
+    assert response.status_code == 200
+    assert response.headers['x-accel-redirect'] == '/internal/audio/syn/bondarenko/mp3/01/1.mp3'
+    assert response.headers['content-type'] == 'audio/mpeg'
+    assert response.content == b''
+
+
+@patch('audio.get_voice_link_template', return_value="https://example.com/{book_zerofill}.mp3")
+@patch('audio.format_audio_url', return_value="https://example.com/01.mp3")
+def test_accel_redirect_missing_file(mock_format_url, mock_get_template, mp3):
+    with patch('audio.AUDIO_ACCEL_REDIRECT', '/internal/audio'):
+        response = client.get("/api/audio/syn/bondarenko/01/2.mp3")
+
+    assert response.status_code == 404
+    assert 'x-accel-redirect' not in response.headers
+    assert response.json()['detail']['alternative_url'] == "https://example.com/01.mp3"
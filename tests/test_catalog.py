@@ -0,0 +1,187 @@
+"""
+Тесты для каталога справочников в памяти (app/catalog.py)
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+import catalog
+from catalog import Catalog, load_catalog
+from excerpt import get_books_info, get_book_alias, get_book_number, get_translation_name, get_voice_info
+
+
+BOOKS = [
+    {'number': 1, 'code1': 'gen', 'code2': 'ge', 'code3': 'gn', 'code4': None, 'code5': None, 'code6': None,
+     'code7': None, 'code8': None, 'code9': None, 'short_name_en': 'Gen', 'short_name_ru': 'Быт'},
+    {'number': 2, 'code1': 'exo', 'code2': 'ex', 'code3': None, 'code4': None, 'code5': None, 'code6': None,
+     'code7': None, 'code8': None, 'code9': None, 'short_name_en': 'Exo', 'short_name_ru': 'Исх'},
+]
+TRANSLATIONS = [
+    {'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1},
+    {'code': 2, 'alias': 'old', 'name': 'OLD', 'description': '', 'language': 'ru', 'active': 0},
+]
+VOICES = [
+    {'code': 1, 'alias': 'bondarenko', 'name': 'Бондаренко', 'description': '', 'translation': 1, 'is_music': 0,
+     'link_template': 'https://example.com/{book_zerofill}/{chapter_zerofill}.mp3', 'active': 1},
+    {'code': 3, 'alias': 'hidden', 'name': 'Hidden', 'description': '', 'translation': 1, 'is_music': 0,
+     'link_template': '', 'active': 0},
+]
+TRANSLATION_BOOKS = [
+    {'code': 5, 'translation': 1, 'book_number': 2, 'name': 'Исход'},
+    {'code': 1, 'translation': 1, 'book_number': 1, 'name': 'Бытие'},
+    {'code': 7, 'translation': 3, 'book_number': 1, 'name': 'Genesis'},
+]
+# Перевод 1 содержит все главы, перевод 3 - только первые две главы Бытия
+CHAPTERS = (
+    [{'translation': 1, 'book_number': 1, 'chapter_number': n} for n in range(1, 51)] +
+    [{'translation': 1, 'book_number': 2, 'chapter_number': n} for n in range(1, 41)] +
+    [{'translation': 3, 'book_number': 1, 'chapter_number': n} for n in (1, 2)]
+)
+
+
+@pytest.fixture
+def test_catalog():
+    test_catalog = Catalog(1, BOOKS, TRANSLATIONS, VOICES, TRANSLATION_BOOKS, CHAPTERS, [], {1: 50, 2: 40})
+    with patch('excerpt.get_catalog', return_value=test_catalog):
+        yield test_catalog
+
+
+class TestCatalogLookups:
+
+    def test_books_info_by_alias(self, test_catalog):
+        for alias in ('exo', 'ex', 'Exo', 'исх'):
+            books = get_books_info(None, 1, alias)
+            assert [book['number'] for book in books] == [2], alias
+        assert books[0] == {
+            'code': 5, 'number': 2, 'name': 'Исход', 'alias': 'exo', 'code2': 'ex', 'code3': None, 'code4': None,
+            'code5': None, 'code6': None, 'code7': None, 'code8': None, 'code9': None, 'chapters_count': 40
+        }
+
+    def test_books_info_for_translation_is_ordered_by_number(self, test_catalog):
+        assert [book['number'] for book in get_books_info(None, 1)] == [1, 2]
+        assert get_books_info(None, 1, 'xxx') == []
+        assert get_books_info(None, 2) == []
+
+    def test_chapters_count_is_per_translation(self, test_catalog):
+        assert get_books_info(None, 1, 'gen')[0]['chapters_count'] == 50
+        assert get_books_info(None, 3, 'gen')[0]['chapters_count'] == 2
+        assert test_catalog.get_chapters(3, 1) == {1, 2}
+        assert test_catalog.get_chapters(3, 2) == frozenset()
+
+    def test_books_info_returns_copies(self, test_catalog):
+        get_books_info(None, 1, 'gen')[0]['name'] = 'changed'
+        assert get_books_info(None, 1, 'gen')[0]['name'] == 'Бытие'
+
+    def test_book_number_and_alias(self, test_catalog):
+        assert get_book_number(None, 'exo') == '2'
+        assert get_book_alias(None, 1) == 'gen'
+        with pytest.raises(HTTPException):
+            get_book_number(None, 'xxx')
+        with pytest.raises(HTTPException):
+            get_book_alias(None, 67)
+
+    def test_inactive_translation_and_voice_are_not_found(self, test_catalog):
+        assert get_translation_name(None, 1) == 'SYNO'
+        with pytest.raises(HTTPException) as e:
+            get_translation_name(None, 2)
+        assert e.value.detail == "Translation 2 not found."
+
+        assert get_voice_info(None, 1, 1)['voice_alias'] == 'bondarenko'
+        for voice, translation in ((3, 1), (1, 2), (99, 1)):
+            with pytest.raises(HTTPException):
+                get_voice_info(None, voice, translation)
+
+
+class TestCatalogRefresh:
+
+    @pytest.fixture(autouse=True)
+    def reset(self, monkeypatch):
+        monkeypatch.setattr(catalog, '_catalog', None)
+
+    def make_cursor(self):
+        cursor = MagicMock()
+        cursor.fetchall.side_effect = lambda: []
+        return cursor
+
+    def test_load_reads_all_reference_tables(self):
+        cursor = self.make_cursor()
+
+        load_catalog(cursor, 1)
+
+        sql = ' '.join(c.args[0] for c in cursor.execute.call_args_list)
+        for table in ('bible_books', 'translations', 'voices', 'translation_books', 'translation_chapters', 'languages', 'bible_stat'):
+            assert f'FROM {table}' in sql
+        # Самая большая таблица при загрузке каталога не читается
+        assert 'translation_verses' not in sql
+
+    def test_catalog_is_loaded_once_and_versioned(self):
+        cursor = self.make_cursor()
+        connection = MagicMock()
+        connection.cursor.return_value = cursor
+
+        with patch('catalog.create_connection', return_value=connection) as mock_create_connection:
+            first = catalog.get_catalog()
+            assert catalog.get_catalog() is first
+            assert mock_create_connection.call_count == 1
+            connection.close.assert_called_once()
+
+            second = catalog.refresh_catalog(self.make_cursor())
+            assert second.version == first.version + 1
+            assert catalog.get_catalog() is second
+            assert mock_create_connection.call_count == 1
+
+    def test_fingerprint_depends_on_rows_not_on_their_order(self):
+        def load(translations):
+            cursor = MagicMock()
+            results = iter([BOOKS, translations, VOICES, TRANSLATION_BOOKS, CHAPTERS, [], []])
+            cursor.fetchall.side_effect = lambda: next(results)
+            return load_catalog(cursor, 1)
+
+        # Каталоги разных процессов с одинаковыми данными дают одинаковый ETag
+        assert load(TRANSLATIONS).fingerprint == load(TRANSLATIONS[::-1]).fingerprint
+        changed = [{**TRANSLATIONS[0], 'name': 'SYNO2'}, TRANSLATIONS[1]]
+        assert load(changed).fingerprint != load(TRANSLATIONS).fingerprint
+
+    def test_expired_catalog_is_reloaded_on_next_use(self):
+        first = catalog.refresh_catalog(self.make_cursor())
+        catalog.invalidate_catalog()
+        connection = MagicMock()
+        connection.cursor.return_value = self.make_cursor()
+
+        with patch('catalog.create_connection', return_value=connection):
+            second = catalog.get_catalog()
+
+        assert second is not first
+        assert second.version == 2
+
+    def test_previous_snapshot_is_served_when_reload_fails(self):
+        first = catalog.refresh_catalog(self.make_cursor())
+        catalog.invalidate_catalog()
+
+        with patch('catalog.create_connection', return_value=None):
+            assert catalog.get_catalog() is first
+        assert not first.is_stale()
+
+
+@patch('main.check_audio_file_exists', return_value=True)
+@patch('main.create_connection')
+def test_translation_books_use_per_translation_chapters(mock_create_connection, mock_audio_exists, test_catalog):
+    """chapters_count и chapters_without_text считаются по главам именно этого перевода"""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    cursor = MagicMock()
+    cursor.fetchone.return_value = {'code': 3, 'alias': 'kjv'}
+    cursor.fetchall.return_value = [{'code': 7, 'book_number': 1, 'name': 'Genesis', 'alias': 'gen'}]
+    mock_create_connection.return_value.cursor.return_value = cursor
+
+    with patch('main.get_catalog', return_value=test_catalog):
+        response = TestClient(app).get("/api/translations/3/books")
+
+    assert response.status_code == 200
+    book = response.json()[0]
+    assert book['chapters_count'] == 2
+    assert book['chapters_without_text'] == list(range(3, 51))
+    # Подзапросов по translation_verses больше нет
+    assert all('translation_verses' not in c.args[0] for c in cursor.execute.call_args_list)
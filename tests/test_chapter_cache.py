@@ -0,0 +1,114 @@
+"""
+Тесты для кеша собранных глав (app/chapter_cache.py)
+"""
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from chapter_cache import ChapterCache, chapter_cache
+
+client = TestClient(app)
+
+
+class TestChapterCache:
+
+    def test_get_after_put(self):
+        cache = ChapterCache(max_bytes=1000)
+
+        assert cache.get((1, 43, 3, 1)) is None
+        assert cache.put((1, 43, 3, 1), b'{"chapter_number":3}', cache.generation())
+        assert cache.get((1, 43, 3, 1)) == b'{"chapter_number":3}'
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["bytes"] == len(b'{"chapter_number":3}')
+
+    def test_least_recently_used_is_evicted_by_bytes(self):
+        cache = ChapterCache(max_bytes=30)
+        for chapter in (1, 2, 3):
+            cache.put((1, 1, chapter, None), b'x' * 10, cache.generation())
+        cache.get((1, 1, 1, None))  # глава 1 становится самой свежей
+
+        cache.put((1, 1, 4, None), b'x' * 10, cache.generation())
+
+        assert cache.get((1, 1, 2, None)) is None
+        assert cache.get((1, 1, 1, None)) is not None
+        assert cache.stats()["bytes"] <= 30
+        assert cache.stats()["evictions"] == 1
+
+    def test_document_larger_than_budget_is_not_stored(self):
+        cache = ChapterCache(max_bytes=5)
+
+        assert not cache.put((1, 1, 1, None), b'x' * 10, cache.generation())
+        assert cache.stats()["entries"] == 0
+
+    def test_invalidate_chapter_drops_only_that_voice_and_chapter(self):
+        cache = ChapterCache(max_bytes=1000)
+        keys = [(1, 43, 3, 1), (1, 43, 3, None), (1, 43, 4, 1), (16, 43, 3, 2)]
+        for key in keys:
+            cache.put(key, b'{}', cache.generation())
+
+        assert cache.invalidate_chapter(1, 43, 3) == 1
+
+        assert cache.get((1, 43, 3, 1)) is None
+        assert all(cache.get(key) is not None for key in keys[1:])
+
+    def test_invalidate_translation_and_voice(self):
+        cache = ChapterCache(max_bytes=1000)
+        for key in [(1, 1, 1, 1), (1, 1, 1, None), (16, 1, 1, 2), (16, 1, 1, None)]:
+            cache.put(key, b'{}', cache.generation())
+
+        assert cache.invalidate_voice(2) == 1
+        assert cache.invalidate_translation(1) == 2
+        assert cache.stats()["entries"] == 1
+
+    def test_document_read_before_invalidation_is_not_stored(self):
+        cache = ChapterCache(max_bytes=1000)
+        generation = cache.generation()
+
+        # правка пришла, пока глава собиралась из БД
+        cache.invalidate_chapter(1, 43, 3)
+
+        assert not cache.put((1, 43, 3, 1), b'{}', generation)
+        assert cache.get((1, 43, 3, 1)) is None
+
+
+class TestChapterCacheInvalidation:
+
+    def setup_method(self):
+        chapter_cache.clear()
+        for key in [(1, 43, 3, 1), (1, 43, 4, 1)]:
+            chapter_cache.put(key, b'{}', chapter_cache.generation())
+
+    def teardown_method(self):
+        chapter_cache.clear()
+
+    @patch('app.main.create_connection')
+    def test_manual_fix_invalidates_chapter(self, mock_create_connection):
+        mock_cursor = MagicMock()
+        mock_create_connection.return_value.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.side_effect = [
+            {'code': 1},  # голос существует
+            {'code': 100},  # стих существует
+            None,  # исправления еще нет
+            {'code': 5, 'voice': 1, 'book_number': 43, 'chapter_number': 3, 'verse_number': 16,
+             'begin': 10.0, 'end': 12.0, 'info': None, 'created_at': '2026-01-01T00:00:00'},
+        ]
+        mock_cursor.lastrowid = 5
+
+        response = client.post("/api/voices/manual-fixes", json={
+            "voice": 1, "book_number": 43, "chapter_number": 3, "verse_number": 16, "begin": 10.0, "end": 12.0
+        })
+
+        assert response.status_code == 200, response.text
+        assert chapter_cache.get((1, 43, 3, 1)) is None
+        assert chapter_cache.get((1, 43, 4, 1)) is not None
+
+    def test_cache_clear_drops_chapter_documents(self):
+        response = client.post("/api/cache/clear")
+
+        assert response.status_code == 200
+        assert response.json()["chapter_documents_cleared"] == 2
+        assert chapter_cache.stats()["entries"] == 0
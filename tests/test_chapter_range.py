@@ -0,0 +1,146 @@
+"""
+Тесты для /chapters_with_alignment: диапазон глав потоком, загрузка пачками по диапазону глав
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from catalog import Catalog
+from chapter_cache import chapter_cache
+from excerpt import RANGE_BATCH_CHAPTERS
+from models import ExcerptWithAlignmentModel
+
+client = TestClient(app)
+
+BOOK = {'code1': None, 'code2': None, 'code3': None, 'code4': None, 'code5': None, 'code6': None,
+        'code7': None, 'code8': None, 'code9': None, 'short_name_en': None, 'short_name_ru': None}
+# В Бытии 25 глав, глава 5 в переводе отсутствует
+CHAPTERS = [n for n in range(1, 26) if n != 5]
+
+
+@pytest.fixture(autouse=True)
+def empty_chapter_cache():
+    chapter_cache.clear()
+    yield
+    chapter_cache.clear()
+
+
+@pytest.fixture
+def test_catalog():
+    test_catalog = Catalog(
+        version=1,
+        books=[{**BOOK, 'number': 1, 'code1': 'gen'}, {**BOOK, 'number': 2, 'code1': 'exo'}],
+        translations=[{'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1}],
+        voices=[],
+        translation_books=[
+            {'code': 1, 'translation': 1, 'book_number': 1, 'name': 'Бытие'},
+            {'code': 2, 'translation': 1, 'book_number': 2, 'name': 'Исход'},
+        ],
+        chapters=[{'translation': 1, 'book_number': 1, 'chapter_number': n} for n in CHAPTERS] +
+                 [{'translation': 1, 'book_number': 2, 'chapter_number': 1}],
+        languages=[]
+    )
+    with patch('excerpt.get_catalog', return_value=test_catalog):
+        yield test_catalog
+
+
+def verse_row(chapter_number: int, verse_number: int) -> dict:
+    return {
+        'kind': 1, 'code': chapter_number * 100 + verse_number, 'number': verse_number,
+        'verse_number_join': 0, 'text': f'1:{chapter_number}:{verse_number}', 'html': '',
+        'start_paragraph': 0, 'begin': None, 'end': None, 'verse_code': None, 'title_code': None,
+        'metadata': None, 'reference': None, 'subtitle': None, 'position_text': None, 'position_html': None,
+        'book_number': 1, 'chapter_number': chapter_number, 'verse_number': verse_number,
+    }
+
+
+@pytest.fixture
+def mock_cursor():
+    """Курсор отвечает строками глав из диапазона запроса"""
+    cursor = MagicMock()
+
+    def execute(sql, params):
+        if 'first_chapter' in params:
+            chapters = range(params['first_chapter'], params['last_chapter'] + 1)
+        else:
+            # одна глава запрашивается обычным условием по части
+            chapters = [params['chapter_number_0']]
+        cursor.fetchall.return_value = [
+            verse_row(chapter, verse) for chapter in chapters if chapter in CHAPTERS for verse in (1, 2)
+        ]
+
+    cursor.execute.side_effect = execute
+    with patch('excerpt.create_connection') as mock_create_connection:
+        mock_create_connection.return_value.cursor.return_value = cursor
+        yield cursor
+
+
+def test_whole_book_is_loaded_in_batches_by_chapter_range(test_catalog, mock_cursor):
+    response = client.get("/api/chapters_with_alignment", params={"translation": 1, "book_number": 1})
+
+    assert response.status_code == 200
+    data = ExcerptWithAlignmentModel.model_validate_json(response.content)
+    assert data.title == 'Бытие 1-25'
+    assert data.is_single_chapter is False
+    assert [part.chapter_number for part in data.parts] == CHAPTERS
+    assert all([verse.number for verse in part.verses] == [1, 2] for part in data.parts)
+    assert (data.parts[0].prev_excerpt, data.parts[-1].next_excerpt) == ('', 'exo 1')
+
+    # Один запрос на пачку глав, главы выбираются диапазоном
+    assert mock_cursor.execute.call_count == -(-len(CHAPTERS) // RANGE_BATCH_CHAPTERS)
+    for call in mock_cursor.execute.call_args_list:
+        sql, params = call.args
+        assert 'v.chapter_number BETWEEN %(first_chapter)s AND %(last_chapter)s' in sql
+        assert params['last_chapter'] - params['first_chapter'] < RANGE_BATCH_CHAPTERS + 1
+
+
+def test_cached_chapters_are_not_loaded_again(test_catalog, mock_cursor):
+    client.get("/api/chapters_with_alignment", params={"translation": 1, "book_number": 1, "to_chapter": 3})
+    mock_cursor.execute.reset_mock()
+
+    response = client.get("/api/chapters_with_alignment", params={"translation": 1, "book_number": 1, "to_chapter": 4})
+
+    assert [part['chapter_number'] for part in response.json()['parts']] == [1, 2, 3, 4]
+    mock_cursor.execute.assert_called_once()
+    assert mock_cursor.execute.call_args.args[1]['chapter_number_0'] == 4
+
+
+def test_only_chapters_missing_in_cache_are_loaded(test_catalog, mock_cursor):
+    client.get("/api/chapters_with_alignment",
+               params={"translation": 1, "book_number": 1, "from_chapter": 2, "to_chapter": 3})
+    mock_cursor.execute.reset_mock()
+
+    response = client.get("/api/chapters_with_alignment", params={"translation": 1, "book_number": 1, "to_chapter": 7})
+
+    assert [part['chapter_number'] for part in response.json()['parts']] == [1, 2, 3, 4, 6, 7]
+    # Главы 2-3 из кеша между пропущенными не перечитываются; глава 5 без текста диапазон не разрывает
+    requested = [call.args[1] for call in mock_cursor.execute.call_args_list]
+    assert requested[0]['chapter_number_0'] == 1
+    assert (requested[1]['first_chapter'], requested[1]['last_chapter']) == (4, 7)
+    assert len(requested) == 2
+
+
+def test_single_chapter_range(test_catalog, mock_cursor):
+    response = client.get("/api/chapters_with_alignment",
+                          params={"translation": 1, "book_number": 1, "from_chapter": 3, "to_chapter": 3})
+
+    data = response.json()
+    assert data['title'] == 'Бытие 3'
+    assert data['is_single_chapter'] is True
+    assert len(data['parts']) == 1
+
+
+@pytest.mark.parametrize('params, detail', [
+    ({"from_chapter": 4, "to_chapter": 2}, "Invalid chapter range (4-2)."),
+    ({"from_chapter": 0}, "Invalid chapter range (0-25)."),
+    ({"to_chapter": 26}, "Chapter 26 not found. Book 1 has only 25 chapters."),
+    ({"book_number": 3}, "Book 3 not found for translation 1."),
+])
+def test_invalid_range_is_rejected_before_streaming(test_catalog, mock_cursor, params, detail):
+    response = client.get("/api/chapters_with_alignment", params={"translation": 1, "book_number": 1, **params})
+
+    assert response.status_code == 422
+    assert response.json()['detail'] == detail
+    mock_cursor.execute.assert_not_called()
@@ -0,0 +1,112 @@
+"""
+Тесты для сжатия JSON-ответов (app/compression.py)
+"""
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressedCache, CompressionMiddleware, choose_encoding
+
+BODY = {'verses': [{'number': n, 'text': 'Ибо так возлюбил Бог мир, что отдал Сына Своего'} for n in range(100)]}
+
+
+def make_client(cache):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+
+    @app.get('/chapter')
+    def chapter(response: Response):
+        response.headers['ETag'] = 'W/"1"'
+        return BODY
+
+    @app.get('/small')
+    def small():
+        return {'a': 1}
+
+    @app.get('/stream')
+    def stream():
+        return StreamingResponse((json.dumps(row).encode() + b'\n' for row in BODY['verses']),
+                                 media_type='application/x-ndjson')
+
+    return TestClient(app)
+
+
+class TestChooseEncoding:
+
+    def test_brotli_is_preferred_when_available(self, monkeypatch):
+        monkeypatch.setattr(compression, 'supported_encodings', lambda: ('br', 'gzip'))
+        assert choose_encoding('gzip, deflate, br') == 'br'
+        assert choose_encoding('gzip;q=1.0, br;q=0.5') == 'gzip'
+        assert choose_encoding('br;q=0, gzip') == 'gzip'
+        assert choose_encoding('*') == 'br'
+
+    def test_gzip_only_without_brotli(self, monkeypatch):
+        monkeypatch.setattr(compression, 'supported_encodings', lambda: ('gzip',))
+        assert choose_encoding('br') is None
+        assert choose_encoding('br, gzip') == 'gzip'
+        assert choose_encoding('') is None
+        assert choose_encoding('identity') is None
+
+
+class TestCompressionMiddleware:
+
+    def test_json_is_gzipped_and_variant_is_cached(self):
+        cache = CompressedCache(max_bytes=1024 * 1024)
+        client = make_client(cache)
+
+        for _ in range(3):
+            response = client.get('/chapter', headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['content-encoding'] == 'gzip'
+            assert 'Accept-Encoding' in response.headers['vary']
+            assert response.json() == BODY
+
+        stats = cache.stats()
+        assert stats['entries'] == 1
+        assert stats['misses'] == 1
+        assert stats['hits'] == 2
+
+    def test_identity_and_small_bodies_are_not_compressed(self):
+        client = make_client(CompressedCache())
+
+        assert 'content-encoding' not in client.get('/chapter', headers={'Accept-Encoding': 'identity'}).headers
+        assert 'content-encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+    def test_streaming_json_is_compressed_chunk_by_chunk(self):
+        cache = CompressedCache()
+        client = make_client(cache)
+
+        response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['content-encoding'] == 'gzip'
+        assert 'content-length' not in response.headers
+        assert len(response.text.splitlines()) == len(BODY['verses'])
+        assert cache.stats()['entries'] == 0
+
+    def test_gzip_variant_is_reproducible(self):
+        body = json.dumps(BODY).encode()
+        assert compression.compress(body, 'gzip') == compression.compress(body, 'gzip')
+        assert gzip.decompress(compression.compress(body, 'gzip')) == body
+
+    @pytest.mark.skipif(compression.brotli is None, reason="Brotli is not installed")
+    def test_brotli(self):
+        client = make_client(CompressedCache())
+
+        response = client.get('/chapter', headers={'Accept-Encoding': 'br'})
+
+        assert response.headers['content-encoding'] == 'br'
+        assert int(response.headers['content-length']) < len(json.dumps(BODY))
+
+
+def test_cache_evicts_by_bytes():
+    cache = CompressedCache(max_bytes=20)
+    cache.put((b'1', 'gzip'), b'x' * 10)
+    cache.put((b'2', 'gzip'), b'x' * 10)
+    cache.put((b'3', 'gzip'), b'x' * 10)
+
+    assert cache.get((b'1', 'gzip')) is None
+    assert cache.stats()['bytes'] == 20
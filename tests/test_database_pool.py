@@ -0,0 +1,318 @@
+"""
+Тесты для пула соединений (app/database.py)
+"""
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+import database
+from database import ConnectionPool, PoolTimeoutError, PreparedSQL
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        raw = MagicMock()
+        created.append(raw)
+        return raw
+
+    pool = ConnectionPool(connect=connect, **kwargs)
+    return pool, created
+
+
+class TestConnectionPool:
+
+    def test_connection_is_reused_after_close(self):
+        pool, created = make_pool(size=2, max_overflow=0)
+
+        connection = pool.acquire()
+        connection.close()
+        connection = pool.acquire()
+        connection.close()
+
+        assert len(created) == 1
+        created[0].close.assert_not_called()
+        # rollback на возврате, чтобы не оставлять открытую транзакцию
+        assert created[0].rollback.call_count == 2
+
+    def test_proxy_delegates_to_raw_connection(self):
+        pool, created = make_pool()
+
+        with pool.acquire() as connection:
+            connection.cursor(dictionary=True)
+
+        created[0].cursor.assert_called_once_with(dictionary=True)
+        assert pool.stats()["in_use"] == 0
+
+    def test_double_close_releases_once(self):
+        pool, _ = make_pool(size=1, max_overflow=0)
+
+        connection = pool.acquire()
+        connection.close()
+        connection.close()
+
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["idle"] == 1
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool, created = make_pool(size=1, max_overflow=1)
+
+        first = pool.acquire()
+        second = pool.acquire()
+        assert pool.stats()["in_use"] == 2
+        assert pool.stats()["overflow"] == 1
+
+        first.close()
+        second.close()
+
+        assert pool.stats()["idle"] == 1
+        assert sum(raw.close.call_count for raw in created) == 1
+
+    def test_timeout_when_exhausted(self):
+        pool, _ = make_pool(size=1, max_overflow=0, timeout=0.05)
+
+        connection = pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+
+        assert pool.stats()["timeouts"] == 1
+        connection.close()
+
+    def test_waiter_gets_released_connection(self):
+        pool, created = make_pool(size=1, max_overflow=0, timeout=5)
+        connection = pool.acquire()
+        acquired = []
+
+        def worker():
+            with pool.acquire() as other:
+                acquired.append(other)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+        assert pool.stats()["waiting"] == 1
+
+        connection.close()
+        thread.join(timeout=5)
+
+        assert len(acquired) == 1
+        assert len(created) == 1
+        assert pool.stats()["wait_time_max"] > 0
+
+    def test_dead_connection_is_replaced_on_pre_ping(self):
+        pool, created = make_pool(pre_ping=True)
+
+        pool.acquire().close()
+        created[0].ping.side_effect = Exception("MySQL server has gone away")
+        pool.acquire().close()
+
+        assert len(created) == 2
+        created[0].close.assert_called_once()
+        assert pool.stats()["invalidated"] == 1
+
+    def test_old_connection_is_recycled(self):
+        pool, created = make_pool(recycle=1)
+
+        connection = pool.acquire()
+        connection.close()
+        pool._idle = [(raw, created_at - 10) for raw, created_at in pool._idle]
+        pool.acquire().close()
+
+        assert len(created) == 2
+        assert pool.stats()["recycled"] == 1
+
+    def test_failed_rollback_discards_connection(self):
+        pool, created = make_pool()
+
+        connection = pool.acquire()
+        created[0].rollback.side_effect = Exception("Lost connection")
+        connection.close()
+
+        assert pool.stats()["idle"] == 0
+        created[0].close.assert_called_once()
+
+    def test_discard_closes_connection_without_rollback(self):
+        pool, created = make_pool()
+
+        pool.acquire().discard()
+
+        created[0].close.assert_called_once()
+        created[0].rollback.assert_not_called()
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["idle"] == 0
+
+    def test_ping_reuses_idle_connection(self):
+        pool, created = make_pool(pre_ping=False)
+
+        assert pool.ping() == "ok"
+        assert pool.ping() == "ok"
+
+        # Пустой пул соединяется один раз, дальше пингуется то же соединение
+        assert len(created) == 1
+        assert created[0].ping.call_count == 1
+        assert pool.stats()["idle"] == 1
+
+    def test_ping_does_not_connect_when_all_connections_are_busy(self):
+        pool, created = make_pool(size=1, max_overflow=0)
+
+        connection = pool.acquire()
+        assert pool.ping() == "busy"
+        connection.close()
+
+        assert len(created) == 1
+        assert pool.stats()["in_use"] == 0
+
+    def test_ping_raises_when_server_is_gone(self):
+        pool, created = make_pool(pre_ping=False)
+
+        pool.ping()
+        created[0].ping.side_effect = Exception("MySQL server has gone away")
+        with pytest.raises(Exception, match="gone away"):
+            pool.ping()
+
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["idle"] == 0
+        created[0].close.assert_called_once()
+
+
+class TestReadReplicaRouting:
+
+    @pytest.fixture
+    def pools(self, monkeypatch):
+        primary, primary_created = make_pool()
+        replica, replica_created = make_pool()
+        monkeypatch.setattr(database, "_pool", primary)
+        monkeypatch.setattr(database, "_replica_pool", replica)
+        monkeypatch.setattr(database, "DB_REPLICA_HOST", "replica")
+        monkeypatch.setattr(database, "DB_REPLICA_STICKY_SECONDS", 5)
+        return primary, primary_created, replica, replica_created
+
+    def test_reads_go_to_replica_and_writes_to_primary(self, pools):
+        primary, primary_created, replica, replica_created = pools
+
+        database.create_connection(readonly=True).close()
+        database.create_connection().close()
+
+        assert len(replica_created) == 1
+        assert len(primary_created) == 1
+
+    def test_reads_stick_to_primary_after_commit(self, pools):
+        primary, primary_created, replica, replica_created = pools
+
+        connection = database.create_connection()
+        connection.commit()
+        connection.close()
+        database.create_connection(readonly=True).close()
+
+        assert len(replica_created) == 0
+        assert database.get_read_pool() is primary
+
+        primary.last_commit_at -= 10
+        assert database.get_read_pool() is replica
+
+    def test_reads_stick_to_primary_after_commit_of_other_worker(self, pools):
+        primary, primary_created, replica, replica_created = pools
+
+        database.note_commit(time.time() - 10)
+        assert database.get_read_pool() is replica
+
+        database.note_commit(time.time() - 1)
+        assert database.get_read_pool() is primary
+
+    def test_reads_fall_back_to_primary_when_replica_is_down(self, pools, monkeypatch):
+        primary, primary_created, replica, replica_created = pools
+
+        def broken_connect():
+            raise database.Error(msg="Can't connect to MySQL server")
+        monkeypatch.setattr(replica, "_connect", broken_connect)
+
+        connection = database.create_connection(readonly=True)
+
+        assert connection is not None
+        assert len(primary_created) == 1
+        connection.close()
+
+    def test_without_replica_reads_use_primary(self, pools, monkeypatch):
+        primary, primary_created, replica, replica_created = pools
+        monkeypatch.setattr(database, "DB_REPLICA_HOST", "")
+
+        assert database.get_read_pool() is primary
+        assert "replica" not in database.get_pool_stats()
+
+
+class TestPreparedStatements:
+
+    def test_prepared_statement_is_reused_per_connection(self):
+        pool, created = make_pool(size=1, max_overflow=0)
+        raw = None
+
+        for translation in (1, 16):
+            with pool.acquire() as connection:
+                raw = created[0]
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(PreparedSQL("SELECT name FROM translations WHERE code = %s"), (translation,))
+                cursor.close()
+
+        prepared_calls = [c for c in raw.cursor.call_args_list if c.kwargs.get("prepared")]
+        assert len(prepared_calls) == 1
+        prepared_cursor = raw.cursor.return_value
+        sql_objects = {id(c.args[0]) for c in prepared_cursor.execute.call_args_list}
+        assert len(sql_objects) == 1  # один и тот же объект строки => без повторного prepare
+        stats = pool.stats()
+        assert stats["prepared_statements"] == 1
+        assert stats["prepared_hits"] == 1
+        assert stats["prepared_misses"] == 1
+
+    def test_named_params_are_bound_positionally(self):
+        pool, created = make_pool()
+
+        with pool.acquire() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(
+                PreparedSQL("SELECT * FROM t WHERE a = %(voice)s AND b = %(book)s AND c = %(voice)s"),
+                {"book": 2, "voice": 1}
+            )
+
+        prepared_cursor = created[0].cursor.return_value
+        sql, params = prepared_cursor.execute.call_args.args
+        assert sql == "SELECT * FROM t WHERE a = %s AND b = %s AND c = %s"
+        assert params == (1, 2, 1)
+
+    def test_rows_are_buffered(self):
+        pool, created = make_pool()
+        created_cursor = MagicMock()
+        created_cursor.fetchall.return_value = [{"id": 1}, {"id": 2}, {"id": 3}]
+
+        with pool.acquire() as connection:
+            created[0].cursor.return_value = created_cursor
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(PreparedSQL("SELECT id FROM t"))
+
+            assert cursor.fetchone() == {"id": 1}
+            assert cursor.fetchall() == [{"id": 2}, {"id": 3}]
+            assert cursor.fetchone() is None
+
+    def test_plain_statements_use_regular_cursor(self):
+        pool, created = make_pool()
+
+        with pool.acquire() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+
+        created[0].cursor.assert_called_once_with(dictionary=True)
+        assert pool.stats()["prepared_statements"] == 0
+
+    def test_statements_are_closed_with_connection(self):
+        pool, created = make_pool(recycle=1)
+
+        with pool.acquire() as connection:
+            connection.cursor(dictionary=True).execute(PreparedSQL("SELECT 1"))
+        pool._idle = [(raw, created_at - 10) for raw, created_at in pool._idle]
+        pool.acquire().close()
+
+        created[0].cursor.return_value.close.assert_called()
+        assert pool.stats()["prepared_statements"] == 0
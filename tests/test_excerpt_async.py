@@ -0,0 +1,127 @@
+"""
+Тесты для /excerpt_with_alignment: запросы к БД в пуле потоков и пакетная загрузка частей отрывка
+"""
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from catalog import Catalog
+from chapter_cache import chapter_cache
+from database import run_in_db_thread
+
+client = TestClient(app)
+
+BOOK = {'code1': None, 'code2': None, 'code3': None, 'code4': None, 'code5': None, 'code6': None,
+        'code7': None, 'code8': None, 'code9': None, 'short_name_en': None, 'short_name_ru': None}
+
+
+@pytest.fixture(autouse=True)
+def empty_chapter_cache():
+    chapter_cache.clear()
+    yield
+    chapter_cache.clear()
+
+
+@pytest.fixture
+def test_catalog():
+    test_catalog = Catalog(
+        version=1,
+        books=[{**BOOK, 'number': 1, 'code1': 'gen'}, {**BOOK, 'number': 2, 'code1': 'exo'}],
+        translations=[{'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1}],
+        voices=[],
+        translation_books=[
+            {'code': 1, 'translation': 1, 'book_number': 1, 'name': 'Бытие'},
+            {'code': 2, 'translation': 1, 'book_number': 2, 'name': 'Исход'},
+        ],
+        chapters=[{'translation': 1, 'book_number': book, 'chapter_number': chapter} for book in (1, 2) for chapter in (1, 2, 3, 4)],
+        languages=[]
+    )
+    with patch('excerpt.get_catalog', return_value=test_catalog):
+        yield test_catalog
+
+
+def verse_row(book_number: int, chapter_number: int, verse_number: int) -> dict:
+    return {
+        'kind': 1, 'code': book_number * 1000 + chapter_number * 100 + verse_number, 'number': verse_number,
+        'verse_number_join': 0, 'text': f'{book_number}:{chapter_number}:{verse_number}', 'html': '',
+        'start_paragraph': 0, 'begin': None, 'end': None, 'verse_code': None, 'title_code': None,
+        'metadata': None, 'reference': None, 'subtitle': None, 'position_text': None, 'position_html': None,
+        'book_number': book_number, 'chapter_number': chapter_number, 'verse_number': verse_number,
+    }
+
+
+@pytest.fixture
+def mock_cursor():
+    cursor = MagicMock()
+    with patch('excerpt.create_connection') as mock_create_connection:
+        mock_create_connection.return_value.cursor.return_value = cursor
+        yield cursor
+
+
+def test_run_in_db_thread_does_not_block_event_loop():
+    """Блокирующая функция выполняется вне event loop"""
+    loop_thread = []
+
+    async def scenario():
+        loop_thread.append(threading.current_thread())
+        started = time.perf_counter()
+        await asyncio.gather(*(run_in_db_thread(time.sleep, 0.1) for _ in range(4)))
+        return time.perf_counter() - started, await run_in_db_thread(threading.current_thread)
+
+    elapsed, db_thread = asyncio.run(scenario())
+
+    assert elapsed < 0.35
+    assert db_thread is not loop_thread[0]
+
+
+def test_excerpt_parts_are_loaded_with_one_query(test_catalog, mock_cursor):
+    """Все части загружаются одним запросом и возвращаются в порядке отрывка"""
+    mock_cursor.fetchall.return_value = [verse_row(2, 3, 1), verse_row(1, 2, 1), verse_row(1, 1, 1), verse_row(1, 1, 2)]
+
+    response = client.get("/api/excerpt_with_alignment", params={"translation": 1, "excerpt": "gen 1 gen 2 exo 3"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [(p['book']['alias'], p['chapter_number']) for p in data['parts']] == [('gen', 1), ('gen', 2), ('exo', 3)]
+    assert [[v['number'] for v in p['verses']] for p in data['parts']] == [[1, 2], [1], [1]]
+    assert [(p['prev_excerpt'], p['next_excerpt']) for p in data['parts']] == [('', 'gen 2'), ('gen 1', 'gen 3'), ('exo 2', 'exo 4')]
+    assert data['is_single_chapter'] is False
+    assert data['title'] == "Excerpt gen 1 gen 2 exo 3"
+    mock_cursor.execute.assert_called_once()
+    sql, params = mock_cursor.execute.call_args.args
+    assert params['book_number_2'] == 2 and params['chapter_number_2'] == 3
+
+
+def test_overlapping_parts_get_their_own_verses(test_catalog, mock_cursor):
+    mock_cursor.fetchall.return_value = [verse_row(1, 1, n) for n in (1, 2, 3)]
+
+    response = client.get("/api/excerpt_with_alignment", params={"translation": 1, "excerpt": "gen 1:1-2 gen 1:2-3"})
+
+    assert response.status_code == 200
+    assert [[v['number'] for v in p['verses']] for p in response.json()['parts']] == [[1, 2], [2, 3]]
+
+
+def test_excerpt_error_of_first_failing_part_is_returned(test_catalog, mock_cursor):
+    """При нескольких ошибках возвращается ошибка первой по порядку части"""
+    mock_cursor.fetchall.return_value = [verse_row(1, 1, 1)]
+
+    response = client.get("/api/excerpt_with_alignment", params={"translation": 1, "excerpt": "gen 1 aaa 1 bbb 1"})
+    assert response.status_code == 422
+    assert response.json()['detail'] == "Book with alias 'aaa' not found for translation 1."
+
+    response = client.get("/api/excerpt_with_alignment", params={"translation": 1, "excerpt": "gen 1:5 aaa 1"})
+    assert response.status_code == 422
+    assert response.json()['detail'] == "No verses found for gen 1:5."
+
+
+def test_excerpt_invalid_format(test_catalog, mock_cursor):
+    response = client.get("/api/excerpt_with_alignment", params={"translation": 1, "excerpt": "???"})
+
+    assert response.status_code == 422
+    assert "Invalid excerpt format" in response.json()['detail']
+    mock_cursor.execute.assert_not_called()
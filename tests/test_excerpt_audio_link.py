@@ -12,6 +12,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
 
 from excerpt import check_audio_file_exists, get_voice_info, get_existing_audio_chapters
+from catalog import Catalog
 
 
 class TestExcerptAudioLink(unittest.TestCase):
@@ -47,30 +48,30 @@ class TestExcerptAudioLink(unittest.TestCase):
             self.assertFalse(result)
 
     def test_get_voice_info_with_aliases(self):
-        """Тест функции get_voice_info с алиасами"""
-        # Создаем мок курсора
+        """Тест функции get_voice_info с алиасами (данные из каталога, без запроса к БД)"""
+        catalog = Catalog(
+            version=1,
+            books=[],
+            translations=[{'code': 1, 'alias': 'test_translation', 'name': 'Test', 'description': '', 'language': 'ru', 'active': 1}],
+            voices=[{'code': 1, 'alias': 'test_voice', 'name': 'Test Voice', 'description': '', 'translation': 1,
+                     'is_music': 0, 'link_template': 'http://example.com/{book}/{chapter}.mp3', 'active': 1}],
+            translation_books=[],
+            chapters=[],
+            languages=[]
+        )
         mock_cursor = MagicMock()
-        mock_cursor.fetchone.return_value = {
-            'name': 'Test Voice',
-            'link_template': 'http://example.com/{book}/{chapter}.mp3',
-            'voice_alias': 'test_voice',
-            'translation_alias': 'test_translation'
-        }
         
-        result = get_voice_info(mock_cursor, 1, 1)
+        with patch('excerpt.get_catalog', return_value=catalog):
+            result = get_voice_info(mock_cursor, 1, 1)
         
         # Проверяем, что результат содержит все необходимые поля
-        self.assertIn('name', result)
-        self.assertIn('link_template', result)
-        self.assertIn('voice_alias', result)
-        self.assertIn('translation_alias', result)
+        self.assertEqual(result['name'], 'Test Voice')
+        self.assertEqual(result['link_template'], 'http://example.com/{book}/{chapter}.mp3')
+        self.assertEqual(result['voice_alias'], 'test_voice')
+        self.assertEqual(result['translation_alias'], 'test_translation')
         
-        # Проверяем SQL-запрос
-        mock_cursor.execute.assert_called_once()
-        sql_query = mock_cursor.execute.call_args[0][0]
-        self.assertIn('v.alias as voice_alias', sql_query)
-        self.assertIn('t.alias as translation_alias', sql_query)
-        self.assertIn('JOIN translations t ON v.translation = t.code', sql_query)
+        # Запросов к БД нет
+        mock_cursor.execute.assert_not_called()
 
     def test_audio_link_formation_logic(self):
         """Тест логики формирования audio_link"""
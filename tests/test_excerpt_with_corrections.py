@@ -8,7 +8,7 @@ from unittest.mock import patch, MagicMock
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
 from app.main import app
-from app.excerpt import get_excerpt_with_alignment, get_chapter_data
+from app.excerpt import get_excerpt_with_alignment, get_chapters_data
 
 client = TestClient(app)
 
@@ -20,11 +20,11 @@ class TestExcerptWithCorrections:
         """Test that the SQL query includes proper JOIN with voice_manual_fixes"""
         
         # This test verifies the SQL query structure by checking the source code
-        # После рефакторинга SQL находится в get_chapter_data()
+        # SQL находится в get_chapters_data() (общий запрос для глав и частей отрывка)
         import inspect
         
-        # Get the source code of the get_chapter_data function
-        source = inspect.getsource(get_chapter_data)
+        # Get the source code of the get_chapters_data function
+        source = inspect.getsource(get_chapters_data)
         
         # Verify that the query includes voice_manual_fixes JOIN
         assert 'LEFT JOIN voice_manual_fixes vmf' in source
@@ -53,8 +53,8 @@ class TestExcerptWithCorrections:
         
         import inspect
         
-        # Get the source code of the get_chapter_data function
-        source = inspect.getsource(get_chapter_data)
+        # Get the source code of the get_chapters_data function
+        source = inspect.getsource(get_chapters_data)
         
         # Verify that table aliases are used properly
         assert 'v.chapter_number' in source
@@ -69,8 +69,8 @@ class TestExcerptWithCorrections:
         
         import inspect
         
-        # Get the source code of the get_chapter_data function
-        source = inspect.getsource(get_chapter_data)
+        # Get the source code of the get_chapters_data function
+        source = inspect.getsource(get_chapters_data)
         
         # Verify COALESCE logic: voice_manual_fixes takes priority over voice_alignments
         assert 'COALESCE(vmf.begin, a.begin) as begin' in source
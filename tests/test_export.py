@@ -0,0 +1,136 @@
+"""
+Тесты для выгрузки перевода в NDJSON (app/export.py)
+"""
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from catalog import Catalog
+from export import EXPORT_FETCH_ROWS, stream_translation
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_catalog():
+    test_catalog = Catalog(
+        version=1, books=[], voices=[], translation_books=[], languages=[],
+        translations=[{'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1}],
+        chapters=[{'translation': 1, 'book_number': 1, 'chapter_number': n} for n in (1, 2)],
+    )
+    with patch('excerpt.get_catalog', return_value=test_catalog), patch('export.get_catalog', return_value=test_catalog):
+        yield test_catalog
+
+
+def row(kind: int, chapter_number: int, verse_number: int, code: int) -> dict:
+    return {
+        'kind': kind, 'code': code, 'number': verse_number if kind != 3 else 1, 'verse_number_join': 0,
+        'text': f'{kind}:{chapter_number}:{verse_number}', 'html': '', 'start_paragraph': 0,
+        'begin': 1.5 if kind == 1 else None, 'end': 2.0 if kind == 1 else None,
+        'verse_code': code - 1 if kind != 1 else None, 'title_code': None, 'metadata': None, 'reference': None,
+        'subtitle': 0 if kind == 2 else None, 'position_text': None, 'position_html': None,
+        'book_number': 1, 'chapter_number': chapter_number, 'verse_number': verse_number,
+    }
+
+
+@pytest.fixture
+def mock_cursor():
+    cursor = MagicMock()
+    with patch('export.create_connection') as mock_create_connection:
+        mock_create_connection.return_value.cursor.return_value = cursor
+        cursor.connection = mock_create_connection.return_value
+        yield cursor
+
+
+def test_export_streams_records_in_reading_order(test_catalog, mock_cursor, admin_headers):
+    mock_cursor.fetchmany.side_effect = [
+        [row(2, 1, 1, 10), row(1, 1, 1, 11), row(3, 1, 1, 12)],
+        [row(1, 2, 1, 20)],
+        [],
+    ]
+
+    response = client.get("/api/translations/1/export", headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[0] == {'type': 'translation', 'code': 1, 'name': 'SYNO', 'voice': None}
+    assert [(r['type'], r.get('chapter_number')) for r in records[1:]] == [
+        ('chapter', 1), ('title', 1), ('verse', 1), ('note', 1), ('chapter', 2), ('verse', 2)
+    ]
+    verse = records[3]
+    assert (verse['number'], verse['begin'], verse['end'], verse['start_paragraph']) == (1, 1.5, 2.0, False)
+
+    # Строки читаются небуферизованным курсором пачками, запрос - по одной книге
+    mock_cursor_args = mock_cursor.execute.call_args.args
+    assert 'ORDER BY chapter_number, verse_number' in mock_cursor_args[0]
+    assert mock_cursor_args[1] == {'translation': 1, 'voice': None, 'book_number': 1}
+    mock_cursor.fetchmany.assert_called_with(EXPORT_FETCH_ROWS)
+    assert mock_cursor.fetchmany.call_count == 3
+    mock_cursor.close.assert_called_once()
+
+
+def test_export_uses_unbuffered_cursor(test_catalog, admin_headers):
+    with patch('export.create_connection') as mock_create_connection:
+        mock_create_connection.return_value.cursor.return_value.fetchmany.return_value = []
+        client.get("/api/translations/1/export", headers=admin_headers)
+
+    mock_create_connection.return_value.cursor.assert_called_once_with(dictionary=True, buffered=False)
+    mock_create_connection.return_value.close.assert_called_once()
+
+
+def test_unknown_translation_is_rejected_before_streaming(test_catalog, mock_cursor, admin_headers):
+    response = client.get("/api/translations/99/export", headers=admin_headers)
+
+    assert response.status_code == 422
+    mock_cursor.execute.assert_not_called()
+
+
+def test_export_requires_jwt(test_catalog):
+    assert client.get("/api/translations/1/export").status_code in (401, 403)
+
+
+def test_export_runs_one_query_per_book(mock_cursor):
+    mock_cursor.fetchmany.side_effect = [[row(1, 1, 1, 10)], [], [], [row(1, 1, 1, 20)], []]
+
+    async def collect():
+        return [chunk async for chunk in stream_translation(1, None, [1, 2, 40], None, {})]
+
+    chunks = asyncio.run(collect())
+
+    connection = mock_cursor.connection
+    assert [c.args[1]['book_number'] for c in mock_cursor.execute.call_args_list] == [1, 2, 40]
+    assert len(chunks) == 3
+    connection.close.assert_called_once()
+    connection.discard.assert_not_called()
+
+
+def test_export_not_started_holds_no_connection():
+    with patch('export.create_connection') as mock_create_connection:
+        stream = stream_translation(1, None, [1], None, {})
+        # Клиент отключился до начала ответа: генератор закрывается, не начав работу
+        asyncio.run(stream.aclose())
+
+    mock_create_connection.assert_not_called()
+
+
+def test_interrupted_export_discards_connection(mock_cursor):
+    mock_cursor.fetchmany.return_value = [row(1, 1, 1, 10)]
+    connection = mock_cursor.connection
+
+    async def read_two_chunks():
+        stream = stream_translation(1, None, [1], None, {})
+        await stream.__anext__()
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(read_two_chunks())
+
+    # Непрочитанные строки не дочитываются: соединение закрывается, а не возвращается в пул
+    connection.discard.assert_called_once()
+    connection.close.assert_not_called()
+    connection.rollback.assert_not_called()
@@ -0,0 +1,139 @@
+"""
+Тесты для проверок живости и готовности (app/health.py)
+"""
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import health
+import warmup
+from database import ConnectionPool
+from health import LatencyRecorder
+from main import app
+from snapshots import render_snapshots
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def warmed_up(monkeypatch, tmp_path):
+    monkeypatch.setattr(warmup, '_state', {'status': 'ready', 'started_at': None, 'finished_at': None, 'steps': {}, 'error': None})
+    monkeypatch.setattr(health, 'MP3_FILES_PATH', str(tmp_path))
+    monkeypatch.setattr(health, '_pending_checks', {})
+
+
+@pytest.fixture
+def primary():
+    created = []
+
+    def connect():
+        raw = MagicMock()
+        created.append(raw)
+        return raw
+
+    pool = ConnectionPool(connect=connect, size=2, max_overflow=0)
+    with patch('health.get_pool', return_value=pool), patch('health.get_replica_pool', return_value=None):
+        yield pool, created
+
+
+def test_health_has_no_dependencies():
+    with patch('health.get_pool') as mock_pool:
+        response = client.get("/api/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    mock_pool.assert_not_called()
+
+
+def test_ready_reports_dependencies(primary):
+    pool, created = primary
+
+    for _ in range(3):
+        response = client.get("/api/ready")
+        assert response.status_code == 200
+
+    data = response.json()
+    assert data['status'] == 'ready'
+    assert data['database']['primary']['ok'] is True
+    assert data['pools']['primary']['capacity'] == 2
+    assert data['audio']['ok'] is True
+    assert set(data['caches']) == {'catalog_loaded', 'chapter_documents', 'audio_voices'}
+    # Проверки не открывают соединений сверх одного, который остается в пуле
+    assert len(created) == 1
+
+
+def test_not_ready_when_database_is_down(primary):
+    pool, created = primary
+    pool._connect = MagicMock(side_effect=RuntimeError("Can't connect to MySQL server"))
+
+    response = client.get("/api/ready")
+
+    assert response.status_code == 503
+    data = response.json()
+    assert data['status'] == 'not ready'
+    assert "Can't connect" in data['database']['primary']['error']
+
+
+def test_not_ready_during_warm_up(primary, monkeypatch):
+    monkeypatch.setitem(warmup._state, 'status', 'running')
+    assert client.get("/api/ready").status_code == 503
+
+
+def test_missing_audio_storage_is_reported_only(primary, monkeypatch, tmp_path):
+    monkeypatch.setattr(health, 'MP3_FILES_PATH', str(tmp_path / 'missing'))
+
+    response = client.get("/api/ready")
+
+    assert response.status_code == 200
+    assert response.json()['audio']['ok'] is False
+
+
+def test_hanging_check_is_bounded_and_not_repeated(primary, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def hang():
+        calls.append(1)
+        release.wait(5)
+        return "ok"
+
+    monkeypatch.setattr(health, 'check_audio_storage', hang)
+    monkeypatch.setattr(health, 'HEALTH_AUDIO_TIMEOUT_MS', 50)
+    try:
+        for _ in range(2):
+            response = client.get("/api/ready")
+            assert response.json()['audio'] == {'ok': False, 'error': "no answer within 50 ms"}
+    finally:
+        release.set()
+    assert len(calls) == 1
+
+
+def test_latency_percentiles():
+    recorder = LatencyRecorder(window=200, max_age=60)
+    assert recorder.percentiles()['p99_ms'] is None
+
+    for ms in range(1, 101):
+        recorder.record(ms / 1000)
+    result = recorder.percentiles()
+    assert result['requests'] == 100
+    assert (result['p50_ms'], result['p95_ms'], result['p99_ms']) == (50.0, 95.0, 99.0)
+
+    # Старые запросы не учитываются
+    recorder._samples.appendleft((time.monotonic() - 120, 10.0))
+    assert recorder.percentiles()['requests'] == 100
+
+
+def test_requests_are_recorded_except_probes():
+    health.latency.clear()
+    client.get("/api/health")
+    client.get("/api/languages-missing")
+    assert health.latency.percentiles()['requests'] == 1
+
+
+def test_snapshot_renders_are_not_recorded(tmp_path):
+    health.latency.clear()
+    asyncio.run(render_snapshots(app, tmp_path, [('missing.json', '/api/languages-missing', {})]))
+    assert health.latency.percentiles()['requests'] == 0
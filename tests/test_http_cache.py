@@ -0,0 +1,222 @@
+"""
+Тесты для ETag / If-None-Match публичных эндпоинтов (app/http_cache.py)
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+import main
+from main import app
+from catalog import Catalog
+from chapter_cache import chapter_cache
+import http_cache
+from http_cache import bump_data_version, etag_matches, get_data_version, sync_data_version
+
+client = TestClient(app)
+
+LANGUAGES = [{'alias': 'ru', 'name_en': 'Russian', 'name_national': 'Русский'}]
+
+
+def make_catalog():
+    return Catalog(1, [], [], [], [], [], LANGUAGES)
+
+
+class TestETag:
+
+    def test_etag_and_cache_control_are_sent(self):
+        with patch('main.get_catalog', return_value=make_catalog()):
+            response = client.get("/api/languages")
+
+        assert response.status_code == 200
+        assert response.headers['etag'].startswith('W/"')
+        assert response.headers['cache-control'].startswith('private')
+
+    def test_matching_etag_returns_304_without_running_endpoint(self):
+        with patch('main.get_catalog', return_value=make_catalog()):
+            etag = client.get("/api/languages").headers['etag']
+
+        with patch('main.get_catalog') as mock_get_catalog:
+            response = client.get("/api/languages", headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.content == b''
+        assert response.headers['etag'] == etag
+        mock_get_catalog.assert_not_called()
+
+    def test_etag_depends_on_url(self):
+        with patch('main.get_catalog', return_value=make_catalog()):
+            etag = client.get("/api/languages").headers['etag']
+
+        with patch('main.create_connection') as mock_create_connection:
+            mock_create_connection.return_value.cursor.return_value.fetchall.return_value = []
+            response = client.get("/api/translations", headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+
+        assert response.headers['etag'] != etag
+
+    def test_admin_write_changes_etag(self):
+        with patch('main.get_catalog', return_value=make_catalog()):
+            etag = client.get("/api/languages").headers['etag']
+            bump_data_version()
+            response = client.get("/api/languages", headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.headers['etag'] != etag
+
+    def test_cache_clear_changes_etag(self):
+        with patch('main.get_catalog', return_value=make_catalog()):
+            etag = client.get("/api/languages").headers['etag']
+            client.post("/api/cache/clear")
+            response = client.get("/api/languages", headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+
+    @patch('excerpt.create_connection')
+    def test_chapter_revalidation_does_not_touch_database(self, mock_create_connection):
+        url = "/api/chapter_with_alignment?translation=1&book_number=1&chapter_number=1"
+        test_catalog = Catalog(1, [{'number': 1, 'code1': 'gen'}], [{'code': 1, 'name': 'SYNO', 'active': 1}], [],
+                               [{'code': 1, 'translation': 1, 'book_number': 1, 'name': 'Бытие'}],
+                               [{'translation': 1, 'book_number': 1, 'chapter_number': 1}], [])
+        # первый ответ собирается из кеша глав, повторный - 304 без обращения к каталогу и БД
+        chapter_cache.put((1, 1, 1, None), b'{}', chapter_cache.generation())
+        with patch('excerpt.get_catalog', return_value=test_catalog):
+            first = client.get(url)
+        chapter_cache.clear()
+
+        with patch('excerpt.get_catalog') as mock_get_catalog:
+            response = client.get(url, headers={'If-None-Match': 'W/"old", ' + first.headers['etag']})
+
+        assert first.status_code == 200, first.text
+        assert response.status_code == 304
+        mock_get_catalog.assert_not_called()
+        mock_create_connection.assert_not_called()
+
+    def test_errors_are_not_cached(self):
+        with patch('excerpt.get_catalog', return_value=make_catalog()):
+            response = client.get("/api/chapter_with_alignment?translation=1&book_number=1&chapter_number=1")
+
+        assert response.status_code == 422
+        assert 'etag' not in response.headers
+
+
+class TestWorkers:
+    """Версия данных общая для рабочих процессов: запись в другом процессе сбрасывает локальные кеши"""
+
+    @pytest.fixture(autouse=True)
+    def version_file(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(http_cache, 'DATA_VERSION_FILE', str(tmp_path / 'data-version'))
+        monkeypatch.setattr(http_cache, '_data_version_stat', None)
+        monkeypatch.setattr(http_cache, '_invalidation_callbacks', [])
+        sync_data_version()
+
+    def write_in_other_worker(self, version: int):
+        other = http_cache.DATA_VERSION_FILE + '.other'
+        with open(other, 'w') as f:
+            f.write(str(version))
+        os.replace(other, http_cache.DATA_VERSION_FILE)
+
+    def bump_in_other_worker(self, kind: str, key, committed_at: float) -> int:
+        version = get_data_version() + 1
+        log_file = http_cache.DATA_VERSION_FILE + '.log'
+        with open(log_file) as f:
+            log = json.load(f)
+        log.append({'version': version, 'kind': kind, 'key': key, 'committed_at': committed_at})
+        with open(log_file, 'w') as f:
+            json.dump(log, f)
+        self.write_in_other_worker(version)
+        return version
+
+    def test_write_in_other_worker_is_invalidated_by_scope(self):
+        callback = MagicMock()
+        http_cache.on_data_version_change(callback)
+        committed_at = time.time()
+        self.bump_in_other_worker('chapter', [1, 43, 3], committed_at)
+
+        with patch('http_cache.note_commit') as mock_note_commit:
+            sync_data_version()
+
+        # Та же точечная инвалидация, что в процессе записи, и чтение с основного сервера после нее
+        callback.assert_called_once_with('chapter', (1, 43, 3))
+        mock_note_commit.assert_called_once_with(committed_at)
+
+    def test_own_write_applies_missed_writes_of_other_workers(self):
+        callback = MagicMock()
+        http_cache.on_data_version_change(callback)
+        self.bump_in_other_worker('voice', [2], time.time())
+
+        with patch('http_cache.note_commit'):
+            bump_data_version('translation', (1,))
+
+        callback.assert_called_once_with('voice', (2,))
+
+    def test_restart_of_other_worker_clears_local_caches(self):
+        callback = MagicMock()
+        http_cache.on_data_version_change(callback)
+        # Перезапуск переносит версию на time_ns: разрыв в версиях огромный
+        self.write_in_other_worker(get_data_version() + time.time_ns())
+
+        with patch('http_cache.note_commit'):
+            sync_data_version()
+
+        callback.assert_called_once_with('all', None)
+
+    def test_write_in_other_worker_clears_local_caches(self):
+        callback = MagicMock()
+        http_cache.on_data_version_change(callback)
+        with patch('main.get_catalog', return_value=make_catalog()):
+            etag = client.get("/api/languages").headers['etag']
+
+            self.write_in_other_worker(get_data_version() + 1)
+            response = client.get("/api/languages", headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        callback.assert_called_once()
+
+    def test_chapter_write_keeps_other_chapters(self):
+        with patch('main.chapter_cache') as mock_chapter_cache, patch('main.invalidate_catalog') as mock_invalidate_catalog:
+            main.apply_invalidation('chapter', (1, 43, 3))
+
+        mock_chapter_cache.invalidate_chapter.assert_called_once_with(1, 43, 3)
+        mock_chapter_cache.clear.assert_not_called()
+        mock_invalidate_catalog.assert_not_called()
+
+    def test_own_write_does_not_clear_local_caches(self):
+        callback = MagicMock()
+        http_cache.on_data_version_change(callback)
+
+        version = bump_data_version()
+
+        assert sync_data_version() == version
+        callback.assert_not_called()
+
+    def test_import_does_not_touch_version_file(self, tmp_path):
+        version_file = tmp_path / 'import-version'
+        env = {**os.environ, 'DATA_VERSION_FILE': str(version_file)}
+        app_dir = os.path.dirname(http_cache.__file__)
+        subprocess.run([sys.executable, '-c', 'import http_cache'], cwd=app_dir, env=env, check=True)
+
+        # Файл версии создается при старте приложения, а не при импорте модуля
+        assert not version_file.exists()
+
+    def test_bump_continues_from_shared_version(self):
+        other_version = get_data_version() + 10
+        self.write_in_other_worker(other_version)
+
+        assert bump_data_version() == other_version + 1
+        assert sync_data_version() == other_version + 1
+
+
+def test_etag_matches():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('"x", W/"abc"', 'W/"abc"')
+    assert etag_matches('*', 'W/"abc"')
+    assert not etag_matches('W/"abd"', 'W/"abc"')
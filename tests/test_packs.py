@@ -0,0 +1,271 @@
+"""
+Тесты для офлайн-пакетов перевода и голоса (app/packs.py)
+"""
+import fcntl
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from catalog import Catalog
+from packs import build_pack, create_temp_path, read_manifest, schedule_pack_update, update_pack_timings
+
+client = TestClient(app)
+
+BOOK = {'code1': 'gen', 'code2': None, 'code3': None, 'code4': None, 'code5': None, 'code6': None,
+        'code7': None, 'code8': None, 'code9': None, 'short_name_en': None, 'short_name_ru': None}
+
+
+@pytest.fixture
+def test_catalog():
+    test_catalog = Catalog(
+        version=1,
+        books=[{**BOOK, 'number': 1}],
+        translations=[{'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1}],
+        voices=[{'code': 1, 'alias': 'bondarenko', 'name': 'Бондаренко', 'description': '', 'is_music': 0,
+                 'translation': 1, 'link_template': '', 'active': 1}],
+        translation_books=[{'code': 1, 'translation': 1, 'book_number': 1, 'name': 'Бытие'}],
+        chapters=[{'translation': 1, 'book_number': 1, 'chapter_number': n} for n in (1, 2)],
+        languages=[]
+    )
+    with patch('excerpt.get_catalog', return_value=test_catalog), \
+            patch('packs.get_catalog', return_value=test_catalog), \
+            patch('excerpt.check_audio_file_exists', return_value=False):
+        yield test_catalog
+
+
+@pytest.fixture
+def packs_path(tmp_path):
+    with patch('packs.PACKS_PATH', str(tmp_path)):
+        yield tmp_path
+
+
+def row(kind: int, chapter_number: int, verse_number: int, code: int) -> dict:
+    return {
+        'kind': kind, 'code': code, 'number': verse_number if kind != 3 else 1, 'verse_number_join': 0,
+        'text': f'{kind}:{chapter_number}:{verse_number}', 'html': '', 'start_paragraph': 0,
+        'begin': 1.5 if kind == 1 else None, 'end': 2.0 if kind == 1 else None,
+        'verse_code': code - 1 if kind == 3 else None, 'title_code': None, 'metadata': None, 'reference': None,
+        'subtitle': 0 if kind == 2 else None, 'position_text': None, 'position_html': None,
+        'book_number': 1, 'chapter_number': chapter_number, 'verse_number': verse_number,
+    }
+
+
+@pytest.fixture
+def built_pack(test_catalog, packs_path):
+    with patch('packs.create_connection') as mock_create_connection:
+        cursor = mock_create_connection.return_value.cursor.return_value
+        cursor.fetchmany.side_effect = [
+            [row(2, 1, 1, 10), row(1, 1, 1, 11), row(3, 1, 1, 12)],
+            [row(1, 2, 1, 20)],
+            [],
+        ]
+        manifest = build_pack(1, 1)
+    mock_create_connection.return_value.cursor.assert_called_once_with(dictionary=True, buffered=False)
+    return manifest
+
+
+def pack_rows(packs_path: Path, manifest: dict, sql: str) -> list:
+    db = sqlite3.connect(packs_path / '1' / manifest['file'])
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+
+def test_build_pack_writes_sqlite_with_all_chapters(built_pack, packs_path):
+    assert built_pack['file'] == f"1-{built_pack['sha256'][:32]}.sqlite"
+    assert built_pack['etag'] == f'"{built_pack["sha256"][:32]}"'
+    assert built_pack['chapters'] == 2
+    assert read_manifest(1, 1) == built_pack
+
+    assert pack_rows(packs_path, built_pack, "SELECT code, chapter_number, number, begin, \"end\" FROM verses ORDER BY code") == [
+        (11, 1, 1, 1.5, 2.0), (20, 2, 1, 1.5, 2.0)
+    ]
+    assert pack_rows(packs_path, built_pack, "SELECT code, before_verse_code FROM titles") == [(10, None)]
+    assert pack_rows(packs_path, built_pack, "SELECT code, verse_code FROM notes") == [(12, 11)]
+    assert pack_rows(packs_path, built_pack, "SELECT number, alias, name, chapters_count FROM books") == [(1, 'gen', 'Бытие', 2)]
+    assert dict(pack_rows(packs_path, built_pack, "SELECT key, value FROM meta"))['voice_name'] == 'Бондаренко'
+
+
+def test_manual_fix_updates_timings_incrementally(built_pack, packs_path):
+    chapter_data = {'verses': [{'code': 20, 'begin': 3.0, 'end': 4.5}]}
+    with patch('packs.load_chapters_data', return_value=[chapter_data]) as mock_load:
+        manifest = update_pack_timings(1, 1, [(1, 2)])
+
+    parts = mock_load.call_args.args[1]
+    # Изменение только что записано: тайминги читаются с основного сервера, не с реплики
+    assert mock_load.call_args.kwargs['readonly'] is False
+    assert [(book_info['number'], chapter_number) for book_info, chapter_number, _, _ in parts] == [(1, 2)]
+    assert pack_rows(packs_path, manifest, "SELECT code, begin, \"end\" FROM verses ORDER BY code") == [
+        (11, 1.5, 2.0), (20, 3.0, 4.5)
+    ]
+    # Новое содержимое - новый файл и ETag; предыдущая версия остается для текущих загрузок
+    assert manifest['etag'] != built_pack['etag']
+    assert (packs_path / '1' / built_pack['file']).exists()
+    assert read_manifest(1, 1)['file'] == manifest['file']
+
+
+def test_temp_files_are_unique_and_removed(built_pack, packs_path):
+    directory = packs_path / '1'
+    # Сборка из API и scripts/build_packs.py не должны писать в один временный файл
+    assert create_temp_path(directory, 1, '.sqlite.tmp') != create_temp_path(directory, 1, '.sqlite.tmp')
+    for path in directory.glob('*.tmp'):
+        path.unlink()
+
+    with patch('packs.load_chapters_data', side_effect=RuntimeError("Lost connection")), pytest.raises(RuntimeError):
+        update_pack_timings(1, 1, [(1, 2)])
+    with patch('packs.load_chapters_data', return_value=[]), patch('packs.sqlite3.connect', side_effect=sqlite3.Error("disk full")), \
+            pytest.raises(sqlite3.Error):
+        update_pack_timings(1, 1, [(1, 2)])
+
+    assert list(directory.glob('*.tmp')) == []
+    assert read_manifest(1, 1) == built_pack
+
+
+def test_update_holds_pack_lock(built_pack, packs_path):
+    def load_chapters_data(*args, **kwargs):
+        # Другой процесс не может начать запись того же пакета
+        with open(packs_path / '1' / '1.lock', 'a') as lock, pytest.raises(BlockingIOError):
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return [{'verses': [{'code': 20, 'begin': 3.0, 'end': 4.5}]}]
+
+    with patch('packs.load_chapters_data', side_effect=load_chapters_data) as mock_load:
+        update_pack_timings(1, 1, [(1, 2)])
+
+    mock_load.assert_called_once()
+    with open(packs_path / '1' / '1.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_update_without_built_pack_does_nothing(test_catalog, packs_path):
+    with patch('packs.load_chapters_data') as mock_load:
+        assert update_pack_timings(1, 1, [(1, 2)]) is None
+    mock_load.assert_not_called()
+
+
+def test_update_is_scheduled_only_for_built_packs(built_pack, packs_path):
+    with patch('packs._pack_executor') as mock_executor:
+        schedule_pack_update(1, 1, 2)
+        schedule_pack_update(2, 1, 2)
+
+    mock_executor.submit.assert_called_once_with(update_pack_timings, 1, 1, [(1, 2)])
+
+
+def test_download_full_pack(built_pack, packs_path):
+    content = (packs_path / '1' / built_pack['file']).read_bytes()
+
+    response = client.get("/api/packs/1", params={"voice": 1})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/vnd.sqlite3'
+    assert response.headers['etag'] == built_pack['etag']
+    assert response.headers['accept-ranges'] == 'bytes'
+    assert response.content == content
+
+
+def test_download_range_resumes(built_pack, packs_path):
+    content = (packs_path / '1' / built_pack['file']).read_bytes()
+
+    response = client.get("/api/packs/1", params={"voice": 1},
+                          headers={"Range": "bytes=100-", "If-Range": built_pack['etag']})
+
+    assert response.status_code == 206
+    assert response.headers['content-range'] == f"bytes 100-{len(content) - 1}/{len(content)}"
+    assert response.content == content[100:]
+
+
+def test_suffix_and_multiple_ranges(built_pack, packs_path):
+    content = (packs_path / '1' / built_pack['file']).read_bytes()
+    size = len(content)
+
+    response = client.get("/api/packs/1", params={"voice": 1}, headers={"Range": "bytes=-500"})
+    assert response.status_code == 206
+    assert response.headers['content-range'] == f"bytes {size - 500}-{size - 1}/{size}"
+    assert response.content == content[-500:]
+
+    # Все диапазоны, а не только первый
+    response = client.get("/api/packs/1", params={"voice": 1}, headers={"Range": "bytes=0-9,1000-1099"})
+    assert response.status_code == 206
+    assert response.headers['content-type'].startswith('multipart/byteranges; boundary=')
+    assert response.headers['content-length'] == str(len(response.content))
+    assert content[0:10] in response.content and content[1000:1100] in response.content
+    assert f"Content-Range: bytes 1000-1099/{size}".encode() in response.content
+
+
+def test_range_of_changed_pack_returns_whole_file(built_pack, packs_path):
+    response = client.get("/api/packs/1", params={"voice": 1},
+                          headers={"Range": "bytes=100-", "If-Range": '"outdated"'})
+
+    assert response.status_code == 200
+    assert len(response.content) == built_pack['size']
+
+
+def test_unsatisfiable_range(built_pack):
+    response = client.get("/api/packs/1", params={"voice": 1},
+                          headers={"Range": f"bytes={built_pack['size']}-"})
+
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f"bytes */{built_pack['size']}"
+
+
+def test_not_modified(built_pack):
+    response = client.get("/api/packs/1", params={"voice": 1}, headers={"If-None-Match": built_pack['etag']})
+
+    assert response.status_code == 304
+    assert response.content == b''
+
+
+def test_head_returns_headers_only(built_pack, api_headers):
+    response = client.head("/api/packs/1", params={"voice": 1}, headers=dict(api_headers))
+
+    assert response.status_code == 200
+    assert response.headers['content-length'] == str(built_pack['size'])
+    assert response.content == b''
+
+
+def test_download_rereads_manifest_when_file_was_replaced(built_pack, packs_path):
+    content = (packs_path / '1' / built_pack['file']).read_bytes()
+    outdated = {**built_pack, 'file': '1-removed.sqlite'}
+
+    # Между чтением манифеста и открытием файла опубликована новая версия
+    with patch('packs.read_manifest', side_effect=[outdated, built_pack]):
+        response = client.get("/api/packs/1", params={"voice": 1})
+
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_download_of_missing_file_is_404(built_pack, packs_path):
+    (packs_path / '1' / built_pack['file']).unlink()
+
+    response = client.get("/api/packs/1", params={"voice": 1})
+
+    assert response.status_code == 404
+
+
+def test_missing_pack(packs_path):
+    response = client.get("/api/packs/1", params={"voice": 1})
+
+    assert response.status_code == 404
+
+
+def test_build_endpoint_returns_manifest(test_catalog, packs_path, admin_headers):
+    manifest = {'translation': 1, 'voice': None, 'format_version': 1, 'file': 'text-abc.sqlite', 'size': 10,
+                'sha256': 'abc', 'etag': '"abc"', 'built_at': '2026-10-17T12:00:00+00:00',
+                'updated_at': '2026-10-17T12:00:00+00:00', 'chapters': 2, 'audio_chapters': 0}
+    with patch('packs.build_pack', return_value=manifest) as mock_build:
+        response = client.post("/api/packs/1/build", headers=dict(admin_headers))
+
+    assert response.status_code == 200
+    assert response.json()['file'] == 'text-abc.sqlite'
+    mock_build.assert_called_once_with(1, None)
+
+
+def test_build_requires_jwt(test_catalog, packs_path):
+    response = client.post("/api/packs/1/build", headers={"Authorization": ""})
+
+    assert response.status_code in (401, 403)
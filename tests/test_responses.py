@@ -0,0 +1,62 @@
+"""
+Тесты для быстрой сериализации ответов глав и отрывков (app/responses.py)
+"""
+import json
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.main import app
+from excerpt import build_part_json, excerpt_response, split_chapter_rows
+from models import ExcerptWithAlignmentModel
+from responses import FastJSONResponse
+
+
+def make_rows():
+    base = {
+        'verse_number_join': None, 'html': None, 'start_paragraph': None, 'begin': None, 'end': None,
+        'verse_code': None, 'title_code': None, 'metadata': None, 'reference': None, 'subtitle': None,
+        'position_text': None, 'position_html': None, 'book_number': 43, 'chapter_number': 3,
+    }
+    return [
+        {**base, 'kind': 1, 'code': 10, 'number': 16, 'verse_number_join': 0, 'text': 'Ибо так возлюбил Бог мир',
+         'html': '<p>Ибо так возлюбил Бог мир</p>', 'start_paragraph': 1, 'begin': Decimal('10.500'),
+         'end': Decimal('12.25'), 'verse_number': 16},
+        {**base, 'kind': 1, 'code': 11, 'number': 17, 'verse_number_join': 0, 'text': 'Ибо не послал Бог',
+         'html': 'Ибо не послал Бог', 'start_paragraph': 0, 'verse_number': 17},
+        {**base, 'kind': 2, 'code': 5, 'number': 16, 'text': 'Заголовок "в кавычках"', 'verse_code': 10,
+         'subtitle': 0, 'position_text': 3, 'verse_number': 16},
+        {**base, 'kind': 3, 'code': 7, 'number': 1, 'text': 'Примечание', 'verse_code': 10,
+         'position_text': 4, 'position_html': 5, 'verse_number': 16},
+    ]
+
+
+BOOK_INFO = {'code': 2, 'number': 43, 'alias': 'jhn', 'name': 'От Иоанна', 'chapters_count': 21, 'code2': 'jn'}
+
+
+def test_render_passes_pre_serialized_json_through():
+    assert FastJSONResponse(b'{"a":1}').body == b'{"a":1}'
+    assert FastJSONResponse({'name': 'Бытие'}).body == '{"name":"Бытие"}'.encode()
+
+
+def test_excerpt_response_matches_model_serialization(monkeypatch):
+    """Быстрый путь дает тот же JSON, что и response_model + JSONResponse"""
+    monkeypatch.setattr('excerpt.get_next_excerpt', lambda *args: 'jhn 4')
+    chapter_data = split_chapter_rows(make_rows(), [(43, 3, 0, 32767)])[0]
+    chapter_data['audio_link'] = ''
+
+    body = excerpt_response('От Иоанна 3', True, [build_part_json(1, BOOK_INFO, 3, chapter_data)]).body
+
+    model = ExcerptWithAlignmentModel.model_validate_json(body)
+    assert body == JSONResponse(jsonable_encoder(model)).body
+    verse = json.loads(body)['parts'][0]['verses'][0]
+    assert verse['begin'] == 10.5 and verse['end'] == 12.25 and verse['start_paragraph'] is True
+    assert 'code2' not in json.loads(body)['parts'][0]['book']
+
+
+def test_openapi_schema_is_unchanged():
+    schema = app.openapi()
+    for path in ('/api/chapter_with_alignment', '/api/excerpt_with_alignment'):
+        response = schema['paths'][path]['get']['responses']['200']
+        assert response['content']['application/json']['schema'] == {'$ref': '#/components/schemas/ExcerptWithAlignmentModel'}
@@ -0,0 +1,197 @@
+"""
+Тесты для статических снимков ответов (app/snapshots.py)
+"""
+import asyncio
+import gzip
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from catalog import Catalog
+import snapshots
+from snapshots import (
+    catalog_targets, chapter_snapshot_path, clear_snapshots, chapter_targets, refresh_anomaly_snapshots, refresh_chapter_snapshots,
+    refresh_translation_snapshots, remove_snapshots, render_snapshots
+)
+
+
+@pytest.fixture
+def test_catalog():
+    return Catalog(
+        version=1,
+        books=[{'number': 1, 'code1': 'gen'}],
+        translations=[
+            {'code': 1, 'alias': 'syn', 'name': 'SYNO', 'description': '', 'language': 'ru', 'active': 1},
+            {'code': 2, 'alias': 'old', 'name': 'OLD', 'description': '', 'language': 'ru', 'active': 0},
+        ],
+        voices=[
+            {'code': 1, 'alias': 'bondarenko', 'name': 'Бондаренко', 'translation': 1, 'link_template': '', 'active': 1},
+            {'code': 2, 'alias': 'off', 'name': 'Off', 'translation': 1, 'link_template': '', 'active': 0},
+        ],
+        translation_books=[{'code': 1, 'translation': 1, 'book_number': 1, 'name': 'Бытие'}],
+        chapters=[{'translation': 1, 'book_number': 1, 'chapter_number': n} for n in (1, 2)],
+        languages=[{'alias': 'ru', 'name_en': 'Russian', 'name_national': 'Русский'}],
+    )
+
+
+@pytest.fixture
+def snapshots_root(tmp_path):
+    """Включенные снимки: папка задана, приложение зарегистрировано, фоновая пересборка перехвачена"""
+    with patch('snapshots.SNAPSHOTS_PATH', str(tmp_path)), \
+            patch('snapshots._snapshot_app', object()), \
+            patch('snapshots._snapshot_executor') as mock_executor:
+        yield tmp_path, mock_executor
+
+
+def test_targets_mirror_query_parameters(test_catalog):
+    assert [path for path, _, _ in catalog_targets(test_catalog)] == [
+        'languages.json', 'translations/all.json', 'translations/ru.json',
+        'translation_info/1.json', 'translations/1/books.json',
+    ]
+    targets = chapter_targets(test_catalog, 1)
+    # Глава без голоса и с каждым активным голосом
+    assert [path for path, _, _ in targets] == [
+        'chapter_with_alignment/1/1/1/text.json', 'chapter_with_alignment/1/1/1/1.json',
+        'chapter_with_alignment/1/1/2/text.json', 'chapter_with_alignment/1/1/2/1.json',
+    ]
+    assert targets[1][1:] == ('/api/chapter_with_alignment', {'translation': 1, 'book_number': 1, 'chapter_number': 1, 'voice': 1})
+    assert chapter_targets(test_catalog, 2) == []
+
+
+def test_render_writes_responses_and_removes_missing(tmp_path):
+    app = FastAPI()
+
+    @app.get('/api/chapter_with_alignment')
+    def chapter(translation: int, book_number: int, chapter_number: int):
+        if chapter_number > 1:
+            raise HTTPException(status_code=422, detail="Chapter not found")
+        return {'translation': translation, 'chapter': chapter_number}
+
+    stale = tmp_path / chapter_snapshot_path(1, 1, 2, None)
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(b'{}')
+    targets = [
+        (chapter_snapshot_path(1, 1, n, None), '/api/chapter_with_alignment',
+         {'translation': 1, 'book_number': 1, 'chapter_number': n})
+        for n in (1, 2)
+    ]
+
+    assert asyncio.run(render_snapshots(app, tmp_path, targets)) == (1, 1)
+
+    written = tmp_path / chapter_snapshot_path(1, 1, 1, None)
+    assert written.read_bytes() == b'{"translation":1,"chapter":1}'
+    assert gzip.decompress((tmp_path / (chapter_snapshot_path(1, 1, 1, None) + '.gz')).read_bytes()) == written.read_bytes()
+    assert not stale.exists()
+
+
+def test_chapter_refresh_removes_files_before_rendering(snapshots_root, test_catalog):
+    root, mock_executor = snapshots_root
+    for path in (chapter_snapshot_path(1, 1, 2, 1), chapter_snapshot_path(1, 1, 2, None), 'languages.json',
+                 'translations/all.json', 'translations/ru.json'):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b'{}')
+
+    with patch('snapshots.get_catalog', return_value=test_catalog):
+        refresh_chapter_snapshots(1, 1, 2)
+
+    # Файл голоса и списки переводов (счетчики аномалий голоса) удалены сразу, остальное не затронуто
+    assert not (root / chapter_snapshot_path(1, 1, 2, 1)).exists()
+    assert not (root / 'translations/all.json').exists()
+    assert not (root / 'translations/ru.json').exists()
+    assert (root / 'languages.json').exists()
+    assert (root / chapter_snapshot_path(1, 1, 2, None)).exists()
+    mock_executor.submit.assert_called_once()
+
+
+def test_chapter_refresh_renders_chapter_without_existing_file(snapshots_root, test_catalog):
+    root, mock_executor = snapshots_root
+
+    with patch('snapshots.get_catalog', return_value=test_catalog):
+        refresh_chapter_snapshots(1, 1, 2)
+        refresh = mock_executor.submit.call_args.args[0]
+        with patch('snapshots.render_snapshots', return_value=(0, 0)) as mock_render:
+            refresh()
+
+    assert [path for path, _, _ in mock_render.call_args.args[2]] == [
+        'translations/all.json', 'translations/ru.json', chapter_snapshot_path(1, 1, 2, 1)
+    ]
+
+
+def test_anomaly_refresh_touches_only_files_of_the_voice(snapshots_root, test_catalog):
+    root, mock_executor = snapshots_root
+    for path in ('languages.json', 'translations/all.json', 'translation_info/1.json', chapter_snapshot_path(1, 1, 1, 1)):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b'{}')
+
+    with patch('snapshots.get_catalog', return_value=test_catalog):
+        refresh_anomaly_snapshots(1)
+
+    assert sorted(str(path.relative_to(root)) for path in root.rglob('*.json')) == [
+        chapter_snapshot_path(1, 1, 1, 1), 'languages.json', 'translation_info/1.json'
+    ]
+
+
+def test_render_started_before_removal_does_not_write(tmp_path):
+    app = FastAPI()
+    target = (chapter_snapshot_path(1, 1, 2, 1), '/api/chapter_with_alignment',
+              {'translation': 1, 'book_number': 1, 'chapter_number': 2, 'voice': 1})
+    changes = [1]
+
+    @app.get('/api/chapter_with_alignment')
+    def chapter(translation: int, book_number: int, chapter_number: int, voice: int):
+        # Пока рендер загружает старые данные, глава изменена и ее файл удален
+        if changes:
+            changes.pop()
+            remove_snapshots(tmp_path, [('chapter', 1, 1, 2)], [target[0]])
+        return {'chapter': chapter_number}
+
+    with patch('snapshots._removed', {}):
+        generation = snapshots._generation
+        assert asyncio.run(render_snapshots(app, tmp_path, [target], generation)) == (0, 0)
+        assert not (tmp_path / target[0]).exists()
+
+        # Рендер, запланированный после удаления, пишет файл; затем отметки удаления не нужны
+        assert asyncio.run(render_snapshots(app, tmp_path, [target], snapshots._generation)) == (1, 0)
+        snapshots.forget_removals(snapshots._generation)
+        assert snapshots._removed == {}
+
+
+def test_translation_refresh_detaches_chapters(snapshots_root, test_catalog):
+    root, mock_executor = snapshots_root
+    chapter = root / chapter_snapshot_path(1, 1, 1, None)
+    chapter.parent.mkdir(parents=True)
+    chapter.write_bytes(b'{}')
+
+    refresh_translation_snapshots(1)
+
+    assert not (root / 'chapter_with_alignment' / '1').exists()
+    refresh = mock_executor.submit.call_args.args[0]
+    with patch('snapshots.get_catalog', return_value=test_catalog), \
+            patch('snapshots.render_snapshots', return_value=(0, 0)) as mock_render:
+        refresh()
+    assert len(mock_render.call_args.args[2]) == 5 + 4
+    assert not any(path.name.startswith('.trash') for path in root.iterdir())
+
+
+def test_clear_removes_tree_without_rendering(snapshots_root):
+    root, mock_executor = snapshots_root
+    for path in (chapter_snapshot_path(1, 1, 1, None), 'languages.json'):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b'{}')
+
+    clear_snapshots()
+    cleanup = mock_executor.submit.call_args.args[0]
+    with patch('snapshots.render_snapshots') as mock_render, patch('snapshots.get_catalog') as mock_get_catalog:
+        cleanup()
+
+    # nginx обращается к приложению, пока снимки не собраны скриптом заново
+    assert list(root.iterdir()) == []
+    mock_render.assert_not_called()
+    mock_get_catalog.assert_not_called()
+
+
+def test_refresh_is_disabled_without_snapshots_path():
+    with patch('snapshots.SNAPSHOTS_PATH', ''), patch('snapshots._snapshot_executor') as mock_executor:
+        refresh_chapter_snapshots(1, 1, 2)
+    mock_executor.submit.assert_not_called()
@@ -0,0 +1,108 @@
+"""
+Тесты для /voices/{voice_code}/changes: изменения таймингов стихов после метки синхронизации
+"""
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+from database import ConnectionPool
+from main import app
+from catalog import Catalog
+
+client = TestClient(app)
+
+WATERMARK = datetime(2026, 10, 17, 12, 0, 0)
+
+
+@pytest.fixture
+def test_catalog():
+    test_catalog = Catalog(
+        version=1, books=[], translations=[], translation_books=[], chapters=[], languages=[],
+        voices=[{'code': 1, 'alias': 'bondarenko', 'name': 'Бондаренко', 'translation': 1, 'link_template': '', 'active': 1}],
+    )
+    with patch('main.get_catalog', return_value=test_catalog):
+        yield test_catalog
+
+
+@pytest.fixture
+def mock_cursor():
+    with patch('main.create_connection') as mock_create_connection:
+        cursor = mock_create_connection.return_value.cursor.return_value
+        cursor.fetchone.return_value = {'watermark': WATERMARK}
+        cursor.fetchall.return_value = [
+            {'book_number': 43, 'chapter_number': 3, 'verse_number': 16, 'begin': Decimal('10.5'), 'end': Decimal('12.25')},
+            {'book_number': 43, 'chapter_number': 3, 'verse_number': 17, 'begin': None, 'end': None},
+        ]
+        yield cursor
+
+
+def test_changes_since_watermark(test_catalog, mock_cursor):
+    response = client.get("/api/voices/1/changes", params={"since": "2026-10-16T08:30:00"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        'voice': 1,
+        'watermark': '2026-10-17T12:00:00',
+        'verses': [
+            {'book_number': 43, 'chapter_number': 3, 'verse_number': 16, 'begin': 10.5, 'end': 12.25},
+            {'book_number': 43, 'chapter_number': 3, 'verse_number': 17, 'begin': 0.0, 'end': 0.0},
+        ],
+    }
+    sql, params = mock_cursor.execute.call_args.args
+    # Исправления и смены статуса аномалий выбираются по индексам (voice, updated_at)
+    assert sql.count('WHERE voice = %(voice)s AND updated_at >= %(since)s') == 2
+    # Удаленные исправления - по индексу (voice, deleted_at) таблицы удалений
+    assert 'FROM voice_manual_fixes_deleted' in sql
+    assert sql.count('WHERE voice = %(voice)s AND deleted_at >= %(since)s') == 1
+    assert params == {'voice': 1, 'since': datetime(2026, 10, 16, 8, 30)}
+
+
+def test_changes_without_watermark_return_all_changed_verses(test_catalog, mock_cursor):
+    response = client.get("/api/voices/1/changes")
+
+    assert response.status_code == 200
+    sql, params = mock_cursor.execute.call_args.args
+    assert 'updated_at >=' not in sql
+    assert 'deleted_at >=' not in sql
+    assert 'FROM voice_manual_fixes_deleted' in sql
+    assert params['since'] is None
+
+
+def test_unknown_voice(test_catalog, mock_cursor):
+    response = client.get("/api/voices/2/changes")
+
+    assert response.status_code == 404
+    mock_cursor.execute.assert_not_called()
+
+
+def test_changes_are_read_from_primary_when_replica_lags(test_catalog, monkeypatch):
+    def make_pool(watermark, rows):
+        def connect():
+            raw = MagicMock()
+            raw.cursor.return_value.fetchone.return_value = {'watermark': watermark}
+            raw.cursor.return_value.fetchall.return_value = rows
+            created.append(raw)
+            return raw
+        created = []
+        return ConnectionPool(connect=connect), created
+
+    change = {'book_number': 43, 'chapter_number': 3, 'verse_number': 16, 'begin': 1, 'end': 2}
+    primary, primary_created = make_pool(WATERMARK, [change])
+    # Реплика отстает на минуту: изменения еще не дошли, а метка уже ушла бы вперед
+    replica, replica_created = make_pool(datetime(2026, 10, 17, 11, 59, 0), [])
+    monkeypatch.setattr(database, "_pool", primary)
+    monkeypatch.setattr(database, "_replica_pool", replica)
+    monkeypatch.setattr(database, "DB_REPLICA_HOST", "replica")
+
+    response = client.get("/api/voices/1/changes", params={"since": "2026-10-17T11:00:00"})
+
+    assert response.status_code == 200
+    assert response.json()['verses'] == [
+        {'book_number': 43, 'chapter_number': 3, 'verse_number': 16, 'begin': 1.0, 'end': 2.0}
+    ]
+    assert len(primary_created) == 1
+    assert replica_created == []
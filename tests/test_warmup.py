@@ -0,0 +1,83 @@
+"""
+Тесты для прогрева при старте и готовности (app/warmup.py)
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import warmup
+from main import app
+from catalog import Catalog
+from database import ConnectionPool
+from warmup import parse_warmup_chapters, warm_up
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_catalog():
+    return Catalog(
+        version=1, books=[], translation_books=[], chapters=[], languages=[],
+        translations=[
+            {'code': 1, 'alias': 'syn', 'name': 'SYNO', 'active': 1},
+            {'code': 2, 'alias': 'old', 'name': 'OLD', 'active': 0},
+        ],
+        voices=[
+            {'code': 1, 'alias': 'bondarenko', 'translation': 1, 'active': 1},
+            {'code': 2, 'alias': 'off', 'translation': 1, 'active': 0},
+            {'code': 3, 'alias': 'old_voice', 'translation': 2, 'active': 1},
+        ],
+    )
+
+
+@pytest.fixture(autouse=True)
+def pending_state(monkeypatch):
+    monkeypatch.setattr(warmup, '_state', {'status': 'pending', 'started_at': None, 'finished_at': None, 'steps': {}, 'error': None})
+
+
+@pytest.fixture(autouse=True)
+def database_answers():
+    """База отвечает: готовность зависит только от прогрева"""
+    with patch('health.get_pool', return_value=ConnectionPool(connect=MagicMock)), \
+            patch('health.get_replica_pool', return_value=None):
+        yield
+
+
+def test_parse_warmup_chapters():
+    assert parse_warmup_chapters("1:43:3:1, 1:1:1,,gen:1:1, 1:2") == [(1, 43, 3, 1), (1, 1, 1, None)]
+    assert parse_warmup_chapters("") == []
+
+
+def test_not_ready_until_warm_up_finishes(test_catalog):
+    assert client.get("/api/ready").status_code == 503
+
+    with patch('warmup.refresh_catalog', side_effect=[RuntimeError("no database connection"), test_catalog]), \
+            patch('warmup.WARMUP_RETRY_SECONDS', 0), \
+            patch('warmup.WARMUP_CHAPTERS', "1:43:3:1,1:1:1"), \
+            patch('warmup.get_all_existing_audio_chapters') as mock_scan, \
+            patch('warmup.build_chapter_with_alignment') as mock_build:
+        asyncio.run(warm_up())
+
+    # Сканируется только активный голос активного перевода, главы собираются в кеш глав
+    mock_scan.assert_called_once_with('syn', 'bondarenko')
+    assert [c.args for c in mock_build.call_args_list] == [(1, 43, 3, 1), (1, 1, 1, None)]
+
+    response = client.get("/api/ready")
+    assert response.status_code == 200
+    data = response.json()
+    assert data['status'] == 'ready'
+    assert data['warmup']['steps']['audio']['voices'] == 1
+    assert data['warmup']['steps']['chapters']['built'] == 2
+
+
+def test_failed_chapter_does_not_block_readiness(test_catalog):
+    with patch('warmup.refresh_catalog', return_value=test_catalog), \
+            patch('warmup.WARMUP_CHAPTERS', "1:99:1"), \
+            patch('warmup.get_all_existing_audio_chapters'), \
+            patch('warmup.build_chapter_with_alignment', side_effect=RuntimeError("Book 99 not found")):
+        asyncio.run(warm_up())
+
+    assert warmup.is_ready()
+    assert warmup.get_warmup_state()['steps']['chapters']['built'] == 0